@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Offline-Benchmark für KI-Kontaktassistent
+Spielt einen Korpus von .eml-Dateien über process_single_email ab - mit
+In-Process-Ersatz für IMAP, OpenAI, Odoo und SMTP (siehe offline_backends.py)
+
+Beispiel:
+    python benchmark.py --corpus bench/corpus --repeat 20 --llm-latency 0.05
+"""
+
+import argparse
+import contextlib
+import functools
+import glob
+import json
+import os
+import re
+import resource
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+import data_extractor
+from main import KIKontaktAssistent
+from offline_backends import FakeIMAP, FakeOdoo, FakeOpenAI, FakeSMTPSender, OfflineConfigManager
+from profiler import CycleProfiler
+
+
+class StageTimer:
+    """Misst die Dauer einzelner Pipeline-Stufen pro Nachricht"""
+
+    def __init__(self):
+        self.current: Dict[str, float] = defaultdict(float)
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+
+    def wrap(self, obj, method_name: str, stage: str):
+        """Ersetzt obj.method_name durch eine zeitmessende Hülle"""
+        original = getattr(obj, method_name)
+
+        @functools.wraps(original)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.current[stage] += time.perf_counter() - start
+
+        setattr(obj, method_name, timed)
+
+    def finish_message(self):
+        """Schliesst die Messung einer Nachricht ab"""
+        for stage, duration in self.current.items():
+            self.samples[stage].append(duration)
+        self.current = defaultdict(float)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Einfaches Perzentil (nearest rank)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def load_corpus(corpus_dir: str) -> List[bytes]:
+    """Lädt alle .eml-Dateien eines Verzeichnisses"""
+    paths = sorted(glob.glob(os.path.join(corpus_dir, '**', '*.eml'), recursive=True))
+    corpus = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            corpus.append(f.read())
+    return corpus
+
+
+def unique_message_id(raw: bytes, suffix: str) -> bytes:
+    """Macht die Message-ID pro Wiederholung eindeutig (sonst greift der Duplikat-Schutz)"""
+    pattern = re.compile(rb'^(Message-ID:\s*<)([^>]*)(>)', re.IGNORECASE | re.MULTILINE)
+    if pattern.search(raw):
+        return pattern.sub(lambda m: m.group(1) + m.group(2) + b'.' + suffix.encode() + m.group(3), raw, count=1)
+    return b'Message-ID: <bench.' + suffix.encode() + b'@offline>\r\n' + raw
+
+
+def build_assistant(args, work_dir: str):
+    """Erzeugt einen KIKontaktAssistent mit Offline-Backends"""
+    fake_odoo = FakeOdoo(latency=args.odoo_latency)
+    overrides = {
+        'local_db': {'path': os.path.join(work_dir, 'processing.db')},
+        'dedup': {'enabled': args.dedup},
+        # Wiederholungen des Korpus sollen echte KI-Aufrufe messen
+        'openai': {'cache_size': 0},
+        'assistant': {'send_confirmation_email': True, 'unknown_category_action': 'ask_sender'},
+    }
+    config_manager = OfflineConfigManager(
+        config_file=args.config, overrides=overrides, odoo_models=fake_odoo,
+        log_level=args.log_level, log_file=os.path.join(work_dir, 'benchmark.log'))
+
+    fake_openai = FakeOpenAI(latency=args.llm_latency, canned=args.canned)
+    data_extractor.openai = fake_openai
+
+    assistant = KIKontaktAssistent(config_manager=config_manager)
+    assistant.odoo_manager.smtp_sender = FakeSMTPSender(latency=args.smtp_latency)
+    return assistant, fake_odoo, fake_openai
+
+
+def run_benchmark(args) -> Dict:
+    """Führt den Benchmark aus und liefert den Report"""
+    corpus = load_corpus(args.corpus)
+    if not corpus:
+        raise SystemExit(f"❌ Keine .eml-Dateien in {args.corpus}")
+
+    work_dir = tempfile.mkdtemp(prefix='ki-bench-')
+    assistant, fake_odoo, fake_openai = build_assistant(args, work_dir)
+    setup_calls = fake_odoo.total_calls()
+
+    mailbox = FakeIMAP()
+    for repeat in range(args.repeat):
+        for raw in corpus:
+            mailbox.append(unique_message_id(raw, f'r{repeat}'))
+
+    timer = StageTimer()
+    timer.wrap(mailbox, 'fetch', 'imap_fetch')
+    timer.wrap(assistant, 'get_email_body_text', 'mime_parse')
+    timer.wrap(assistant, 'extract_primary_email', 'primary_email')
+    timer.wrap(assistant.data_extractor, 'apply_smart_strategy', 'smart_strategy')
+    timer.wrap(fake_openai.chat.completions, 'create', 'llm_call')
+    timer.wrap(assistant.odoo_manager, 'create_or_update_contact', 'upsert')
+
+    _, numbers = mailbox.search(None, 'UNSEEN')
+    message_numbers = numbers[0].split()
+
+    # Optional: Korpus-Durchlauf wie einen Verarbeitungszyklus profilieren (Hotspots reproduzieren)
+    profiler = CycleProfiler(assistant.logger, args.profile_dir, top_n=args.profile_top) if args.profile else None
+
+    totals = []
+    successes = 0
+    start = time.perf_counter()
+    with profiler.cycle('benchmark') if profiler else contextlib.nullcontext():
+        for num in message_numbers:
+            message_start = time.perf_counter()
+            if assistant.process_single_email(mailbox, num):
+                successes += 1
+            totals.append(time.perf_counter() - message_start)
+            timer.finish_message()
+    pipeline_seconds = time.perf_counter() - start
+
+    flush_start = time.perf_counter()
+    assistant.flush_outbox()
+    flush_seconds = time.perf_counter() - flush_start
+
+    message_count = len(message_numbers)
+    rpc_calls = fake_odoo.total_calls() - setup_calls
+    report = {
+        'messages': message_count,
+        'successful': successes,
+        'pipeline_seconds': round(pipeline_seconds, 4),
+        'messages_per_second': round(message_count / pipeline_seconds, 2) if pipeline_seconds else 0.0,
+        'outbox_flush_seconds': round(flush_seconds, 4),
+        'latency_ms': {
+            'total': {'p50': round(percentile(totals, 50) * 1000, 3),
+                      'p95': round(percentile(totals, 95) * 1000, 3)}
+        },
+        'llm_calls': fake_openai.calls,
+        'rpc_calls_total': rpc_calls,
+        'rpc_calls_per_message': round(rpc_calls / message_count, 2) if message_count else 0.0,
+        'rpc_calls_by_method': {f'{model}.{method}': count
+                                for (model, method), count in sorted(fake_odoo.calls.items())},
+        'smtp_messages': len(assistant.odoo_manager.smtp_sender.sent),
+        # ru_maxrss: Kilobyte unter Linux, Byte unter macOS
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss /
+                             (1024 * 1024 if sys.platform == 'darwin' else 1024), 1),
+    }
+    for stage, samples in timer.samples.items():
+        report['latency_ms'][stage] = {'p50': round(percentile(samples, 50) * 1000, 3),
+                                       'p95': round(percentile(samples, 95) * 1000, 3)}
+    return report
+
+
+def print_report(report: Dict):
+    """Gibt den Report lesbar aus"""
+    print("📊 Offline-Benchmark")
+    print("=" * 50)
+    print(f"📧 Nachrichten:       {report['messages']} ({report['successful']} erfolgreich)")
+    print(f"⚡ Durchsatz:         {report['messages_per_second']} Nachrichten/s")
+    print(f"⏱️ Pipeline:          {report['pipeline_seconds']} s (+ Outbox-Flush {report['outbox_flush_seconds']} s)")
+    print(f"🤖 KI-Aufrufe:        {report['llm_calls']}")
+    print(f"🔌 Odoo-RPCs:         {report['rpc_calls_total']} ({report['rpc_calls_per_message']} pro Nachricht)")
+    for method, count in report['rpc_calls_by_method'].items():
+        print(f"   {method}: {count}")
+    print(f"📨 SMTP-Nachrichten:  {report['smtp_messages']}")
+    print(f"💾 Peak RSS:          {report['peak_rss_mb']} MB")
+    print("⏱️ Latenz pro Stufe (ms, p50 / p95):")
+    for stage, values in report['latency_ms'].items():
+        print(f"   {stage:<15} {values['p50']:>10} / {values['p95']}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline-Benchmark für KI-Kontaktassistent")
+    parser.add_argument('--corpus', default='bench/corpus', help="Verzeichnis mit .eml-Dateien")
+    parser.add_argument('--config', default='config-sys.yml.example', help="Basis-Konfiguration")
+    parser.add_argument('--repeat', type=int, default=10, help="Wiederholungen des Korpus")
+    parser.add_argument('--llm-latency', type=float, default=0.0, help="Simulierte OpenAI-Latenz (s)")
+    parser.add_argument('--odoo-latency', type=float, default=0.0, help="Simulierte Latenz pro Odoo-RPC (s)")
+    parser.add_argument('--smtp-latency', type=float, default=0.0, help="Simulierte SMTP-Latenz (s)")
+    parser.add_argument('--canned', type=str, default=None, help="JSON-Datei mit fester KI-Antwort")
+    parser.add_argument('--dedup', action='store_true', help="Near-Duplicate-Erkennung aktiv lassen")
+    parser.add_argument('--log-level', default='WARNING', help="Log-Level der Pipeline")
+    parser.add_argument('--json', type=str, default=None, help="Report zusätzlich als JSON speichern")
+    parser.add_argument('--profile', action='store_true', help="Durchlauf profilieren (cProfile + Collapsed-Stacks)")
+    parser.add_argument('--profile-top', type=int, default=30, help="Anzahl Funktionen in der Top-N-Übersicht")
+    parser.add_argument('--profile-dir', default='logs/profiles', help="Zielverzeichnis für Profile")
+    args = parser.parse_args(argv)
+
+    if args.canned:
+        with open(args.canned, 'r', encoding='utf-8') as f:
+            args.canned = json.load(f)
+    return args
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    result = run_benchmark(arguments)
+    print_report(result)
+    if arguments.json:
+        with open(arguments.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Massen-Import für KI-Kontaktassistent
+Liest E-Mails direkt aus mbox-Dateien, Maildir-Verzeichnissen oder .eml-Ordnern (ohne IMAP)
+und schickt sie durch dieselbe Verarbeitung wie main.py - mit Checkpoint, Wiederaufnahme
+und Fortschritts-/Durchsatzanzeige. Extraktionen werden pro Block gepuffert und gebündelt nach
+Odoo geschrieben; fehlgeschlagene Nachrichten merkt sich der Checkpoint und versucht sie beim
+nächsten Aufruf erneut.
+
+Beispiel:
+    python bulk_import.py archiv/export.mbox
+    python bulk_import.py archiv/Maildir --limit 5000
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import mmap
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+from config_manager import ConfigManager
+from main import KIKontaktAssistent
+from metrics import metrics
+
+MBOX_SEPARATOR = b'\nFrom '
+
+
+def detect_format(source: str) -> str:
+    """mbox (Datei), maildir (Verzeichnis mit cur/new) oder eml (Verzeichnis mit .eml-Dateien)"""
+    if os.path.isfile(source):
+        return 'eml' if source.lower().endswith('.eml') else 'mbox'
+    if os.path.isdir(os.path.join(source, 'cur')) or os.path.isdir(os.path.join(source, 'new')):
+        return 'maildir'
+    return 'eml'
+
+
+def count_mbox(path: str) -> int:
+    """Zählt die Nachrichten einer mbox-Datei (memchr-schnell über mmap)"""
+    if os.path.getsize(path) == 0:
+        return 0
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        count = 1 if mm[:5] == b'From ' else 0
+        position = mm.find(MBOX_SEPARATOR)
+        while position != -1:
+            count += 1
+            position = mm.find(MBOX_SEPARATOR, position + 1)
+        return count
+
+
+def iter_mbox(path: str, start_offset: int = 0) -> Iterator[Tuple[int, bytes]]:
+    """Liefert (Byte-Offset der nächsten Nachricht, Rohdaten) - die Datei wird nie ganz eingelesen"""
+    if os.path.getsize(path) == 0:
+        return
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        start = start_offset
+        size = len(mm)
+        while start < size:
+            # "From "-Trennzeile überspringen
+            body_start = start
+            if mm[start:start + 5] == b'From ':
+                line_end = mm.find(b'\n', start)
+                if line_end == -1:
+                    break
+                body_start = line_end + 1
+            separator = mm.find(MBOX_SEPARATOR, body_start)
+            end = separator + 1 if separator != -1 else size
+            yield end, mm[body_start:end]
+            start = end
+
+
+def list_message_files(source: str, source_format: str) -> List[str]:
+    """Sortierte Dateiliste (stabile Reihenfolge für die Wiederaufnahme)"""
+    if source_format == 'maildir':
+        paths = []
+        for sub in ('cur', 'new'):
+            directory = os.path.join(source, sub)
+            if os.path.isdir(directory):
+                paths.extend(os.path.join(directory, name) for name in os.listdir(directory))
+        return sorted(paths)
+    if os.path.isfile(source):
+        return [source]
+    return sorted(glob.glob(os.path.join(source, '**', '*.eml'), recursive=True))
+
+
+class Checkpoint:
+    """Fortschritt pro Quelle als JSON (Position + Zähler), wird periodisch gesichert"""
+
+    def __init__(self, source: str, directory: str = 'data/bulk_import'):
+        os.makedirs(directory, exist_ok=True)
+        source_key = hashlib.md5(os.path.abspath(source).encode('utf-8')).hexdigest()[:12]
+        self.path = os.path.join(directory, f"{source_key}.json")
+        self.source = os.path.abspath(source)
+        # failed: Schlüssel fehlgeschlagener Nachrichten (werden bei der Wiederaufnahme erneut versucht)
+        self.data = {'source': self.source, 'position': 0, 'processed': 0, 'successful': 0, 'errors': 0,
+                     'failed': []}
+
+    def load(self) -> dict:
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.data.update(json.load(f))
+        return self.data
+
+    def save(self):
+        self.data['updated_at'] = datetime.now().isoformat(timespec='seconds')
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(temp_path, self.path)
+
+    def reset(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class BulkImporter:
+    def __init__(self, assistant: KIKontaktAssistent, source: str, source_format: Optional[str] = None,
+                 checkpoint_every: int = 50, limit: int = 0):
+        """Initialisiert den Import einer Archiv-Quelle"""
+        self.assistant = assistant
+        self.logger = assistant.logger
+        self.source = source
+        self.source_format = source_format or detect_format(source)
+        self.checkpoint_every = max(1, checkpoint_every)
+        self.limit = limit
+        self.checkpoint = Checkpoint(source)
+
+    def iter_messages(self, position: int) -> Iterator[Tuple[int, str, bytes]]:
+        """Liefert (neue Position, Schlüssel, Rohdaten) ab der Checkpoint-Position"""
+        if self.source_format == 'mbox':
+            # Schlüssel = Start-Offset der Nachricht (read_message liest sie damit erneut)
+            start = position
+            for offset, raw in iter_mbox(self.source, position):
+                yield offset, f"mbox@{start}", raw
+                start = offset
+            return
+
+        paths = list_message_files(self.source, self.source_format)
+        for index in range(position, len(paths)):
+            with open(paths[index], 'rb') as f:
+                yield index + 1, os.path.relpath(paths[index], self.source), f.read()
+
+    def read_message(self, key: str) -> Optional[bytes]:
+        """Rohdaten einer Nachricht über ihren Schlüssel (Wiederholung fehlgeschlagener Nachrichten)"""
+        if self.source_format == 'mbox':
+            for _, raw in iter_mbox(self.source, int(key.split('@', 1)[1])):
+                return raw
+            return None
+        path = os.path.join(self.source, key) if os.path.isdir(self.source) else self.source
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def count_messages(self) -> int:
+        if self.source_format == 'mbox':
+            return count_mbox(self.source)
+        return len(list_message_files(self.source, self.source_format))
+
+    def process_batch(self, batch: List[Tuple[Optional[int], str, bytes]], total: int, retry: bool = False):
+        """Verarbeitet einen Block (über den Parse-Pool, falls aktiviert): Extraktionen werden gepuffert
+        und gebündelt geschrieben, erst dann wird der Checkpoint fortgeschrieben
+        (retry: Nachrichten aus der Fehlerliste - Position und Zähler 'processed' bleiben)"""
+        parsed_results = [None] * len(batch)
+        if self.assistant.parse_pool:
+            parsed_results = self.assistant.parse_pool.parse_many([raw for _, _, raw in batch])
+
+        data = self.checkpoint.data
+        results = {}
+        self.assistant.deferred_upserts = {}
+        try:
+            for (position, key, raw), parsed in zip(batch, parsed_results):
+                results[key] = self.assistant.process_message(None, key, data['processed'] + len(results) + 1,
+                                                              total, raw, parsed)
+            # Block gebündelt schreiben (Partner-Lesezugriffe parallel vorab); noch gepufferte Einträge
+            # (Odoo-Ausfall) schreibt der nächste Block bzw. der normale Betrieb
+            written = self.assistant.drain_upsert_buffer()
+            for email_id, key in self.assistant.deferred_upserts.items():
+                if written.get(email_id) is False:
+                    results[key] = False
+        finally:
+            self.assistant.deferred_upserts = None
+
+        for position, key, _ in batch:
+            ok = results.get(key, False)
+            if retry:
+                if ok:
+                    data['failed'].remove(key)
+                    data['errors'] -= 1
+                    data['successful'] += 1
+                continue
+            data['processed'] += 1
+            data['successful' if ok else 'errors'] += 1
+            if not ok:
+                data['failed'].append(key)
+            data['position'] = position
+
+    def retry_failed(self, total: int):
+        """Nachrichten aus der Fehlerliste des Checkpoints erneut verarbeiten"""
+        items = []
+        for key in list(self.checkpoint.data['failed']):
+            raw = self.read_message(key)
+            if raw is not None:
+                items.append((None, key, raw))
+        if items:
+            self.logger.info(f"🔁 {len(items)} fehlgeschlagene Nachrichten werden erneut versucht")
+        batch_size = self.assistant.parse_pool.batch_size if self.assistant.parse_pool else self.checkpoint_every
+        for index in range(0, len(items), batch_size):
+            self.process_batch(items[index:index + batch_size], total, retry=True)
+
+    def report_progress(self, total: int, started: float, processed_at_start: int):
+        data = self.checkpoint.data
+        elapsed = time.perf_counter() - started
+        rate = (data['processed'] - processed_at_start) / elapsed if elapsed else 0.0
+        remaining = max(0, total - data['processed'])
+        eta = f"{remaining / rate / 60:.1f} min" if rate else "?"
+        percent = data['processed'] / total * 100 if total else 100.0
+        print(f"📦 {data['processed']}/{total} ({percent:.1f}%) - ✅ {data['successful']} ❌ {data['errors']} "
+              f"- {rate:.1f} Nachrichten/s - Rest ca. {eta}", flush=True)
+
+    def run(self, resume: bool = True) -> dict:
+        """Führt den Import aus (resume: ab letztem Checkpoint fortsetzen)"""
+        if resume:
+            self.checkpoint.load()
+        else:
+            self.checkpoint.reset()
+        data = self.checkpoint.data
+
+        total = self.count_messages()
+        self.logger.info(f"📦 Archiv-Import: {self.source} ({self.source_format}, {total} Nachrichten, "
+                         f"ab Position {data['position']})")
+
+        batch_size = self.assistant.parse_pool.batch_size if self.assistant.parse_pool else self.checkpoint_every
+        processed_at_start = data['processed']
+        started = time.perf_counter()
+        batch = []
+        since_checkpoint = 0
+        try:
+            if data['failed']:
+                self.retry_failed(total)
+            for item in self.iter_messages(data['position']):
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    self.process_batch(batch, total)
+                    since_checkpoint += len(batch)
+                    batch = []
+                if since_checkpoint >= self.checkpoint_every:
+                    self.save_checkpoint(total, started, processed_at_start)
+                    since_checkpoint = 0
+                if self.limit and data['processed'] - processed_at_start + len(batch) >= self.limit:
+                    break
+            if batch:
+                self.process_batch(batch, total)
+        except KeyboardInterrupt:
+            self.logger.info("🛑 Import unterbrochen - Fortsetzung mit erneutem Aufruf möglich")
+        finally:
+            self.save_checkpoint(total, started, processed_at_start)
+
+        elapsed = time.perf_counter() - started
+        processed = data['processed'] - processed_at_start
+        return {
+            'source': self.source,
+            'format': self.source_format,
+            'total': total,
+            'processed': processed,
+            'successful': data['successful'],
+            'errors': data['errors'],
+            'seconds': round(elapsed, 2),
+            'messages_per_second': round(processed / elapsed, 2) if elapsed else 0.0,
+            'latency_summary': metrics.summary(),
+        }
+
+    def save_checkpoint(self, total: int, started: float, processed_at_start: int):
+        """Seiteneffekte gebündelt abarbeiten, dann Checkpoint sichern"""
+        self.assistant.flush_outbox()
+        self.checkpoint.save()
+        self.report_progress(total, started, processed_at_start)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Archiv-Import (mbox/Maildir/EML) für KI-Kontaktassistent")
+    parser.add_argument('source', help="mbox-Datei, Maildir- oder .eml-Verzeichnis")
+    parser.add_argument('--format', choices=['mbox', 'maildir', 'eml'], default=None, help="Format (Standard: automatisch)")
+    parser.add_argument('--config', default='config-sys.yml', help="Konfigurationsdatei")
+    parser.add_argument('--restart', action='store_true', help="Checkpoint verwerfen und von vorne beginnen")
+    parser.add_argument('--checkpoint-every', type=int, default=50, help="Checkpoint alle N Nachrichten")
+    parser.add_argument('--limit', type=int, default=0, help="Höchstens N Nachrichten in diesem Lauf")
+    parser.add_argument('--notify', action='store_true',
+                        help="Bestätigungen und Kategorie-Rückfragen an Weiterleiter senden (Standard: aus)")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Probelauf: Odoo-Änderungen und Mails nur ins Journal schreiben (dry_run.journal)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    print("📦 KI-Kontaktassistent - Archiv-Import")
+    print("=" * 50)
+
+    arguments = parse_args()
+    if not os.path.exists(arguments.source):
+        print(f"❌ Quelle nicht gefunden: {arguments.source}")
+        sys.exit(1)
+
+    config_manager = ConfigManager(arguments.config)
+    if arguments.dry_run:
+        config_manager.get_config().setdefault('dry_run', {})['enabled'] = True
+    assistant = KIKontaktAssistent(config_manager=config_manager)
+    if not arguments.notify:
+        # Archiv-Mails sind alt - keine Bestätigungen/Rückfragen an die damaligen Weiterleiter
+        assistant.config['assistant']['send_confirmation_email'] = False
+        assistant.config['assistant']['unknown_category_action'] = 'skip'
+
+    importer = BulkImporter(assistant, arguments.source, arguments.format,
+                            arguments.checkpoint_every, arguments.limit)
+    result = importer.run(resume=not arguments.restart)
+
+    print("=" * 50)
+    print(f"✅ {result['processed']} Nachrichten in {result['seconds']} s "
+          f"({result['messages_per_second']} Nachrichten/s)")
+    print(f"📊 Gesamt: ✅ {result['successful']} erfolgreich, ❌ {result['errors']} Fehler (von {result['total']})")
+    print(f"⏱️ {result['latency_summary']}")
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Firmen-Zuordnung für KI-Kontaktassistent
+Lokaler Index aller Firmen-Partner, Schlüssel: E-Mail-/Website-Domain und normalisierter
+Firmenname (Rechtsform-Zusätze wie GmbH/AG/Verlag entfernt, Umlaute gefaltet).
+Wird beim Start einmal geladen und danach über write_date inkrementell nachgeführt - Personen
+werden so ohne Odoo-Suche pro E-Mail an ihre Firma gehängt, Firmen nicht doppelt angelegt.
+"""
+
+import logging
+import re
+import threading
+import time
+import unicodedata
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+
+# Freemail-Domains gehören zu keiner Firma
+FREEMAIL_DOMAINS = {
+    'gmail.com', 'googlemail.com', 'gmx.de', 'gmx.net', 'gmx.ch', 'gmx.at', 'web.de', 'yahoo.com', 'yahoo.de',
+    'hotmail.com', 'hotmail.de', 'outlook.com', 'outlook.de', 'live.com', 'icloud.com', 'me.com', 'mac.com',
+    't-online.de', 'bluewin.ch', 'hispeed.ch', 'sunrise.ch', 'protonmail.com', 'proton.me', 'aol.com',
+    'freenet.de', 'posteo.de', 'mailbox.org', 'yandex.ru', 'mail.ru',
+}
+
+# Rechtsform-/Branchenzusätze am Namensende ("Keller Elektro GmbH & Co. KG" → "keller elektro")
+LEGAL_SUFFIXES = {
+    'gmbh', 'mbh', 'ag', 'kg', 'kgaa', 'ohg', 'gbr', 'eg', 'se', 'ug', 'haftungsbeschraenkt', 'ev', 'e', 'v',
+    'co', 'und', 'cie', 'aktiengesellschaft', 'gesellschaft', 'genossenschaft', 'kommanditgesellschaft',
+    'verlag', 'verein', 'stiftung', 'holding', 'gruppe', 'group',
+    'ltd', 'limited', 'inc', 'incorporated', 'corp', 'corporation', 'llc', 'llp', 'plc', 'company',
+    'sa', 'sarl', 'sas', 'srl', 'spa', 'bv', 'nv', 'oy', 'ab', 'as', 'aps',
+}
+
+_UMLAUTS = str.maketrans({'ä': 'ae', 'ö': 'oe', 'ü': 'ue', 'ß': 'ss', 'æ': 'ae', 'ø': 'oe', 'å': 'aa'})
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+
+def email_domain(address: str) -> Optional[str]:
+    """Firmen-Domain einer Adresse (None bei Freemail)"""
+    domain = (address or '').rpartition('@')[2].strip().lower()
+    if not domain or domain in FREEMAIL_DOMAINS:
+        return None
+    return domain
+
+
+def website_domain(website: str) -> Optional[str]:
+    """Domain einer Website ohne www. (None bei Freemail/leer)"""
+    if not website or not isinstance(website, str):
+        return None
+    netloc = urlparse(website if '//' in website else f"//{website}").netloc.lower().split(':')[0]
+    if netloc.startswith('www.'):
+        netloc = netloc[4:]
+    return netloc if netloc and netloc not in FREEMAIL_DOMAINS else None
+
+
+def normalize_company_name(name: str) -> str:
+    """Vergleichsschlüssel: klein, Umlaute/Akzente gefaltet, Rechtsform-Zusätze am Ende entfernt"""
+    folded = (name or '').casefold().translate(_UMLAUTS)
+    folded = ''.join(char for char in unicodedata.normalize('NFKD', folded) if not unicodedata.combining(char))
+    tokens = _NON_ALNUM.sub(' ', folded).split()
+    stripped = list(tokens)
+    while stripped and stripped[-1] in LEGAL_SUFFIXES:
+        stripped.pop()
+    # Name nur aus Zusätzen ("Verlag AG") → ungekürzt verwenden
+    return ' '.join(stripped or tokens)
+
+
+class CompanyIndex:
+    def __init__(self, config: dict, logger: logging.Logger, odoo_models, odoo_uid):
+        """Initialisiert den Firmen-Index (company_index.enabled: Startladen + inkrementeller Abgleich)"""
+        self.config = config
+        self.logger = logger
+        self.odoo_models = odoo_models
+        self.odoo_uid = odoo_uid
+
+        index_config = config.get('company_index', {})
+        self.enabled = index_config.get('enabled', True)
+        self.sync_interval = index_config.get('sync_interval', 300)
+        self.full_reload_interval = index_config.get('full_reload_interval', 86400)
+
+        self._by_name: Dict[str, int] = {}
+        self._by_domain: Dict[str, int] = {}
+        # Partner-ID → (Namensschlüssel, Domains), um Umbenennungen sauber nachzuführen
+        self._keys_by_id: Dict[int, Tuple[str, Set[str]]] = {}
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self.high_water: Optional[str] = None
+        self.synced_at = 0.0
+        self.loaded_at = 0.0
+        # Wanduhrzeit des letzten kompletten Aufbaus (überdauert den Neustart im Snapshot)
+        self.loaded_wall = 0.0
+
+    def __len__(self):
+        return len(self._keys_by_id)
+
+    def _search_companies(self, extra_domain: List) -> List[Dict]:
+        return self.odoo_models.execute_kw(
+            self.config['odoo']['database'],
+            self.odoo_uid,
+            self.config['odoo']['password'],
+            'res.partner', 'search_read',
+            [[['is_company', '=', True]] + extra_domain],
+            {'fields': ['name', 'email', 'website', 'write_date']}
+        )
+
+    def load(self):
+        """Lädt alle Firmen-Partner (ein search_read) und baut den Index neu auf"""
+        if not self.enabled:
+            return
+        try:
+            companies = self._search_companies([])
+        except Exception as e:
+            self.logger.warning(f"⚠️ Firmen-Index nicht geladen: {e}")
+            return
+
+        with self._lock:
+            self._by_name.clear()
+            self._by_domain.clear()
+            self._keys_by_id.clear()
+            self.high_water = None
+            for company in companies:
+                self._index(company)
+        self.synced_at = self.loaded_at = time.monotonic()
+        self.loaded_wall = time.time()
+        self.logger.info(f"🏢 Firmen-Index geladen: {len(companies)} Firmen, {len(self._by_domain)} Domains")
+
+    def sync_if_due(self, force: bool = False):
+        """Inkrementeller Abgleich (write_date >= Hochwassermarke) höchstens alle sync_interval Sekunden,
+        kompletter Neuaufbau alle full_reload_interval Sekunden (gelöschte Firmen); force: sofort"""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        if not force and now - self.synced_at < self.sync_interval:
+            return
+        if not self._sync_lock.acquire(blocking=False):
+            return  # anderer Thread gleicht gerade ab
+        try:
+            if now - self.loaded_at >= self.full_reload_interval or self.high_water is None:
+                self.load()
+                return
+            # >=: write_date hat Sekundenauflösung - Änderungen in derselben Sekunde wie die Hochwassermarke
+            # sonst verpasst (erneutes Indizieren ist idempotent)
+            changed = self._search_companies([['write_date', '>=', self.high_water]])
+            with self._lock:
+                for company in changed:
+                    self._index(company)
+            self.synced_at = time.monotonic()
+            if changed:
+                self.logger.info(f"🏢 Firmen-Index: {len(changed)} geänderte Firmen übernommen")
+        except Exception as e:
+            self.logger.warning(f"⚠️ Firmen-Index-Abgleich fehlgeschlagen: {e}")
+            self.synced_at = time.monotonic()
+        finally:
+            self._sync_lock.release()
+
+    def snapshot(self) -> Optional[Dict]:
+        """Stand für den Warmstart-Snapshot (None = nie geladen)"""
+        if not self.enabled or not self.loaded_wall:
+            return None
+        with self._lock:
+            data = {'loaded_wall': self.loaded_wall,
+                    'keys': {str(partner_id): [key, sorted(domains)]
+                             for partner_id, (key, domains) in self._keys_by_id.items()},
+                    'by_name': dict(self._by_name), 'by_domain': dict(self._by_domain)}
+            return {'data': data, 'high_water': self.high_water}
+
+    def restore(self, snapshot: Dict) -> bool:
+        """Übernimmt einen Snapshot - der Abgleich mit Odoo läuft danach über sync_if_due(force=True)"""
+        if not self.enabled:
+            return False
+        data = snapshot['data']
+        with self._lock:
+            self._keys_by_id = {int(partner_id): (key, set(domains))
+                                for partner_id, (key, domains) in data['keys'].items()}
+            self._by_name = dict(data['by_name'])
+            self._by_domain = dict(data['by_domain'])
+            self.high_water = snapshot['high_water']
+        # Fälliger Neuaufbau bleibt fällig (Alter des Snapshot-Stands zählt mit)
+        self.loaded_wall = data['loaded_wall']
+        self.loaded_at = time.monotonic() - max(0.0, time.time() - self.loaded_wall)
+        self.synced_at = 0.0
+        self.logger.info(f"🏢 Firmen-Index aus Snapshot: {len(self._keys_by_id)} Firmen (Stand {self.high_water})")
+        return True
+
+    def _index(self, company: Dict):
+        """Nimmt einen Firmen-Partner auf (Lock muss gehalten werden)"""
+        partner_id = company['id']
+        self._forget(partner_id)
+
+        key = normalize_company_name(company.get('name') or '')
+        domains = {domain for domain in (email_domain(company.get('email') or ''),
+                                         website_domain(company.get('website') or '')) if domain}
+        # Bei gleichem Schlüssel gewinnt die älteste Firma (kleinste ID) - stabil über Neuladen hinweg
+        if key and partner_id <= self._by_name.get(key, partner_id):
+            self._by_name[key] = partner_id
+        for domain in domains:
+            if partner_id <= self._by_domain.get(domain, partner_id):
+                self._by_domain[domain] = partner_id
+        self._keys_by_id[partner_id] = (key, domains)
+
+        write_date = company.get('write_date')
+        if write_date and (self.high_water is None or write_date > self.high_water):
+            self.high_water = write_date
+
+    def _forget(self, partner_id: int):
+        """Entfernt eine Firma; war sie Gewinner eines Schlüssels, rückt die nächstälteste Firma nach"""
+        old = self._keys_by_id.pop(partner_id, None)
+        if not old:
+            return
+        key, domains = old
+        if key and self._by_name.get(key) == partner_id:
+            del self._by_name[key]
+            others = [other for other, (other_key, _) in self._keys_by_id.items() if other_key == key]
+            if others:
+                self._by_name[key] = min(others)
+        for domain in domains:
+            if self._by_domain.get(domain) == partner_id:
+                del self._by_domain[domain]
+                others = [other for other, (_, other_domains) in self._keys_by_id.items() if domain in other_domains]
+                if others:
+                    self._by_domain[domain] = min(others)
+
+    def add(self, partner_id: int, name: str, domain: Optional[str] = None, website: Optional[str] = None):
+        """Firma aufnehmen (nach eigenem create/update - ohne auf den nächsten Abgleich zu warten)"""
+        with self._lock:
+            old_key, old_domains = self._keys_by_id.get(partner_id, ('', set()))
+            key = normalize_company_name(name) or old_key
+            domains = set(old_domains)
+            domains.update(d for d in (domain, website_domain(website or '')) if d)
+            if key:
+                self._by_name.setdefault(key, partner_id)
+            for company_domain in domains:
+                self._by_domain.setdefault(company_domain, partner_id)
+            self._keys_by_id[partner_id] = (key, domains)
+
+    def lookup(self, name: str, domain: Optional[str] = None) -> Optional[int]:
+        """Firmen-Partner zum Namen, sonst zur Domain (lokal; ohne Index: Odoo-Suche nach dem Namen)"""
+        key = normalize_company_name(name)
+        if not self.enabled:
+            return self._remote_lookup(name, key, domain)
+
+        self.sync_if_due()
+        with self._lock:
+            if key and key in self._by_name:
+                return self._by_name[key]
+            if domain and domain in self._by_domain:
+                return self._by_domain[domain]
+        return None
+
+    def _remote_lookup(self, name: str, key: str, domain: Optional[str]) -> Optional[int]:
+        """Fallback bei company_index.enabled: false - sucht pro Name einmal in Odoo"""
+        with self._lock:
+            if key and key in self._by_name:
+                return self._by_name[key]
+            if domain and domain in self._by_domain:
+                return self._by_domain[domain]
+        if not key:
+            return None
+
+        try:
+            found = self.odoo_models.execute_kw(
+                self.config['odoo']['database'],
+                self.odoo_uid,
+                self.config['odoo']['password'],
+                'res.partner', 'search_read',
+                [[['is_company', '=', True], ['name', '=ilike', name.strip()]]],
+                {'fields': ['name'], 'limit': 1}
+            )
+        except Exception as e:
+            self.logger.warning(f"⚠️ Firmensuche übersprungen wegen Odoo-Fehler: {e}")
+            return None
+        if not found:
+            return None
+
+        self.add(found[0]['id'], found[0]['name'], domain)
+        self.logger.info(f"🏢 Bestehende Firma gefunden: {found[0]['name']} (ID: {found[0]['id']})")
+        return found[0]['id']
@@ -5,23 +5,92 @@ Handles Konfiguration, Logging und API-Setup mit Odoo-Status-Erkennung
 """
 
 import yaml
+import imaplib
 import logging
-import openai
 import xmlrpc.client
 import ssl
 import os
 import sys
-import requests
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 
+from log_setup import setup_logging
+from odoo_health import is_outage_error
+
+
+class ThreadLocalServerProxy:
+    """XML-RPC-Proxy mit einer ServerProxy-Instanz pro Thread (xmlrpc.client ist nicht thread-sicher)"""
+
+    def __init__(self, url: str, context=None):
+        self.url = url
+        self.context = context
+        self._local = threading.local()
+
+    def _proxy(self) -> xmlrpc.client.ServerProxy:
+        proxy = getattr(self._local, 'proxy', None)
+        if proxy is None:
+            proxy = xmlrpc.client.ServerProxy(self.url, context=self.context)
+            self._local.proxy = proxy
+        return proxy
+
+    def __getattr__(self, name):
+        return getattr(self._proxy(), name)
+
+
+class DeferredOdooConnection:
+    """Odoo-Verbindung für den eingeschränkten Start: wird beim ersten Aufruf nach retry_interval
+    aufgebaut (z.B. durch die Verfügbarkeitsprüfung); bis dahin schlägt execute_kw als Ausfall fehl.
+    Die beim Aufruf übergebene uid wird durch die eigene (nach dem Login bekannte) ersetzt.
+    Neue Versuche laufen still (nur Login, ohne Verbindungstest-Ausgabe und Server-Diagnose)."""
+
+    def __init__(self, manager, odoo_config: dict, retry_interval: float = 10):
+        self.manager = manager
+        self.odoo_config = odoo_config
+        self.retry_interval = retry_interval
+        self.models = None
+        self.uid = None
+        self.failed_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        with self._lock:
+            if self.models is not None:
+                return
+            if time.monotonic() - self.failed_at < self.retry_interval:
+                raise ConnectionError("Odoo noch nicht verbunden (eingeschränkter Start)")
+            try:
+                self.models, self.uid = self.manager.reconnect_odoo(self.odoo_config)
+            except Exception as e:
+                self.failed_at = time.monotonic()
+                self.manager.logger.debug(f"📡 Odoo-Verbindung weiterhin nicht möglich: {e}")
+                raise
+        self.manager.logger.info(f"✅ Odoo-Verbindung nachgeholt (User ID: {self.uid})")
+
+    def adopt(self, models, uid):
+        """Übernimmt eine Verbindung, deren Aufbau erst nach dem Start-Timeout fertig wurde"""
+        with self._lock:
+            if self.models is not None:
+                return
+            self.models, self.uid = models, uid
+        self.manager.logger.info(f"✅ Odoo-Verbindung nach Start-Timeout übernommen (User ID: {uid})")
+
+    def execute_kw(self, database, uid, password, *args):
+        if self.models is None:
+            self._connect()
+        return self.models.execute_kw(database, self.uid, password, *args)
+
 
 class ConfigManager:
     def __init__(self, config_file: str = "config-sys.yml"):
         """Initialisiert Konfigurationsmanagement"""
         self.config = self.load_config(config_file)
         self.prompts = self.load_prompts("prompts.yml")
+        # Verbindungs-Pool: (url, database, username) -> (models, uid), von Mandanten geteilt
+        self.odoo_connections = {}
         self.setup_logging()
         self.setup_apis()
 
@@ -29,8 +98,6 @@ class ConfigManager:
 
     def load_prompts(self, prompts_file: str) -> dict:
         """Lädt die Prompt-Vorlagen aus YAML-Datei"""
-        import os
-
         # Debug-Info
         current_dir = os.getcwd()
         prompts_path = os.path.abspath(prompts_file)
@@ -153,15 +220,8 @@ class ConfigManager:
         if log_dir:
             os.makedirs(log_dir, exist_ok=True)
 
-        # Erweiterte Logging-Konfiguration
-        logging.basicConfig(
-            level=getattr(logging, log_config['level']),
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(log_config['file'], encoding='utf-8'),
-                logging.StreamHandler()
-            ]
-        )
+        # Nicht-blockierendes Logging: Datei-/Konsolen-I/O im Listener-Thread, Rotation nach Grösse
+        self.log_listener = setup_logging(log_config)
         self.logger = logging.getLogger(__name__)
 
         # Startup-Info loggen
@@ -172,6 +232,9 @@ class ConfigManager:
 
     def check_odoo_status(self, odoo_url: str) -> dict:
         """Prüft Odoo-Status und erkennt Wartungsfenster"""
+        # Erst bei Bedarf laden (nur für die Diagnose gebraucht)
+        import requests
+
         try:
             # 1. Basis-URL prüfen
             base_url = odoo_url.replace('/web', '').rstrip('/')
@@ -247,6 +310,8 @@ class ConfigManager:
 
     def check_odoo_twitter_status(self) -> str:
         """Prüft Odoo Twitter-Status für aktuelle Meldungen"""
+        import requests
+
         try:
             # Fallback: Prüfe allgemeine Odoo-Status-Seiten
             status_urls = [
@@ -267,111 +332,191 @@ class ConfigManager:
             return ""
 
     def setup_apis(self):
-        """Richtet die API-Verbindungen ein mit intelligenter Fehlerbehandlung"""
-        try:
-            # OpenAI
-            openai.api_key = self.config['openai']['api_key']
-            if not self.config['openai']['api_key'] or 'YOUR_' in self.config['openai']['api_key'].upper():
-                raise ValueError("OpenAI API Key nicht konfiguriert!")
-
-            # Odoo
-            odoo_config = self.config['odoo']
+        """Richtet die API-Verbindungen ein: Odoo-Login und IMAP-Prüfung laufen parallel (höchstens
+        startup.timeout Sekunden); ein nicht erreichbares Backend führt zum eingeschränkten Start
+        statt zum Abbruch. Das OpenAI-SDK wird erst beim ersten KI-Aufruf geladen."""
+        # OpenAI (nur Konfiguration prüfen - kein Netzwerk)
+        api_key = self.config['openai']['api_key']
+        if not api_key or 'YOUR_' in api_key.upper():
+            self.logger.error("❌ API-Setup fehlgeschlagen: OpenAI API Key nicht konfiguriert!")
+            sys.exit(1)
 
-            self.logger.info(f"🔍 Odoo-Verbindungstest:")
-            self.logger.info(f"   URL: {odoo_config['url']}")
-            self.logger.info(f"   Database: {odoo_config['database']}")
-            self.logger.info(f"   Username: {odoo_config['username']}")
+        startup_config = self.config.get('startup', {})
+        timeout = startup_config.get('timeout', 15)
+        executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='startup')
+        odoo_future = executor.submit(self.get_odoo_connection, self.config['odoo'])
+        imap_future = executor.submit(self.check_imap) if startup_config.get('check_imap', True) else None
+        executor.shutdown(wait=False)
 
-            # Normale Verbindung versuchen
-            context = ssl.create_default_context()
-            self.odoo_common = xmlrpc.client.ServerProxy(
-                f'{odoo_config["url"]}/xmlrpc/2/common', context=context)
+        # Odoo (Verbindung wird im Pool für weitere Mandanten wiederverwendet)
+        try:
+            self.odoo_models, self.odoo_uid = odoo_future.result(timeout=timeout)
+            self.logger.info("✅ APIs erfolgreich verbunden")
+            self.logger.info(f"🔐 Odoo User ID: {self.odoo_uid}")
+        except Exception as e:
+            if not is_outage_error(e) and not odoo_future.running():
+                self.logger.error(f"❌ API-Setup fehlgeschlagen: {e}")
+                sys.exit(1)
+            # Login hängt noch (Timeout) - Verbindung wird später nachgeholt
+            self.odoo_models, self.odoo_uid = self.defer_odoo_connection(self.config['odoo'], str(e) or 'Timeout')
 
-            # Server-Erreichbarkeit testen
+        if imap_future:
             try:
-                version = self.odoo_common.version()
-                self.logger.info(f"✅ Odoo-Server erreichbar: {version}")
+                imap_future.result(timeout=timeout)
             except Exception as e:
-                self.logger.error(f"❌ Odoo-Server nicht erreichbar: {e}")
-
-                # ERWEITERTE Fehleranalyse für Server-Down-Erkennung
-                error_str = str(e).lower()
-
-                if any(indicator in error_str for indicator in ["timed out", "timeout", "read timeout"]):
-                    self.logger.error("🚨 SERVER-PROBLEM ERKANNT: Timeout")
-                    self.check_and_report_server_issues(odoo_config['url'], "Timeout")
-                elif any(indicator in error_str for indicator in ["connection refused", "connection reset", "connection aborted"]):
-                    self.logger.error("🚨 SERVER-PROBLEM ERKANNT: Verbindung verweigert")
-                    self.check_and_report_server_issues(odoo_config['url'], "Connection Refused")
-                elif any(indicator in error_str for indicator in ["bad gateway", "502", "service unavailable", "503", "gateway timeout", "504"]):
-                    self.logger.error("🚨 SERVER-PROBLEM ERKANNT: Gateway-Fehler")
-                    self.check_and_report_server_issues(odoo_config['url'], "Gateway Error")
-                elif "ssl" in error_str:
-                    self.logger.error("💡 Mögliche Ursache: SSL/TLS-Verbindungsproblem")
-                else:
-                    # Unbekannter Fehler - prüfe trotzdem Status
-                    self.check_and_report_server_issues(odoo_config['url'], f"Unbekannter Fehler: {e}")
-
-                raise
-
-            self.odoo_models = xmlrpc.client.ServerProxy(
-                f'{odoo_config["url"]}/xmlrpc/2/object', context=context)
-
-            # Odoo Authentifizierung mit Server-Down-Erkennung
-            self.logger.info("🔐 Versuche Authentifizierung...")
+                self.logger.warning(f"⚠️ IMAP beim Start nicht erreichbar: {str(e) or 'Timeout'} - "
+                                    f"neuer Versuch im nächsten Zyklus")
 
+    def check_imap(self):
+        """IMAP-Login prüfen (nur zur Meldung - das Postfach wird in jedem Zyklus neu geöffnet)"""
+        email_config = self.config['email']
+        mail = imaplib.IMAP4_SSL(email_config['imap_server'], email_config['imap_port'])
+        try:
+            mail.login(email_config['imap_username'], email_config['imap_password'])
+            self.logger.info(f"✅ IMAP-Login erfolgreich: {email_config['imap_username']}")
+        finally:
+            mail.logout()
+
+    def get_odoo_connection(self, odoo_config: dict) -> tuple:
+        """Liefert (models, uid) für eine Odoo-Instanz - eine Verbindung pro URL/Datenbank/Benutzer
+        (Odoo nicht erreichbar → nachgeholte Verbindung, uid None)"""
+        key = (odoo_config['url'], odoo_config['database'], odoo_config['username'])
+        if key not in self.odoo_connections:
             try:
-                self.odoo_uid = self.odoo_common.authenticate(
-                    odoo_config['database'],
-                    odoo_config['username'],
-                    odoo_config['password'],
-                    {}
-                )
-            except Exception as auth_e:
-                # Prüfe ob es ein Server-Problem ist
-                auth_error_str = str(auth_e).lower()
-                if any(indicator in auth_error_str for indicator in ["timed out", "timeout", "connection", "502", "503", "504", "bad gateway"]):
-                    self.logger.error("🚨 SERVER-PROBLEM bei Authentifizierung erkannt!")
-                    self.check_and_report_server_issues(odoo_config['url'], f"Auth-Fehler: {auth_e}")
-                    raise
-                else:
-                    # Normaler Auth-Fehler, weiterleiten
+                connection = self.connect_odoo(odoo_config)
+            except Exception as e:
+                if not is_outage_error(e):
                     raise
+                return self.defer_odoo_connection(odoo_config, e)
+            current = self.odoo_connections.setdefault(key, connection)
+            if current is not connection and isinstance(current[0], DeferredOdooConnection):
+                # Start-Timeout lief ab: der Pool hält schon die nachgeholte Verbindung, die
+                # Komponenten nutzen sie - sie übernimmt dieses Ergebnis statt ersetzt zu werden
+                current[0].adopt(*connection)
+        return self.odoo_connections[key]
+
+    def defer_odoo_connection(self, odoo_config: dict, reason) -> tuple:
+        """Eingeschränkter Start: E-Mails werden angenommen (ggf. extrahiert und gepuffert),
+        Upserts warten, bis die Verbindung nachgeholt ist"""
+        key = (odoo_config['url'], odoo_config['database'], odoo_config['username'])
+        if key not in self.odoo_connections:
+            retry_interval = self.config.get('startup', {}).get('retry_interval', 10)
+            self.odoo_connections[key] = (DeferredOdooConnection(self, odoo_config, retry_interval), None)
+            self.logger.warning(f"⚠️ Odoo beim Start nicht erreichbar ({reason}) - eingeschränkter Start, "
+                                f"Verbindung wird nachgeholt")
+        return self.odoo_connections[key]
+
+    def reconnect_odoo(self, odoo_config: dict) -> tuple:
+        """Stiller Login für nachgeholte Verbindungen (Diagnose lief bereits beim Start, wirft bei Fehlern)"""
+        context = ssl.create_default_context()
+        odoo_common = xmlrpc.client.ServerProxy(f'{odoo_config["url"]}/xmlrpc/2/common', context=context)
+        odoo_uid = odoo_common.authenticate(odoo_config['database'], odoo_config['username'],
+                                            odoo_config['password'], {})
+        if not odoo_uid:
+            raise ValueError("Odoo-Authentifizierung fehlgeschlagen")
+        return ThreadLocalServerProxy(f'{odoo_config["url"]}/xmlrpc/2/object', context=context), odoo_uid
+
+    def connect_odoo(self, odoo_config: dict) -> tuple:
+        """Baut eine Odoo-Verbindung auf und authentifiziert (wirft bei Fehlern)"""
+        self.logger.info(f"🔍 Odoo-Verbindungstest:")
+        self.logger.info(f"   URL: {odoo_config['url']}")
+        self.logger.info(f"   Database: {odoo_config['database']}")
+        self.logger.info(f"   Username: {odoo_config['username']}")
+
+        # Normale Verbindung versuchen
+        context = ssl.create_default_context()
+        odoo_common = xmlrpc.client.ServerProxy(
+            f'{odoo_config["url"]}/xmlrpc/2/common', context=context)
+
+        # Server-Erreichbarkeit testen
+        try:
+            version = odoo_common.version()
+            self.logger.info(f"✅ Odoo-Server erreichbar: {version}")
+        except Exception as e:
+            self.logger.error(f"❌ Odoo-Server nicht erreichbar: {e}")
+
+            # ERWEITERTE Fehleranalyse für Server-Down-Erkennung
+            error_str = str(e).lower()
+
+            if any(indicator in error_str for indicator in ["timed out", "timeout", "read timeout"]):
+                self.logger.error("🚨 SERVER-PROBLEM ERKANNT: Timeout")
+                self.check_and_report_server_issues(odoo_config['url'], "Timeout")
+            elif any(indicator in error_str for indicator in ["connection refused", "connection reset", "connection aborted"]):
+                self.logger.error("🚨 SERVER-PROBLEM ERKANNT: Verbindung verweigert")
+                self.check_and_report_server_issues(odoo_config['url'], "Connection Refused")
+            elif any(indicator in error_str for indicator in ["bad gateway", "502", "service unavailable", "503", "gateway timeout", "504"]):
+                self.logger.error("🚨 SERVER-PROBLEM ERKANNT: Gateway-Fehler")
+                self.check_and_report_server_issues(odoo_config['url'], "Gateway Error")
+            elif "ssl" in error_str:
+                self.logger.error("💡 Mögliche Ursache: SSL/TLS-Verbindungsproblem")
+            else:
+                # Unbekannter Fehler - prüfe trotzdem Status
+                self.check_and_report_server_issues(odoo_config['url'], f"Unbekannter Fehler: {e}")
 
-            if not self.odoo_uid:
-                # Hier könnten wir auch nochmal prüfen ob es ein Server-Problem ist
-                # indem wir eine einfache Version-Abfrage machen
-                try:
-                    test_version = self.odoo_common.version()
-                    # Server funktioniert, also echter Auth-Fehler
-                    error_msg = "❌ Odoo-Authentifizierung fehlgeschlagen!\n"
-                    error_msg += "💡 Mögliche Ursachen:\n"
-                    error_msg += "   • Falsches Passwort\n"
-                    error_msg += "   • 2FA aktiviert → API-Schlüssel benötigt\n"
-                    error_msg += "   • Account gesperrt nach zu vielen Versuchen\n"
-                    error_msg += "   • Benutzer hat keine API-Berechtigung\n"
-                    error_msg += "   • Database-Name falsch\n"
-                    error_msg += "\n🔧 Lösungsschritte:\n"
-                    error_msg += "   1. Login im Browser testen\n"
-                    error_msg += "   2. Bei 2FA: API-Schlüssel erstellen\n"
-                    error_msg += "   3. Passwort zurücksetzen\n"
-                    error_msg += "   4. Admin kontaktieren\n"
-
-                    raise ValueError(error_msg)
-                except:
-                    # Server-Problem auch hier
-                    self.logger.error("🚨 SERVER-PROBLEM: Authentifizierung gibt False zurück aber Server antwortet nicht")
-                    self.check_and_report_server_issues(odoo_config['url'], "Auth returns False + Server unresponsive")
-                    raise ValueError("Server-Problem während Authentifizierung")
+            raise
 
-            self.logger.info("✅ APIs erfolgreich verbunden")
-            self.logger.info(f"🔐 Odoo User ID: {self.odoo_uid}")
+        # Thread-lokal, damit Hintergrund-Jobs (z.B. Outbox) eigene Verbindungen nutzen
+        odoo_models = ThreadLocalServerProxy(
+            f'{odoo_config["url"]}/xmlrpc/2/object', context=context)
 
-        except Exception as e:
-            self.logger.error(f"❌ API-Setup fehlgeschlagen: {e}")
-            sys.exit(1)
+        # Odoo Authentifizierung mit Server-Down-Erkennung
+        self.logger.info("🔐 Versuche Authentifizierung...")
+
+        try:
+            odoo_uid = odoo_common.authenticate(
+                odoo_config['database'],
+                odoo_config['username'],
+                odoo_config['password'],
+                {}
+            )
+        except Exception as auth_e:
+            # Prüfe ob es ein Server-Problem ist
+            auth_error_str = str(auth_e).lower()
+            if any(indicator in auth_error_str for indicator in ["timed out", "timeout", "connection", "502", "503", "504", "bad gateway"]):
+                self.logger.error("🚨 SERVER-PROBLEM bei Authentifizierung erkannt!")
+                self.check_and_report_server_issues(odoo_config['url'], f"Auth-Fehler: {auth_e}")
+                raise
+            else:
+                # Normaler Auth-Fehler, weiterleiten
+                raise
+
+        if not odoo_uid:
+            # Hier könnten wir auch nochmal prüfen ob es ein Server-Problem ist
+            # indem wir eine einfache Version-Abfrage machen
+            try:
+                test_version = odoo_common.version()
+                # Server funktioniert, also echter Auth-Fehler
+                error_msg = "❌ Odoo-Authentifizierung fehlgeschlagen!\n"
+                error_msg += "💡 Mögliche Ursachen:\n"
+                error_msg += "   • Falsches Passwort\n"
+                error_msg += "   • 2FA aktiviert → API-Schlüssel benötigt\n"
+                error_msg += "   • Account gesperrt nach zu vielen Versuchen\n"
+                error_msg += "   • Benutzer hat keine API-Berechtigung\n"
+                error_msg += "   • Database-Name falsch\n"
+                error_msg += "\n🔧 Lösungsschritte:\n"
+                error_msg += "   1. Login im Browser testen\n"
+                error_msg += "   2. Bei 2FA: API-Schlüssel erstellen\n"
+                error_msg += "   3. Passwort zurücksetzen\n"
+                error_msg += "   4. Admin kontaktieren\n"
+
+                raise ValueError(error_msg)
+            except:
+                # Server-Problem auch hier
+                self.logger.error("🚨 SERVER-PROBLEM: Authentifizierung gibt False zurück aber Server antwortet nicht")
+                self.check_and_report_server_issues(odoo_config['url'], "Auth returns False + Server unresponsive")
+                raise ValueError("Server-Problem während Authentifizierung")
+
+        return odoo_models, odoo_uid
 
     def check_and_report_server_issues(self, odoo_url: str, error_type: str):
+        """Startet die Server-Diagnose im Hintergrund (HTTP-Abfragen bis 20 s sollen Start und
+        Verbindungsaufbau nicht aufhalten; startup.diagnostics: false = aus)"""
+        if not self.config.get('startup', {}).get('diagnostics', True):
+            return
+        threading.Thread(target=self.report_server_issues, args=(odoo_url, error_type),
+                         name='odoo-diagnose', daemon=True).start()
+
+    def report_server_issues(self, odoo_url: str, error_type: str):
         """Prüft und meldet Server-Probleme mit detaillierter Analyse"""
         try:
             self.logger.info("🔍 Führe erweiterte Server-Diagnose durch...")
@@ -4,24 +4,79 @@ KI-Datenextraktion für Kontaktdaten
 Handles OpenAI GPT Integration und Datenvalidierung mit Smart-Strategy
 """
 
-import openai
+import hashlib
 import json
 import re
 import logging
-from typing import Dict, List
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from metrics import metrics, timed
+from structured_contact import card_for_address, is_complete, to_contact_data
+
+# openai-SDK erst beim ersten KI-Aufruf laden (schneller Start; Benchmark/Tests setzen ein Ersatzmodul)
+openai = None
+_openai_lock = threading.Lock()
+
+
+def load_openai(api_key: Optional[str] = None):
+    """Liefert das openai-Modul (einmalig importiert, API-Key gesetzt)"""
+    global openai
+    with _openai_lock:
+        if openai is None:
+            import openai as openai_sdk
+            openai_sdk.api_key = api_key
+            openai = openai_sdk
+    return openai
+
+
+class LLMCache:
+    """LRU-Cache für KI-Antworten auf identische Prompts (von Mandanten mit gleichem Modell geteilt)"""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        return hashlib.sha256('\x00'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+    def get(self, key: str):
+        with self._lock:
+            response = self._entries.get(key)
+            if response is not None:
+                self._entries.move_to_end(key)
+            return response
+
+    def put(self, key: str, response):
+        with self._lock:
+            self._entries[key] = response
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
 
 
 class DataExtractor:
-    def __init__(self, config: dict, logger: logging.Logger, prompts: dict):
-        """Initialisiert Datenextraktor"""
+    def __init__(self, config: dict, logger: logging.Logger, prompts: dict, llm_cache: Optional[LLMCache] = None):
+        """Initialisiert Datenextraktor (llm_cache: optional geteilter Antwort-Cache)"""
         self.config = config
         self.logger = logger
         self.prompts = prompts
+        self.llm_cache = llm_cache
 
-    def apply_smart_strategy(self, email_text: str) -> str:
-        """Smart-Strategy: Erste 2000 + Letzte 1000 Zeichen für Kostenoptimierung"""
+        # vCard-Anhänge / hCard-Signaturen des Absenders ersetzen den KI-Aufruf, wenn vollständig
+        structured_config = config.get('structured_contacts', {})
+        self.structured_enabled = structured_config.get('enabled', True)
+        self.structured_html = structured_config.get('html_signatures', True)
 
-        self.logger.info(f"🔧 Smart-Strategy Input: {len(email_text)} Zeichen")
+    @timed('smart_strategy')
+    def apply_smart_strategy(self, email_text: str, focus=None) -> str:
+        """Smart-Strategy: Erste 2000 + Letzte 1000 Zeichen für Kostenoptimierung
+        (focus: ForwardHeader der Original-Nachricht - Footer endet an deren Signatur statt am älteren Verlauf)"""
+
+        self.logger.debug("🔧 Smart-Strategy Input: %d Zeichen", len(email_text))
 
         strategy = self.config.get('smart_strategy', {})
         if not strategy.get('enabled', False):
@@ -34,34 +89,42 @@ class DataExtractor:
         max_total = strategy.get('max_total_chars', 3000)
 
         if len(email_text) <= max_total:
-            self.logger.info(f"📧 Kurze E-Mail ({len(email_text)} Zeichen) - vollständig verarbeitet")
+            self.logger.info("📧 Kurze E-Mail (%d Zeichen) - vollständig verarbeitet", len(email_text))
             return email_text
 
-        # Erste N Zeichen (Head)
-        head = email_text[:head_chars].rstrip()
-
-        # Letzte M Zeichen (Footer)
-        footer = email_text[-footer_chars:].lstrip()
-
-        # Separator mit Info über übersprungene Zeichen
-        skipped_chars = len(email_text) - head_chars - footer_chars
-        separator = f"\n\n[...{skipped_chars} Zeichen übersprungen für Kostenoptimierung...]\n\n"
-
-        result = head + separator + footer
-
-        self.logger.info(f"🔧 Smart-Strategy angewendet:")
-        self.logger.info(f"   📄 Head: {len(head)} Zeichen")
-        self.logger.info(f"   ⏭️ Übersprungen: {skipped_chars} Zeichen")
-        self.logger.info(f"   📦 Footer: {len(footer)} Zeichen")
-        self.logger.info(f"   📊 Total: {len(result)} Zeichen (Original: {len(email_text)})")
+        # Fenster: Head (Notiz des Weiterleiters + Kopf), Footer (Signatur der Original-Nachricht)
+        message_end = focus.end if focus is not None and focus.end > head_chars else len(email_text)
+        windows = [(0, head_chars)]
+        if focus is not None and focus.start > head_chars // 2:
+            # Lange Notiz vor dem Weiterleitungskopf: Head teilen, damit Kopf und Anfang der Nachricht drin sind
+            windows = [(0, head_chars // 2), (focus.start, focus.start + head_chars - head_chars // 2)]
+        windows.append((min(max(windows[-1][1], message_end - footer_chars), message_end), message_end))
+        windows = [(start, min(end, len(email_text))) for start, end in windows]
+
+        parts = []
+        position = 0
+        for start, end in windows:
+            if start > position:
+                # Separator mit Info über übersprungene Zeichen
+                parts.append(f"\n\n[...{start - position} Zeichen übersprungen für Kostenoptimierung...]\n\n")
+            parts.append(email_text[start:end].strip())
+            position = max(position, end)
+        if position < len(email_text):
+            parts.append(f"\n\n[...{len(email_text) - position} Zeichen älterer Verlauf übersprungen...]")
+
+        result = ''.join(parts)
+        skipped_chars = len(email_text) - sum(end - start for start, end in windows)
+
+        self.logger.info("🔧 Smart-Strategy angewendet: %d Fenster, Übersprungen: %d, Total: %d Zeichen (Original: %d)",
+                         len(windows), skipped_chars, len(result), len(email_text))
 
         return result
 
-    def extract_contact_data(self, email_text: str, biography: str, sender_email: str) -> Dict:
-        """Extrahiert Kontaktdaten mit OpenAI GPT (mit Smart-Strategy)"""
+    def extract_contact_data(self, email_text: str, biography: str, sender_email: str, focus=None) -> Dict:
+        """Extrahiert Kontaktdaten mit OpenAI GPT (mit Smart-Strategy, focus: Kopf der Original-Nachricht)"""
 
         # Smart-Strategy anwenden
-        optimized_text = self.apply_smart_strategy(email_text)
+        optimized_text = self.apply_smart_strategy(email_text, focus)
 
         # Prompt aus YAML laden
         email_prompt_config = self.prompts.get('email_extraction', {})
@@ -85,15 +148,7 @@ Extrahiere alle verfügbaren Kontaktdaten als JSON.
         )
 
         try:
-            response = openai.chat.completions.create(
-                model=self.config['openai']['model'],
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                max_tokens=self.config['openai']['max_tokens'],
-                temperature=self.config['openai']['temperature']
-            )
+            response = self.call_llm(system_prompt, user_prompt)
 
             result_text = response.choices[0].message.content
             if not result_text:
@@ -101,18 +156,18 @@ Extrahiere alle verfügbaren Kontaktdaten als JSON.
                 return self.create_fallback_contact_data(sender_email, biography)
 
             result_text = result_text.strip()
-            self.logger.info(f"🤖 GPT Antwort (Smart-Strategy): {result_text}")
+            self.logger.debug("🤖 GPT Antwort (Smart-Strategy): %s", result_text)
 
             # JSON-Parsing
             contact_data = self.parse_gpt_response(result_text)
             if not contact_data:
                 return self.create_fallback_contact_data(sender_email, biography)
 
-            self.logger.info("✅ JSON erfolgreich geparst - verwende GPT-Daten!")
+            self.logger.debug("✅ JSON erfolgreich geparst - verwende GPT-Daten!")
             contact_data = self.validate_and_clean_contact_data(contact_data, sender_email)
 
             confidence = contact_data.get('confidence', 'medium')
-            self.logger.info(f"✅ Kontaktdaten extrahiert (Confidence: {confidence})")
+            self.logger.info("✅ Kontaktdaten extrahiert (Confidence: %s)", confidence)
 
             return contact_data
 
@@ -120,6 +175,85 @@ Extrahiere alle verfügbaren Kontaktdaten als JSON.
             self.logger.error(f"❌ Fehler bei Datenextraktion: {e}")
             return self.create_fallback_contact_data(sender_email, biography)
 
+    def extract_contacts(self, email_text: str, biography: str, sender_email: str, focus=None,
+                         max_contacts: int = 5) -> List[Dict]:
+        """Alle relevanten Kontakte einer E-Mail mit einem KI-Aufruf - der Absender steht immer an erster Stelle"""
+        optimized_text = self.apply_smart_strategy(email_text, focus)
+
+        prompt_config = self.prompts.get('multi_contact_extraction', {})
+        system_prompt = prompt_config.get('system', 'Du bist ein Experte für Kontaktdaten-Extraktion.')
+        user_template = prompt_config.get('user_template', '''
+ABSENDER-EMAIL: {sender_email}
+BIOGRAPHIE: {biography}
+HÖCHSTENS {max_contacts} KONTAKTE
+E-MAIL-INHALT: {email_text}
+
+Extrahiere alle Kontakte als JSON {{"contacts": [...]}}, der Absender zuerst.
+        ''')
+        user_prompt = user_template.format(sender_email=sender_email, biography=biography,
+                                           email_text=optimized_text, max_contacts=max_contacts)
+
+        try:
+            response = self.call_llm(system_prompt, user_prompt)
+            result_text = (response.choices[0].message.content or '').strip()
+            parsed = self.parse_gpt_response(result_text) if result_text else None
+        except Exception as e:
+            self.logger.error(f"❌ Fehler bei Mehrfach-Extraktion: {e}")
+            parsed = None
+
+        # {"contacts": [...]} - ein einzelnes Kontakt-Objekt wird ebenfalls akzeptiert
+        if isinstance(parsed, dict):
+            raw_contacts = parsed.get('contacts') if 'contacts' in parsed else [parsed]
+        else:
+            raw_contacts = []
+
+        primary = None
+        others: List[Dict] = []
+        seen = {sender_email.lower()}
+        for raw in raw_contacts or []:
+            if not isinstance(raw, dict):
+                continue
+            emails = [e.strip() for e in raw.get('emails') or [] if isinstance(e, str) and '@' in e]
+            if primary is None and (not emails or emails[0].lower() == sender_email.lower()):
+                primary = self.validate_and_clean_contact_data(raw, sender_email)
+                continue
+            # Weitere Kontakte brauchen eine eigene (nicht interne) Adresse; Biographie und Hashtags
+            # des Weiterleiters gelten nur für den Absender
+            raw['biography'] = ''
+            contact_data = self.validate_and_clean_contact_data(raw, emails[0] if emails else '')
+            if not contact_data['emails'] or contact_data['emails'][0].lower() in seen:
+                continue
+            seen.add(contact_data['emails'][0].lower())
+            others.append(contact_data)
+
+        if primary is None:
+            primary = self.create_fallback_contact_data(sender_email, biography)
+
+        contacts = [primary] + others[:max(0, max_contacts - 1)]
+        self.logger.info("✅ %d Kontakt(e) extrahiert (Confidence Absender: %s)",
+                         len(contacts), primary.get('confidence', 'medium'))
+        return contacts
+
+    def extract_structured_contact(self, cards: List[Dict], sender_email: str, biography: str) -> Optional[Dict]:
+        """Kontaktdaten direkt aus vCard/hCard des Absenders (ohne KI-Aufruf) - None, wenn keine
+        vollständige Karte zur Absender-Adresse vorliegt"""
+        if not self.structured_enabled or not cards:
+            return None
+        if not self.structured_html:
+            cards = [card for card in cards if card['source'] != 'hcard']
+
+        card = card_for_address(cards, sender_email)
+        if not card or not is_complete(card):
+            if card:
+                self.logger.debug("📇 Karte für %s unvollständig - KI-Extraktion", sender_email)
+            return None
+
+        contact_data = self.validate_and_clean_contact_data(to_contact_data(card, biography), sender_email)
+        metrics.inc('ki_structured_contacts', source=card['source'])
+        self.logger.info(f"📇 Kontaktdaten aus {'vCard-Anhang' if card['source'] == 'vcard' else 'HTML-Signatur'} "
+                         f"übernommen - kein KI-Aufruf")
+        return contact_data
+
     def extract_manual_contact_data(self, email_text: str, biography: str, sender_email: str) -> Dict:
         """Extrahiert Kontaktdaten aus manuellem Input (mit YAML-Prompts)"""
 
@@ -146,15 +280,7 @@ Extrahiere alle verfügbaren Kontaktdaten als JSON.
         )
 
         try:
-            response = openai.chat.completions.create(
-                model=self.config['openai']['model'],
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                max_tokens=self.config['openai']['max_tokens'],
-                temperature=self.config['openai']['temperature']
-            )
+            response = self.call_llm(system_prompt, user_prompt)
 
             result_text = response.choices[0].message.content
             if not result_text:
@@ -162,17 +288,17 @@ Extrahiere alle verfügbaren Kontaktdaten als JSON.
                 return self.create_fallback_manual_contact_data(sender_email, biography)
 
             result_text = result_text.strip()
-            self.logger.info(f"🤖 GPT Antwort (Manual-Smart): {result_text}")
+            self.logger.debug("🤖 GPT Antwort (Manual-Smart): %s", result_text)
 
             contact_data = self.parse_gpt_response(result_text)
             if not contact_data:
                 return self.create_fallback_manual_contact_data(sender_email, biography)
 
-            self.logger.info("✅ JSON erfolgreich geparst - verwende GPT-Daten (manuell)!")
+            self.logger.debug("✅ JSON erfolgreich geparst - verwende GPT-Daten (manuell)!")
             contact_data = self.validate_and_clean_manual_contact_data(contact_data, sender_email)
 
             confidence = contact_data.get('confidence', 'medium')
-            self.logger.info(f"✅ Manueller Kontakt extrahiert (Confidence: {confidence})")
+            self.logger.info("✅ Manueller Kontakt extrahiert (Confidence: %s)", confidence)
 
             return contact_data
 
@@ -180,6 +306,43 @@ Extrahiere alle verfügbaren Kontaktdaten als JSON.
             self.logger.error(f"❌ Fehler bei manueller Datenextraktion: {e}")
             return self.create_fallback_manual_contact_data(sender_email, biography)
 
+    def call_llm(self, system_prompt: str, user_prompt: str):
+        """Zentraler OpenAI-Aufruf (mit Dauer- und Token-Metriken, Antwort-Cache für identische Prompts)"""
+        openai_config = self.config['openai']
+        cache_key = None
+        if self.llm_cache is not None:
+            cache_key = LLMCache.make_key(openai_config['model'], openai_config['max_tokens'],
+                                          openai_config['temperature'], system_prompt, user_prompt)
+            cached = self.llm_cache.get(cache_key)
+            if cached is not None:
+                metrics.inc('ki_llm_cache_hits')
+                self.logger.debug("🤖 KI-Antwort aus Cache")
+                return cached
+
+        try:
+            with metrics.timer(stage='llm_call'):
+                response = load_openai(openai_config.get('api_key')).chat.completions.create(
+                    model=self.config['openai']['model'],
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    max_tokens=self.config['openai']['max_tokens'],
+                    temperature=self.config['openai']['temperature']
+                )
+        except Exception:
+            metrics.inc('ki_errors', stage='llm_call')
+            raise
+
+        usage = getattr(response, 'usage', None)
+        if usage is not None:
+            metrics.inc('ki_llm_tokens', getattr(usage, 'prompt_tokens', 0) or 0, kind='prompt')
+            metrics.inc('ki_llm_tokens', getattr(usage, 'completion_tokens', 0) or 0, kind='completion')
+
+        if cache_key is not None:
+            self.llm_cache.put(cache_key, response)
+        return response
+
     def parse_gpt_response(self, result_text: str) -> Dict:
         """Parst GPT-Response zu JSON (zentrale Methode)"""
         try:
@@ -211,7 +374,7 @@ Extrahiere alle verfügbaren Kontaktdaten als JSON.
         for key, value in contact_data.items():
             if value is None:
                 contact_data[key] = ''
-            elif isinstance(value, bool):  # Boolean-Werte zu leeren Strings
+            elif isinstance(value, bool) and key != 'is_company':  # Boolean-Werte zu leeren Strings (is_company bleibt)
                 contact_data[key] = ''
 
         # E-Mail-Behandlung
@@ -309,7 +472,7 @@ Extrahiere alle verfügbaren Kontaktdaten als JSON.
         for key, value in contact_data.items():
             if value is None:
                 contact_data[key] = ''
-            elif isinstance(value, bool):  # Boolean-Werte zu leeren Strings
+            elif isinstance(value, bool) and key != 'is_company':  # Boolean-Werte zu leeren Strings (is_company bleibt)
                 contact_data[key] = ''
 
         # E-Mail-Behandlung für manuellen Input
@@ -344,6 +507,7 @@ Extrahiere alle verfügbaren Kontaktdaten als JSON.
 
     def create_fallback_contact_data(self, sender_email: str, biography: str) -> Dict:
         """Erstellt intelligente Fallback-Kontaktdaten bei Parsing-Fehlern"""
+        metrics.inc('ki_fallbacks', kind='email')
 
         name_part = sender_email.split('@')[0] if sender_email else "Unknown"
 
@@ -388,6 +552,7 @@ Extrahiere alle verfügbaren Kontaktdaten als JSON.
 
     def create_fallback_manual_contact_data(self, sender_email: str, biography: str) -> Dict:
         """Erstellt intelligente Fallback-Kontaktdaten für manuellen Input"""
+        metrics.inc('ki_fallbacks', kind='manual')
 
         full_name = "Manueller Kontakt"
 
@@ -447,13 +612,11 @@ Extrahiere alle verfügbaren Kontaktdaten als JSON.
             else:
                 address_str = str(address) if address else 'N/A'
 
-            self.logger.info(f"🎯 Name: {name}")
-            self.logger.info(f"📧 E-Mails: {', '.join(emails) if emails else 'Keine'}")
-            self.logger.info(f"📞 Telefon: {', '.join(phones) if phones else 'Keine'}")
-            self.logger.info(f"🏠 Adresse: {address_str}")
-            self.logger.info(f"🌍 Sprache: {language}")
-            self.logger.info(f"🏷️ Kategorien: {', '.join(categories) if categories else 'Keine'}")
-            self.logger.info(f"🎲 Confidence: {confidence}")
+            self.logger.info("🎯 Name: %s | 🏷️ Kategorien: %s | 🎲 Confidence: %s",
+                             name, ', '.join(categories) if categories else 'Keine', confidence)
+            self.logger.debug("📧 E-Mails: %s | 📞 Telefon: %s | 🏠 Adresse: %s | 🌍 Sprache: %s",
+                              ', '.join(emails) if emails else 'Keine',
+                              ', '.join(phones) if phones else 'Keine', address_str, language)
 
         except Exception as e:
             self.logger.warning(f"⚠️ Fehler beim Logging: {e}")
@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+"""
+Probelauf (Shadow-Modus) für KI-Kontaktassistent
+Schreibende Odoo-Aufrufe (create, write, message_post, unlink) und ausgehende Mails werden
+nicht ausgeführt, sondern als JSON-Zeilen in ein Journal geschrieben (inkl. Vorher/Nachher-Diff).
+Lesende Aufrufe gehen weiter an Odoo und sehen die im Probelauf angelegten/geänderten Datensätze.
+JournalReplayer spielt ein geprüftes Journal später gebündelt gegen Odoo ein.
+
+Beispiel:
+    python main.py --dry-run
+    python dry_run.py data/dry-run-journal.jsonl --no-mail
+"""
+
+import argparse
+import copy
+import email
+import json
+import logging
+import os
+import sys
+import threading
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+MUTATING_METHODS = ('create', 'write', 'unlink', 'message_post')
+
+
+class Journal:
+    """Append-only JSONL-Datei (eine Operation pro Zeile, fortlaufende Nummer)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.seq = sum(1 for _ in self.read(path)) if os.path.exists(path) else 0
+
+    def append(self, entry: Dict) -> int:
+        with self._lock:
+            self.seq += 1
+            line = dict(entry, seq=self.seq, ts=datetime.now().isoformat(timespec='seconds'))
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(line, ensure_ascii=False, default=str) + '\n')
+            return self.seq
+
+    @staticmethod
+    def read(path: str) -> Iterator[Dict]:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _many2many_ids(current: List, commands: List) -> List[int]:
+    """Wendet (6,0,ids)/(4,id)/(3,id)-Kommandos auf eine ID-Liste an"""
+    ids = set(c[0] if isinstance(c, (list, tuple)) else c for c in current or [])
+    for command in commands:
+        if not isinstance(command, (list, tuple)):
+            ids.add(command)
+        elif command[0] == 6:
+            ids = set(command[2])
+        elif command[0] == 4:
+            ids.add(command[1])
+        elif command[0] == 3:
+            ids.discard(command[1])
+    return sorted(ids)
+
+
+def _apply_values(record: Dict, values: Dict):
+    for field, value in values.items():
+        if isinstance(value, list) and value and isinstance(value[0], (list, tuple)):
+            record[field] = _many2many_ids(record.get(field), value)
+        else:
+            record[field] = value
+
+
+def _matches(record: Dict, domain: List) -> bool:
+    """Einfache Domain-Auswertung für Probelauf-Datensätze ('&'/'|' werden als UND behandelt)"""
+    for term in domain:
+        if not isinstance(term, (list, tuple)) or len(term) != 3:
+            continue
+        field, operator, value = term
+        current = record.get(field)
+        if operator == '=' and current != value:
+            return False
+        if operator == '!=' and current == value:
+            return False
+        if operator == 'in' and current not in value:
+            return False
+        if operator in ('ilike', '=ilike'):
+            needle = str(value).lower().strip('%')
+            text = str(current or '').lower()
+            if (needle not in text) if operator == 'ilike' else (needle != text):
+                return False
+    return True
+
+
+class JournalingOdooModels:
+    """Ersetzt das XML-RPC-Objekt: Lesen gegen Odoo (plus Probelauf-Overlay), Schreiben ins Journal"""
+
+    def __init__(self, odoo_models, journal: Journal):
+        self._models = odoo_models
+        self.journal = journal
+        self._lock = threading.Lock()
+        self._next_temp_id = 0
+        # Im Probelauf angelegte Datensätze (negative IDs) und geänderte Felder bestehender Datensätze
+        self.created: Dict[str, Dict[int, Dict]] = {}
+        self.changed: Dict[str, Dict[int, Dict]] = {}
+
+    def _temp_id(self) -> int:
+        with self._lock:
+            self._next_temp_id -= 1
+            return self._next_temp_id
+
+    def execute_kw(self, db, uid, password, model, method, args, kwargs=None):
+        if method in MUTATING_METHODS:
+            return getattr(self, f"_journal_{method}")(db, uid, password, model, args, kwargs or {})
+
+        if method == 'read':
+            return self._read(db, uid, password, model, args, kwargs or {})
+        if method in ('search', 'search_read', 'search_count'):
+            return self._search(db, uid, password, model, method, args, kwargs or {})
+        return self._models.execute_kw(db, uid, password, model, method, args, kwargs or {})
+
+    def _overlay(self, model: str, record: Dict) -> Dict:
+        changes = self.changed.get(model, {}).get(record.get('id'))
+        if changes:
+            record = dict(record)
+            _apply_values(record, changes)
+        return record
+
+    def _read(self, db, uid, password, model, args, kwargs):
+        ids = args[0] if isinstance(args[0], list) else [args[0]]
+        real_ids = [record_id for record_id in ids if record_id > 0]
+        fields = kwargs.get('fields')
+
+        records = {}
+        if real_ids:
+            for record in self._models.execute_kw(db, uid, password, model, 'read', [real_ids], kwargs):
+                records[record['id']] = self._overlay(model, record)
+        for record_id in ids:
+            created = self.created.get(model, {}).get(record_id)
+            if created is not None:
+                record = {field: created.get(field, False) for field in fields} if fields else dict(created)
+                record['id'] = record_id
+                records[record_id] = record
+        return [records[record_id] for record_id in ids if record_id in records]
+
+    def _search(self, db, uid, password, model, method, args, kwargs):
+        domain = args[0] if args else []
+        result = self._models.execute_kw(db, uid, password, model, method, args, kwargs)
+        created = [record for record in self.created.get(model, {}).values() if _matches(record, domain)]
+        if method == 'search_count':
+            return result + len(created)
+        if method == 'search_read':
+            fields = kwargs.get('fields')
+            result = [self._overlay(model, record) for record in result]
+            result.extend(dict({field: record.get(field, False) for field in fields}, id=record['id'])
+                          if fields else dict(record) for record in created)
+            return result
+        return [record['id'] for record in created] + list(result)
+
+    def _journal_create(self, db, uid, password, model, args, kwargs):
+        values_list = args[0] if isinstance(args[0], list) else [args[0]]
+        temp_ids = []
+        for values in values_list:
+            temp_id = self._temp_id()
+            record = {'id': temp_id}
+            _apply_values(record, values)
+            self.created.setdefault(model, {})[temp_id] = record
+            temp_ids.append(temp_id)
+        self.journal.append({'kind': 'odoo', 'model': model, 'method': 'create', 'args': args,
+                             'kwargs': kwargs, 'result': temp_ids if isinstance(args[0], list) else temp_ids[0]})
+        return temp_ids if isinstance(args[0], list) else temp_ids[0]
+
+    def _journal_write(self, db, uid, password, model, args, kwargs):
+        ids, values = args[0], args[1]
+        # Diff: aktueller Stand (Odoo + bisherige Probelauf-Änderungen) gegen neue Werte
+        before = {record['id']: record for record in self._read(db, uid, password, model, [ids],
+                                                                {'fields': list(values)})}
+        diff = {}
+        for record_id in ids:
+            old = before.get(record_id, {})
+            new = dict(old)
+            _apply_values(new, values)
+            changes = {field: [old.get(field), new.get(field)] for field in values
+                       if self._plain(old.get(field)) != self._plain(new.get(field))}
+            if changes:
+                diff[str(record_id)] = changes
+
+            target = self.created.get(model, {}).get(record_id)
+            if target is None:
+                target = self.changed.setdefault(model, {}).setdefault(record_id, {})
+                target.update(copy.deepcopy(values))
+            else:
+                _apply_values(target, values)
+
+        self.journal.append({'kind': 'odoo', 'model': model, 'method': 'write', 'args': args,
+                             'kwargs': kwargs, 'diff': diff})
+        return True
+
+    @staticmethod
+    def _plain(value):
+        """Many2one [id, name] und Many2many-Listen für den Vergleich vereinheitlichen"""
+        if isinstance(value, list) and len(value) == 2 and isinstance(value[0], int) and isinstance(value[1], str):
+            return value[0]
+        if isinstance(value, list):
+            return sorted(v[0] if isinstance(v, (list, tuple)) else v for v in value)
+        return value
+
+    def _journal_message_post(self, db, uid, password, model, args, kwargs):
+        temp_id = self._temp_id()
+        self.journal.append({'kind': 'odoo', 'model': model, 'method': 'message_post', 'args': args,
+                             'kwargs': kwargs, 'result': temp_id})
+        return temp_id
+
+    def _journal_unlink(self, db, uid, password, model, args, kwargs):
+        for record_id in args[0]:
+            self.created.get(model, {}).pop(record_id, None)
+        self.journal.append({'kind': 'odoo', 'model': model, 'method': 'unlink', 'args': args, 'kwargs': kwargs})
+        return True
+
+
+class JournalingSMTPSender:
+    """Ersetzt SMTPSender im Probelauf - Nachrichten landen im Journal statt beim Empfänger"""
+
+    def __init__(self, journal: Journal, logger: logging.Logger):
+        self.journal = journal
+        self.logger = logger
+
+    def send(self, msg):
+        self.journal.append({'kind': 'mail', 'to': msg.get('To'), 'subject': msg.get('Subject'),
+                             'message': msg.as_string()})
+        self.logger.info(f"🧪 Probelauf: E-Mail an {msg.get('To')} nur ins Journal geschrieben")
+
+    def send_batch(self, batch):
+        results = []
+        for msg, tag in batch:
+            self.send(msg)
+            results.append((tag, None))
+        return results
+
+    def close_if_idle(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class JournalReplayer:
+    """Spielt ein Probelauf-Journal gegen Odoo ein (creates gebündelt, Temp-IDs → echte IDs)"""
+
+    def __init__(self, config: dict, logger: logging.Logger, odoo_models, odoo_uid, smtp_sender=None,
+                 batch_size: int = 100, force: bool = False):
+        self.config = config
+        self.logger = logger
+        self.odoo_models = odoo_models
+        self.odoo_uid = odoo_uid
+        self.smtp_sender = smtp_sender
+        self.batch_size = max(1, batch_size)
+        # force: Writes auch anwenden, wenn sich die Felder seit dem Probelauf in Odoo geändert haben
+        self.force = force
+        self.id_map: Dict[int, int] = {}
+        # Letzter vollständig eingespielter Eintrag (für die Wiederaufnahme)
+        self.last_seq = 0
+        self.stats = {'creates': 0, 'writes': 0, 'notes': 0, 'unlinks': 0, 'mails': 0, 'conflicts': 0, 'errors': 0}
+
+    def execute(self, model: str, method: str, args, kwargs: Optional[Dict] = None):
+        odoo_config = self.config['odoo']
+        return self.odoo_models.execute_kw(odoo_config['database'], self.odoo_uid, odoo_config['password'],
+                                           model, method, args, kwargs or {})
+
+    def resolve(self, value):
+        """Ersetzt Temp-IDs (negativ) rekursiv durch die beim Einspielen vergebenen echten IDs"""
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, int):
+            return self.id_map.get(value, value)
+        if isinstance(value, list):
+            return [self.resolve(item) for item in value]
+        if isinstance(value, dict):
+            return {key: self.resolve(item) for key, item in value.items()}
+        return value
+
+    @staticmethod
+    def _temp_ids(value) -> set:
+        if isinstance(value, bool):
+            return set()
+        if isinstance(value, int):
+            return {value} if value < 0 else set()
+        if isinstance(value, list):
+            return set().union(*(JournalReplayer._temp_ids(item) for item in value)) if value else set()
+        if isinstance(value, dict):
+            return JournalReplayer._temp_ids(list(value.values()))
+        return set()
+
+    def flush_creates(self, pending: List[Dict]) -> bool:
+        """Ein create-Aufruf mit Werteliste pro Modell-Block (False = fehlgeschlagen, last_seq bleibt stehen)"""
+        if not pending:
+            return True
+        model = pending[0]['model']
+        values = [self.resolve(entry['args'][0]) for entry in pending]
+        try:
+            real_ids = self.execute(model, 'create', [values])
+        except Exception as e:
+            self.stats['errors'] += len(pending)
+            self.logger.error(f"❌ Journal: {len(pending)} create auf {model} fehlgeschlagen: {e}")
+            return False
+        for entry, real_id in zip(pending, real_ids):
+            self.id_map[entry['result']] = real_id
+        self.stats['creates'] += len(pending)
+        self.logger.info(f"✅ Journal: {len(pending)} {model}-Datensätze angelegt")
+        self.last_seq = pending[-1]['seq']
+        return True
+
+    def has_conflict(self, entry: Dict) -> bool:
+        """True, wenn ein Feld in Odoo nicht mehr den im Probelauf gesehenen Vorher-Wert hat"""
+        diff = entry.get('diff') or {}
+        real = {int(record_id): changes for record_id, changes in diff.items() if int(record_id) > 0}
+        if not real:
+            return False
+        fields = sorted({field for changes in real.values() for field in changes})
+        current = {record['id']: record for record in self.execute(entry['model'], 'read', [list(real)],
+                                                                   {'fields': fields})}
+        for record_id, changes in real.items():
+            for field, (before, _after) in changes.items():
+                now = current.get(record_id, {}).get(field)
+                if JournalingOdooModels._plain(now) != JournalingOdooModels._plain(before):
+                    self.logger.warning(f"⚠️ Journal #{entry['seq']}: {entry['model']} {record_id}.{field} "
+                                        f"seit dem Probelauf geändert - übersprungen")
+                    return True
+        return False
+
+    def apply(self, entry: Dict):
+        """Wendet eine einzelne (nicht gebündelte) Operation an"""
+        if entry['kind'] == 'mail':
+            if self.smtp_sender is not None:
+                self.smtp_sender.send(email.message_from_string(entry['message']))
+                self.stats['mails'] += 1
+            return
+
+        method = entry['method']
+        if method == 'write' and not self.force and self.has_conflict(entry):
+            self.stats['conflicts'] += 1
+            return
+
+        result = self.execute(entry['model'], method, self.resolve(entry['args']), self.resolve(entry.get('kwargs')))
+        if method == 'message_post' and isinstance(result, int):
+            self.id_map[entry['result']] = result
+        self.stats[{'write': 'writes', 'message_post': 'notes', 'unlink': 'unlinks'}.get(method, 'writes')] += 1
+
+    def replay(self, path: str, start_seq: int = 0) -> Dict[str, int]:
+        """Spielt alle Einträge nach start_seq ein (Fortschritt in self.last_seq)"""
+        pending: List[Dict] = []
+        self.last_seq = start_seq
+        for entry in Journal.read(path):
+            if entry['seq'] <= start_seq:
+                continue
+
+            batchable = (entry['kind'] == 'odoo' and entry['method'] == 'create'
+                         and isinstance(entry['args'][0], dict) and not entry.get('kwargs'))
+            # Reihenfolge wahren: Block abschliessen bei Modellwechsel, anderer Operation
+            # oder Bezug auf eine Temp-ID aus dem offenen Block
+            if pending and (not batchable or entry['model'] != pending[0]['model']
+                            or len(pending) >= self.batch_size
+                            or self._temp_ids(entry['args']) & {p['result'] for p in pending}):
+                if not self.flush_creates(pending):
+                    return self.halt(pending)
+                pending = []
+
+            if batchable:
+                pending.append(entry)
+            else:
+                try:
+                    self.apply(entry)
+                except Exception as e:
+                    self.stats['errors'] += 1
+                    self.logger.error(f"❌ Journal #{entry['seq']} ({entry.get('model', 'mail')} "
+                                      f"{entry.get('method', '')}) fehlgeschlagen: {e}")
+                self.last_seq = entry['seq']
+
+        if not self.flush_creates(pending):
+            return self.halt(pending)
+        return self.stats
+
+    def halt(self, pending: List[Dict]) -> Dict[str, int]:
+        """Bricht nach einem fehlgeschlagenen create-Block ab - spätere Einträge verweisen auf dessen
+        Temp-IDs; ein erneuter Aufruf setzt vor dem Block wieder an"""
+        self.logger.error(f"🛑 Journal: Einspielen vor Eintrag #{pending[0]['seq']} angehalten - "
+                          f"nach Behebung des Fehlers erneut aufrufen")
+        return self.stats
+
+
+def load_state(path: str) -> Dict:
+    """Fortschritt eines früheren Einspielens (letzte Sequenz + ID-Zuordnung)"""
+    state_path = path + '.replayed'
+    if not os.path.exists(state_path):
+        return {'seq': 0, 'id_map': {}}
+    with open(state_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_state(path: str, seq: int, id_map: Dict[int, int]):
+    with open(path + '.replayed', 'w', encoding='utf-8') as f:
+        json.dump({'seq': seq, 'id_map': {str(k): v for k, v in id_map.items()},
+                   'updated_at': datetime.now().isoformat(timespec='seconds')}, f, indent=2)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Probelauf-Journal gegen Odoo einspielen")
+    parser.add_argument('journal', help="Journal-Datei (JSONL) aus einem Probelauf")
+    parser.add_argument('--config', default='config-sys.yml', help="Konfigurationsdatei")
+    parser.add_argument('--no-mail', action='store_true', help="Journalisierte E-Mails nicht versenden")
+    parser.add_argument('--batch-size', type=int, default=100, help="Datensätze pro create-Aufruf")
+    parser.add_argument('--force', action='store_true',
+                        help="Writes auch anwenden, wenn sich die Felder seit dem Probelauf geändert haben")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    print("🧪 KI-Kontaktassistent - Probelauf-Journal einspielen")
+    print("=" * 50)
+
+    arguments = parse_args()
+    if not os.path.exists(arguments.journal):
+        print(f"❌ Journal nicht gefunden: {arguments.journal}")
+        sys.exit(1)
+
+    from config_manager import ConfigManager
+    from smtp_sender import SMTPSender
+
+    config_manager = ConfigManager(arguments.config)
+    config = config_manager.get_config()
+    logger = config_manager.get_logger()
+    odoo_models, odoo_uid = config_manager.get_odoo_connections()
+    smtp_sender = None if arguments.no_mail else SMTPSender(config, logger)
+
+    replayer = JournalReplayer(config, logger, odoo_models, odoo_uid, smtp_sender,
+                               arguments.batch_size, arguments.force)
+    state = load_state(arguments.journal)
+    replayer.id_map = {int(k): v for k, v in state['id_map'].items()}
+    if state['seq']:
+        print(f"♻️ Setze nach Eintrag #{state['seq']} fort")
+
+    try:
+        replayer.replay(arguments.journal, state['seq'])
+    except KeyboardInterrupt:
+        print("🛑 Einspielen unterbrochen - Fortsetzung mit erneutem Aufruf möglich")
+    finally:
+        if smtp_sender is not None:
+            smtp_sender.close()
+        save_state(arguments.journal, replayer.last_seq, replayer.id_map)
+
+    print("=" * 50)
+    print(f"✅ Bis Eintrag #{replayer.last_seq} eingespielt: {replayer.stats}")
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Duplikat-Erkennung vor dem Anlegen von Personen-Kontakten
+Lokaler Blocking-Index über alle Personen-Partner: Telefonnummern (E.164), phonetische
+Namensschlüssel (Kölner Phonetik) und PLZ+Strasse. Liefert Kandidaten per Dict-Zugriff (ohne
+Odoo-Suche), bevor dieselbe Person unter einer zweiten E-Mail-Adresse neu angelegt wird.
+Wird beim Start geladen und über write_date inkrementell nachgeführt (wie der Firmen-Index).
+"""
+
+import logging
+import re
+import threading
+import time
+import unicodedata
+from typing import Dict, List, Optional, Set
+
+# Partnerfelder, aus denen die Blocking-Schlüssel entstehen
+INDEX_FIELDS = ('name', 'email', 'phone', 'mobile', 'street', 'zip', 'write_date')
+
+# Landesvorwahlen für nationale Nummern ("079 ..." → "+4179...")
+CALLING_CODES = {'CH': '41', 'DE': '49', 'AT': '43', 'LI': '423', 'FR': '33', 'IT': '39', 'NL': '31',
+                 'BE': '32', 'LU': '352', 'GB': '44', 'US': '1', 'RU': '7', 'ES': '34'}
+
+_UMLAUTS = str.maketrans({'ä': 'ae', 'ö': 'oe', 'ü': 'ue', 'ß': 'ss'})
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+_STREET_WORD = re.compile(r'(strasse|str\b)')
+_TRUNK_ZERO = re.compile(r'\(0\)')
+# Titel/Anreden zählen nicht zum Namen
+_NAME_NOISE = {'dr', 'prof', 'med', 'dipl', 'ing', 'herr', 'frau', 'mr', 'mrs', 'ms', 'von', 'van', 'der', 'de'}
+
+
+def _fold(text: str) -> str:
+    folded = (text or '').casefold().translate(_UMLAUTS)
+    return ''.join(char for char in unicodedata.normalize('NFKD', folded) if not unicodedata.combining(char))
+
+
+def normalize_phone(phone: str, default_country: str = 'CH') -> Optional[str]:
+    """Telefonnummer in E.164 ("+41 (0)41 123 45 67" / "041 123 45 67" → "+41411234567")"""
+    if not phone or not isinstance(phone, str):
+        return None
+    digits = re.sub(r'[^\d+]', '', _TRUNK_ZERO.sub('', phone))
+    if digits.startswith('+'):
+        number = digits[1:].replace('+', '')
+    elif digits.startswith('00'):
+        number = digits[2:]
+    elif digits.startswith('0') and default_country in CALLING_CODES:
+        number = CALLING_CODES[default_country] + digits[1:]
+    else:
+        return None
+    return f"+{number}" if 8 <= len(number) <= 15 else None
+
+
+def koelner_phonetik(word: str) -> str:
+    """Kölner Phonetik (phonetischer Code für deutsche Namen: "Meier" = "Mayer" = "Maier" → "67")"""
+    letters = [char for char in _fold(word).upper() if 'A' <= char <= 'Z']
+    codes = []
+    for index, char in enumerate(letters):
+        previous = letters[index - 1] if index else ''
+        following = letters[index + 1] if index + 1 < len(letters) else ''
+        if char in 'AEIJOUY':
+            code = '0'
+        elif char == 'H':
+            continue
+        elif char == 'B':
+            code = '1'
+        elif char == 'P':
+            code = '3' if following == 'H' else '1'
+        elif char in 'DT':
+            code = '8' if following in ('C', 'S', 'Z') else '2'
+        elif char in 'FVW':
+            code = '3'
+        elif char in 'GKQ':
+            code = '4'
+        elif char == 'C':
+            if index == 0:
+                code = '4' if following and following in 'AHKLOQRUX' else '8'
+            elif previous in ('S', 'Z'):
+                code = '8'
+            else:
+                code = '4' if following and following in 'AHKOQUX' else '8'
+        elif char == 'X':
+            code = '8' if previous in ('C', 'K', 'Q') else '48'
+        elif char == 'L':
+            code = '5'
+        elif char in 'MN':
+            code = '6'
+        elif char == 'R':
+            code = '7'
+        elif char in 'SZ':
+            code = '8'
+        else:
+            continue
+        codes.append(code)
+
+    collapsed = []
+    for code in ''.join(codes):
+        if not collapsed or collapsed[-1] != code:
+            collapsed.append(code)
+    return ''.join(code for position, code in enumerate(collapsed) if code != '0' or position == 0)
+
+
+def name_key(name: str) -> Optional[str]:
+    """Reihenfolge-unabhängiger Namensschlüssel aus Vor- und Nachname ("Keller, Peter" = "Peter Keler")"""
+    tokens = [token for token in _NON_ALNUM.sub(' ', _fold(name)).split() if token not in _NAME_NOISE]
+    if len(tokens) < 2:
+        return None
+    codes = sorted(koelner_phonetik(token) for token in (tokens[0], tokens[-1]))
+    return '|'.join(codes) if all(codes) else None
+
+
+def address_key(zip_code: str, street: str) -> Optional[str]:
+    """PLZ + normalisierte Strasse ("Hauptstraße 5" = "Hauptstr. 5")"""
+    if not zip_code or not street or not isinstance(zip_code, str) or not isinstance(street, str):
+        return None
+    street = _NON_ALNUM.sub('', _STREET_WORD.sub('str', _fold(street)))
+    zip_code = _NON_ALNUM.sub('', _fold(zip_code))
+    return f"{zip_code}|{street}" if zip_code and street else None
+
+
+class DuplicateIndex:
+    def __init__(self, config: dict, logger: logging.Logger, odoo_models, odoo_uid):
+        """Initialisiert den Duplikat-Index (duplicates.enabled: Startladen + inkrementeller Abgleich)"""
+        self.config = config
+        self.logger = logger
+        self.odoo_models = odoo_models
+        self.odoo_uid = odoo_uid
+
+        duplicate_config = config.get('duplicates', {})
+        self.enabled = duplicate_config.get('enabled', True)
+        self.default_country = duplicate_config.get('default_country', 'CH')
+        self.sync_interval = duplicate_config.get('sync_interval', 300)
+        self.full_reload_interval = duplicate_config.get('full_reload_interval', 86400)
+
+        # Blocking-Schlüssel → Partner-IDs
+        self._by_phone: Dict[str, Set[int]] = {}
+        self._by_name: Dict[str, Set[int]] = {}
+        self._by_address: Dict[str, Set[int]] = {}
+        # Partner-ID → Schlüssel und Werte (zum Nachführen bei Änderungen)
+        self._entries: Dict[int, Dict] = {}
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self.high_water: Optional[str] = None
+        self.synced_at = 0.0
+        self.loaded_at = 0.0
+        # Wanduhrzeit des letzten kompletten Aufbaus (überdauert den Neustart im Snapshot)
+        self.loaded_wall = 0.0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _search_persons(self, domain: List) -> List[Dict]:
+        return self.odoo_models.execute_kw(
+            self.config['odoo']['database'],
+            self.odoo_uid,
+            self.config['odoo']['password'],
+            'res.partner', 'search_read',
+            [[['is_company', '=', False]] + domain],
+            {'fields': list(INDEX_FIELDS)}
+        )
+
+    def load(self):
+        """Lädt alle Personen-Partner (ein search_read) und baut die Blocking-Schlüssel neu auf"""
+        if not self.enabled:
+            return
+        try:
+            partners = self._search_persons([])
+        except Exception as e:
+            self.logger.warning(f"⚠️ Duplikat-Index nicht geladen: {e}")
+            return
+
+        with self._lock:
+            self._by_phone.clear()
+            self._by_name.clear()
+            self._by_address.clear()
+            self._entries.clear()
+            self.high_water = None
+            for partner in partners:
+                self._index(partner['id'], partner)
+        self.synced_at = self.loaded_at = time.monotonic()
+        self.loaded_wall = time.time()
+        self.logger.info(f"👥 Duplikat-Index geladen: {len(partners)} Personen, {len(self._by_phone)} Telefonnummern")
+
+    def sync_if_due(self, force: bool = False):
+        """Inkrementeller Abgleich über write_date, kompletter Neuaufbau alle full_reload_interval Sekunden
+        (force: sofort)"""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        if not force and now - self.synced_at < self.sync_interval:
+            return
+        if not self._sync_lock.acquire(blocking=False):
+            return
+        try:
+            if now - self.loaded_at >= self.full_reload_interval or self.high_water is None:
+                self.load()
+                return
+            # >=: Sekundenauflösung von write_date - gleiche Sekunde wie die Hochwassermarke nicht verpassen
+            changed = self._search_persons([['write_date', '>=', self.high_water]])
+            with self._lock:
+                for partner in changed:
+                    self._index(partner['id'], partner)
+            self.synced_at = time.monotonic()
+        except Exception as e:
+            self.logger.warning(f"⚠️ Duplikat-Index-Abgleich fehlgeschlagen: {e}")
+            self.synced_at = time.monotonic()
+        finally:
+            self._sync_lock.release()
+
+    def snapshot(self) -> Optional[Dict]:
+        """Stand für den Warmstart-Snapshot inkl. berechneter Schlüssel (None = nie geladen)"""
+        if not self.enabled or not self.loaded_wall:
+            return None
+        with self._lock:
+            entries = {str(partner_id): {'keys': {kind: sorted(keys) for kind, keys in entry['keys'].items()},
+                                         'values': entry['values']}
+                       for partner_id, entry in self._entries.items()}
+        return {'data': {'loaded_wall': self.loaded_wall, 'entries': entries}, 'high_water': self.high_water}
+
+    def restore(self, snapshot: Dict) -> bool:
+        """Übernimmt einen Snapshot ohne Neuberechnung der Phonetik - Abgleich danach über sync_if_due(force=True)"""
+        if not self.enabled:
+            return False
+        data = snapshot['data']
+        with self._lock:
+            self._by_phone.clear()
+            self._by_name.clear()
+            self._by_address.clear()
+            self._entries.clear()
+            maps = self._maps()
+            for partner_id, entry in data['entries'].items():
+                partner_id = int(partner_id)
+                keys = {kind: set(keys) for kind, keys in entry['keys'].items()}
+                for kind, index in maps.items():
+                    for key in keys[kind]:
+                        index.setdefault(key, set()).add(partner_id)
+                self._entries[partner_id] = {'keys': keys, 'values': entry['values']}
+            self.high_water = snapshot['high_water']
+        self.loaded_wall = data['loaded_wall']
+        self.loaded_at = time.monotonic() - max(0.0, time.time() - self.loaded_wall)
+        self.synced_at = 0.0
+        self.logger.info(f"👥 Duplikat-Index aus Snapshot: {len(self._entries)} Personen (Stand {self.high_water})")
+        return True
+
+    def _keys(self, values: Dict) -> Dict[str, Set[str]]:
+        phones = {normalize_phone(values.get(field) or '', self.default_country) for field in ('phone', 'mobile')}
+        name = name_key(values.get('name') or '')
+        address = address_key(values.get('zip') or '', values.get('street') or '')
+        return {'phone': {phone for phone in phones if phone},
+                'name': {name} if name else set(),
+                'address': {address} if address else set()}
+
+    def _maps(self) -> Dict[str, Dict[str, Set[int]]]:
+        return {'phone': self._by_phone, 'name': self._by_name, 'address': self._by_address}
+
+    def _index(self, partner_id: int, values: Dict):
+        """Nimmt eine Person auf bzw. ersetzt ihre Schlüssel (Lock muss gehalten werden)"""
+        self._forget(partner_id)
+        values = {field: values.get(field) or '' for field in INDEX_FIELDS}
+        keys = self._keys(values)
+        for kind, index in self._maps().items():
+            for key in keys[kind]:
+                index.setdefault(key, set()).add(partner_id)
+        self._entries[partner_id] = {'keys': keys, 'values': values}
+
+        write_date = values.get('write_date')
+        if write_date and (self.high_water is None or write_date > self.high_water):
+            self.high_water = write_date
+
+    def _forget(self, partner_id: int):
+        entry = self._entries.pop(partner_id, None)
+        if not entry:
+            return
+        for kind, index in self._maps().items():
+            for key in entry['keys'][kind]:
+                ids = index.get(key)
+                if ids:
+                    ids.discard(partner_id)
+                    if not ids:
+                        del index[key]
+
+    def add(self, partner_id: int, values: Dict):
+        """Eigenen Schreibzugriff sofort übernehmen (Werte wie für res.partner.create/write)"""
+        if not self.enabled or values.get('is_company'):
+            return
+        with self._lock:
+            merged = dict(self._entries.get(partner_id, {}).get('values', {}))
+            merged.update({field: value for field, value in values.items() if field in INDEX_FIELDS})
+            self._index(partner_id, merged)
+
+    def candidates(self, values: Dict, exclude: Optional[int] = None) -> List[Dict]:
+        """Mögliche Duplikate: [{'id', 'name', 'email', 'reasons', 'strong'}], stärkste zuerst.
+        strong = gleicher Namensschlüssel plus gleiche Telefonnummer oder Adresse (Telefon/Adresse
+        allein teilen sich oft Kollegen derselben Firma)"""
+        if not self.enabled or values.get('is_company'):
+            return []
+        self.sync_if_due()
+        keys = self._keys(values)
+        reasons: Dict[int, Set[str]] = {}
+        with self._lock:
+            for kind, index in self._maps().items():
+                for key in keys[kind]:
+                    for partner_id in index.get(key, ()):
+                        if partner_id != exclude:
+                            reasons.setdefault(partner_id, set()).add(kind)
+            found = [{'id': partner_id, 'name': self._entries[partner_id]['values']['name'],
+                      'email': self._entries[partner_id]['values']['email'], 'reasons': sorted(kinds),
+                      'strong': 'name' in kinds and len(kinds) >= 2}
+                     for partner_id, kinds in reasons.items() if partner_id in self._entries]
+        found.sort(key=lambda candidate: (not candidate['strong'], -len(candidate['reasons']), candidate['id']))
+        return found
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Inhalts-Fingerprints für Near-Duplicate-Erkennung
+SimHash über den normalisierten Originalinhalt einer weitergeleiteten E-Mail,
+damit dieselbe Original-Mail von verschiedenen Weiterleitern erkannt wird
+"""
+
+import hashlib
+import re
+from typing import List, Optional, Tuple
+
+SIMHASH_BITS = 64
+LSH_BANDS = 4
+BAND_BITS = SIMHASH_BITS // LSH_BANDS
+# Unterhalb dieser Token-Anzahl ist ein Fingerprint nicht aussagekräftig
+MIN_TOKENS = 12
+
+# Marker, ab denen der weitergeleitete Originalinhalt beginnt
+FORWARD_MARKERS = re.compile(
+    r'(-{3,}\s*(weitergeleitete nachricht|forwarded message|original message|ursprüngliche nachricht)'
+    r'|^\s*(von|from)\s*:)',
+    re.IGNORECASE | re.MULTILINE
+)
+
+_QUOTE_PREFIX = re.compile(r'^[\s>]+', re.MULTILINE)
+_NON_WORD = re.compile(r'[^\wäöüß@.]+', re.IGNORECASE)
+_PLACEHOLDERS = re.compile(r'\[(BILD|BASE64|CID)_ENTFERNT\]')
+
+
+def original_part(body: str) -> str:
+    """Schneidet den Weiterleiter-Teil (Biographie, Hashtags) vor dem ersten Forward-Marker ab"""
+    match = FORWARD_MARKERS.search(body)
+    if not match:
+        return body
+
+    # Trennzeile selbst (sprach-/clientabhängig) nicht mit einbeziehen
+    if match.group(2):
+        line_end = body.find('\n', match.end())
+        return body[line_end + 1:] if line_end != -1 else body[match.end():]
+    return body[match.start():]
+
+
+def normalize(text: str) -> List[str]:
+    """Normalisiert Text zu Tokens (Kleinschreibung, ohne Zitatzeichen und Platzhalter)"""
+    text = _PLACEHOLDERS.sub(' ', text)
+    text = _QUOTE_PREFIX.sub('', text)
+    return [token for token in _NON_WORD.split(text.lower()) if token]
+
+
+def simhash(tokens: List[str], shingle_size: int = 3) -> int:
+    """64-Bit-SimHash über Wort-Shingles"""
+    if not tokens:
+        return 0
+
+    if len(tokens) < shingle_size:
+        shingles = [' '.join(tokens)]
+    else:
+        shingles = [' '.join(tokens[i:i + shingle_size]) for i in range(len(tokens) - shingle_size + 1)]
+
+    weights = [0] * SIMHASH_BITS
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.md5(shingle.encode('utf-8')).digest()[:8], 'big')
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+
+    result = 0
+    for bit in range(SIMHASH_BITS):
+        if weights[bit] > 0:
+            result |= 1 << bit
+    return result
+
+
+def bands(value: int) -> Tuple[int, ...]:
+    """Zerlegt einen SimHash in LSH-Bänder (bei <= LSH_BANDS-1 Bit Abstand teilt sich mind. ein Band)"""
+    mask = (1 << BAND_BITS) - 1
+    return tuple((value >> (i * BAND_BITS)) & mask for i in range(LSH_BANDS))
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Anzahl unterschiedlicher Bits"""
+    return bin(a ^ b).count('1')
+
+
+def content_fingerprint(original_sender: str, body: str) -> Optional[int]:
+    """Fingerprint aus normalisiertem Original-Absender + Originalinhalt (None bei zu wenig Inhalt)"""
+    tokens = normalize(original_part(body))
+    if len(tokens) < MIN_TOKENS:
+        return None
+    return simhash([original_sender.strip().lower()] + tokens)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Parser für Weiterleitungs- und Antwort-Köpfe in E-Mail-Texten
+Erkennt Outlook-, Gmail-, Apple-Mail- und Thunderbird-Formate (deutsch/englisch) in einem
+einzigen Durchlauf über den Text (eine kompilierte Grammatik) und liefert die Weiterleitungskette:
+pro weitergeleiteter/zitierter Nachricht Absender, Datum, Betreff und Textbereich.
+Funktioniert auch mit HTML-Mails, deren Text keine Zeilenumbrüche mehr enthält.
+"""
+
+import re
+from typing import Callable, List, Optional
+
+# Trennzeilen vor einem weitergeleiteten Kopf (Thunderbird, Gmail, Outlook, Apple Mail)
+_SEPARATOR = (
+    r'-{2,}\s*(?:weitergeleitete\s+nachricht|forwarded\s+message|original\s+message|'
+    r'urspr(?:ü|ue)ngliche\s+nachricht)\s*-{2,}'
+    r'|_{10,}'
+    r'|(?:begin\s+forwarded\s+message|anfang\s+der\s+weitergeleiteten\s+nachricht)\s*:'
+)
+
+# Kopfzeilen eines weitergeleiteten Blocks - nur am Zeilen-/Wortanfang (auch "> Von:" und "*From:*")
+_FIELD = (
+    r'(?<![^\s>*])(?P<key>von|from|absender|gesendet|sent|datum|date|betreff|subject|an|to|cc|kopie)'
+    r'\s*:\*?'
+)
+
+# Antwort-Einleitung (Gmail/Apple/Thunderbird): "Am <Datum> schrieb <Name>:" / "On <Datum>, <Name> wrote:"
+_REPLY = r'(?-i:(?<!\S)(?:Am|On)\s)(?P<reply>[^\n]{4,200}?)\b(?:schrieb|wrote)\b(?P<reply_tail>[^\n:]{0,160}):'
+
+GRAMMAR = re.compile(
+    rf'(?P<sep>{_SEPARATOR})|(?P<field>{_FIELD})|(?P<reply_intro>{_REPLY})',
+    re.IGNORECASE | re.MULTILINE
+)
+
+FIELD_NAMES = {
+    'von': 'from', 'from': 'from', 'absender': 'from',
+    'gesendet': 'date', 'sent': 'date', 'datum': 'date', 'date': 'date',
+    'betreff': 'subject', 'subject': 'subject',
+    'an': 'to', 'to': 'to', 'cc': 'cc', 'kopie': 'cc',
+}
+
+EMAIL_ADDRESS = re.compile(r'[A-Za-z0-9._%+-]+@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,}')
+
+# Kopfzeilen, die weiter als so viele Zeichen auseinander liegen, gehören nicht zum selben Block
+MAX_FIELD_GAP = 400
+MAX_VALUE_LENGTH = 200
+
+
+class ForwardHeader:
+    """Kopf einer weitergeleiteten oder zitierten Nachricht (kind: 'forward' oder 'reply')"""
+
+    __slots__ = ('kind', 'sender_name', 'sender_email', 'date', 'subject', 'to', 'start', 'header_end', 'end')
+
+    def __init__(self, kind: str, start: int):
+        self.kind = kind
+        self.sender_name = ''
+        self.sender_email = None
+        self.date = ''
+        self.subject = ''
+        self.to = ''
+        self.start = start
+        # Ende des Kopfes bzw. der Nachricht (Anfang des nächsten Blocks) im Text
+        self.header_end = start
+        self.end = start
+
+    def set_sender(self, value: str):
+        match = EMAIL_ADDRESS.search(value)
+        self.sender_email = match.group() if match else None
+        # Ohne Adresse (z.B. HTML ohne Zeilenumbrüche) nur den Anfang als Namen nehmen
+        name = value[:match.start()] if match else ' '.join(value.split()[:4])
+        self.sender_name = name.replace('mailto:', '').strip(' \t"\'<[(*').strip()
+
+    def __repr__(self):
+        return (f"ForwardHeader({self.kind}, {self.sender_email or self.sender_name!r}, "
+                f"date={self.date!r}, subject={self.subject!r}, {self.start}-{self.end})")
+
+
+class ForwardChain:
+    """Weiterleitungskette in Textreihenfolge (zuerst die zuletzt weitergeleitete Nachricht)"""
+
+    def __init__(self, headers: List[ForwardHeader], has_markers: bool):
+        self.headers = headers
+        # True, wenn der Text überhaupt Weiterleitungs-/Kopfzeilen enthält (sonst: manueller Input)
+        self.has_markers = has_markers
+
+    def __len__(self):
+        return len(self.headers)
+
+    def __iter__(self):
+        return iter(self.headers)
+
+    def original(self, is_excluded: Optional[Callable[[str], bool]] = None) -> Optional[ForwardHeader]:
+        """Absender der weitergeleiteten Nachricht: erster Block mit (nicht ausgeschlossener) Adresse,
+        Weiterleitungsköpfe vor Antwort-Einleitungen"""
+        for kind in ('forward', 'reply'):
+            for header in self.headers:
+                if (header.kind == kind and header.sender_email and
+                        not (is_excluded and is_excluded(header.sender_email))):
+                    return header
+        return None
+
+
+def _field_value(text: str, start: int, limit: int) -> str:
+    """Feldwert bis zum nächsten Token, Zeilenende oder MAX_VALUE_LENGTH"""
+    end = min(limit, start + MAX_VALUE_LENGTH)
+    newline = text.find('\n', start, end)
+    if newline != -1:
+        end = newline
+    return text[start:end].strip(' \t\r*')
+
+
+def parse_forward_chain(text: str) -> ForwardChain:
+    """Zerlegt den Text in einem Durchlauf in Weiterleitungs-/Antwort-Blöcke"""
+    tokens = list(GRAMMAR.finditer(text or ''))
+    headers: List[ForwardHeader] = []
+    current: Optional[ForwardHeader] = None
+    last_token_end = 0
+
+    for index, token in enumerate(tokens):
+        next_start = tokens[index + 1].start() if index + 1 < len(tokens) else len(text)
+
+        if token.group('sep'):
+            current = ForwardHeader('forward', token.start())
+            current.header_end = token.end()
+            headers.append(current)
+        elif token.group('reply_intro'):
+            header = ForwardHeader('reply', token.start())
+            # Deutsch: Name nach "schrieb", Englisch: Name (und Adresse) vor "wrote"
+            intro, tail = token.group('reply'), token.group('reply_tail').strip()
+            header.set_sender(tail or intro)
+            match = EMAIL_ADDRESS.search(intro)
+            header.date = (intro[:match.start()] if match else intro).strip(' ,<')
+            header.header_end = token.end()
+            headers.append(header)
+            current = None
+        else:
+            key = FIELD_NAMES[token.group('key').lower()]
+            value = _field_value(text, token.end(), next_start)
+            near = current is not None and token.start() - last_token_end <= MAX_FIELD_GAP
+
+            if key == 'from' and not (near and current.sender_email is None and not current.sender_name):
+                # Neuer Block (Outlook ohne Trennzeile) bzw. nächster Kopf in der Kette
+                current = ForwardHeader('forward', token.start())
+                headers.append(current)
+            elif not near:
+                continue
+
+            if key == 'from':
+                current.set_sender(value)
+            elif key in ('date', 'subject', 'to') and not getattr(current, key):
+                setattr(current, key, value)
+            current.header_end = token.end() + len(value)
+
+        last_token_end = token.end()
+
+    # Leere Trennzeilen-Blöcke (ohne Kopfzeilen) verwerfen, Textbereiche schliessen
+    headers = [h for h in headers if h.sender_email or h.sender_name or h.subject or h.date]
+    for index, header in enumerate(headers):
+        header.end = headers[index + 1].start if index + 1 < len(headers) else len(text or '')
+
+    return ForwardChain(headers, has_markers=bool(tokens))
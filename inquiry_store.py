@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Offene Kategorie-Rückfragen (lokal, SQLite)
+Pro gesendeter KI-Rückfrage: Message-ID, Ziel-Partner und unbekannte Kategorien.
+Antworten werden über In-Reply-To/References direkt zugeordnet - ohne Kontaktsuche
+und ohne den zitierten Text nach der Ziel-Adresse zu durchsuchen.
+"""
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+# Message-IDs in In-Reply-To/References ("<abc@host> <def@host>")
+MESSAGE_ID = re.compile(r'<[^<>\s]+>')
+
+
+def referenced_message_ids(email_message) -> List[str]:
+    """Message-IDs, auf die eine Antwort verweist - In-Reply-To zuerst, dann References von hinten"""
+    ids = MESSAGE_ID.findall(str(email_message.get('In-Reply-To', '') or ''))
+    for message_id in reversed(MESSAGE_ID.findall(str(email_message.get('References', '') or ''))):
+        if message_id not in ids:
+            ids.append(message_id)
+    return ids
+
+
+class InquiryStore:
+    def __init__(self, config: dict, logger: logging.Logger, db_path: Optional[str] = None):
+        """Initialisiert die Rückfrage-Tabelle (SQLite, teilt sich die lokale Datenbank)"""
+        self.config = config
+        self.logger = logger
+        self.db_path = db_path or config.get('local_db', {}).get('path', 'data/processing.db')
+        self.keep_days = config.get('inquiries', {}).get('keep_days', 90)
+
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS pending_inquiries (
+                message_id TEXT PRIMARY KEY,
+                partner_id INTEGER,
+                contact_email TEXT NOT NULL,
+                forwarder TEXT,
+                invalid_tags TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                answered_at TEXT
+            )
+        ''')
+        self.prune()
+
+    def add(self, message_id: str, partner_id: Optional[int], contact_email: str, forwarder: str,
+            invalid_tags: List[str]):
+        """Merkt eine gesendete Rückfrage vor"""
+        try:
+            with self._lock:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO pending_inquiries (message_id, partner_id, contact_email, forwarder, '
+                    'invalid_tags, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+                    (message_id, partner_id, contact_email, forwarder,
+                     json.dumps(invalid_tags, ensure_ascii=False), datetime.now().isoformat(timespec='seconds'))
+                )
+        except sqlite3.Error as e:
+            # Ohne Eintrag greift bei der Antwort die Text-Erkennung
+            self.logger.warning(f"⚠️ Rückfrage nicht vorgemerkt: {e}")
+
+    def resolve(self, message_ids: List[str]) -> Optional[Dict]:
+        """Rückfrage zur ersten bekannten Message-ID (Primärschlüssel-Zugriff), sonst None"""
+        if not message_ids:
+            return None
+        with self._lock:
+            for message_id in message_ids:
+                row = self._conn.execute(
+                    'SELECT message_id, partner_id, contact_email, forwarder, invalid_tags, answered_at '
+                    'FROM pending_inquiries WHERE message_id = ?', (message_id,)
+                ).fetchone()
+                if row:
+                    return {'message_id': row[0], 'partner_id': row[1], 'contact_email': row[2],
+                            'forwarder': row[3], 'invalid_tags': json.loads(row[4]), 'answered_at': row[5]}
+        return None
+
+    def mark_answered(self, message_id: str):
+        """Antwort verarbeitet (Eintrag bleibt für weitere Antworten im selben Thread erhalten)"""
+        with self._lock:
+            self._conn.execute('UPDATE pending_inquiries SET answered_at = ? WHERE message_id = ?',
+                               (datetime.now().isoformat(timespec='seconds'), message_id))
+
+    def prune(self):
+        """Entfernt Rückfragen älter als inquiries.keep_days"""
+        cutoff = (datetime.now() - timedelta(days=self.keep_days)).isoformat(timespec='seconds')
+        with self._lock:
+            cursor = self._conn.execute('DELETE FROM pending_inquiries WHERE created_at < ?', (cutoff,))
+        if cursor.rowcount:
+            self.logger.info(f"🧹 Rückfragen: {cursor.rowcount} alte Einträge entfernt")
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Arbeits-Leases für mehrere Instanzen an einem Postfach
+Jede E-Mail wird vor der KI-Extraktion von genau einer Instanz beansprucht (Lease mit Ablaufzeit).
+Abgestürzte Instanzen geben ihre Leases durch Ablauf frei; abgeschlossene E-Mails bleiben für alle gesperrt.
+"""
+
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Optional, Set
+
+
+class LeaseStore:
+    def __init__(self, config: dict, logger: logging.Logger, db_path: Optional[str] = None):
+        """Initialisiert den Lease-Speicher (SQLite-Datei, von allen Instanzen gemeinsam genutzt)"""
+        self.config = config
+        self.logger = logger
+
+        coordination_config = config.get('coordination', {})
+        self.db_path = (db_path or coordination_config.get('db_path')
+                        or config.get('local_db', {}).get('path', 'data/processing.db'))
+        self.lease_seconds = coordination_config.get('lease_seconds', 600)
+        self.keep_done_days = coordination_config.get('keep_done_days', 30)
+        # Eindeutige Kennung dieser Instanz (Host, Prozess, Start)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        # Von dieser Instanz gehaltene, noch nicht abgeschlossene Leases
+        self.owned: Set[str] = set()
+
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # timeout: andere Instanzen halten die Schreibsperre nur kurz
+        self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS leases (
+                email_id TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT 'claimed',
+                expires_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 1,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        self.prune()
+
+    def claim(self, email_id: str) -> bool:
+        """Beansprucht eine E-Mail - True, wenn diese Instanz sie verarbeiten darf"""
+        now = time.time()
+        with self._lock:
+            # Atomar: neu anlegen, oder übernehmen falls abgelaufen bzw. bereits eigenes Lease
+            cursor = self._conn.execute(
+                'INSERT INTO leases (email_id, owner, state, expires_at, updated_at) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (email_id) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at, '
+                'attempts = leases.attempts + (leases.owner != excluded.owner), updated_at = excluded.updated_at '
+                'WHERE leases.state = ? AND (leases.expires_at < ? OR leases.owner = excluded.owner)',
+                (email_id, self.owner, 'claimed', now + self.lease_seconds, now, 'claimed', now)
+            )
+        if cursor.rowcount:
+            self.owned.add(email_id)
+            return True
+        return False
+
+    def renew(self, email_id: str) -> bool:
+        """Verlängert ein eigenes Lease - False, wenn es inzwischen an eine andere Instanz gegangen ist"""
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                'UPDATE leases SET expires_at = ?, updated_at = ? WHERE email_id = ? AND owner = ? AND state = ?',
+                (now + self.lease_seconds, now, email_id, self.owner, 'claimed')
+            )
+        if not cursor.rowcount:
+            self.owned.discard(email_id)
+            return False
+        return True
+
+    def complete(self, email_id: str):
+        """Markiert eine E-Mail als endgültig verarbeitet (für alle Instanzen gesperrt)"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'UPDATE leases SET state = ?, updated_at = ? WHERE email_id = ? AND owner = ?',
+                ('done', now, email_id, self.owner)
+            )
+        self.owned.discard(email_id)
+
+    def release(self, email_id: str):
+        """Gibt ein eigenes Lease frei (z.B. nach Fehler), damit eine andere Instanz es erneut versuchen kann"""
+        with self._lock:
+            self._conn.execute(
+                'UPDATE leases SET expires_at = 0 WHERE email_id = ? AND owner = ? AND state = ?',
+                (email_id, self.owner, 'claimed')
+            )
+        self.owned.discard(email_id)
+
+    def release_owned(self):
+        """Gibt alle noch gehaltenen, nicht abgeschlossenen Leases frei"""
+        for email_id in list(self.owned):
+            self.release(email_id)
+
+    def is_done(self, email_id: str) -> bool:
+        """True, wenn irgendeine Instanz die E-Mail bereits abgeschlossen hat"""
+        with self._lock:
+            row = self._conn.execute('SELECT state FROM leases WHERE email_id = ?', (email_id,)).fetchone()
+        return bool(row and row[0] == 'done')
+
+    def prune(self):
+        """Entfernt alte abgeschlossene Leases"""
+        cutoff = time.time() - self.keep_done_days * 86400
+        with self._lock:
+            cursor = self._conn.execute('DELETE FROM leases WHERE state = ? AND updated_at < ?', ('done', cutoff))
+        if cursor.rowcount:
+            self.logger.info(f"🧹 {cursor.rowcount} alte Leases entfernt")
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Logging-Infrastruktur für KI-Kontaktassistent
+Nicht-blockierendes Logging (QueueHandler/QueueListener), größenbasierte Rotation,
+JSON-Records mit Korrelations-ID pro E-Mail und Sampling für Debug-Dumps
+"""
+
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import queue
+import re
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, Optional
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(correlation_id)s] %(message)s'
+
+# Korrelations-ID der gerade verarbeiteten E-Mail ('-' ausserhalb einer Verarbeitung)
+correlation_id = ContextVar('correlation_id', default='-')
+
+_sample_counters: Dict[str, itertools.count] = {}
+_sample_rate = 1
+
+
+def parse_size(value) -> int:
+    """Wandelt Grössenangaben wie '10MB' oder '512KB' in Bytes um"""
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = re.match(r'^\s*(\d+(?:\.\d+)?)\s*([KMG]?)B?\s*$', str(value), re.IGNORECASE)
+    if not match:
+        return 10 * 1024 * 1024
+    factor = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}[match.group(2).upper()]
+    return int(float(match.group(1)) * factor)
+
+
+@contextmanager
+def correlation_scope(value: Optional[str] = None):
+    """Setzt die Korrelations-ID für alle Log-Einträge innerhalb des Blocks"""
+    token = correlation_id.set(value or uuid.uuid4().hex[:8])
+    try:
+        yield correlation_id.get()
+    finally:
+        correlation_id.reset(token)
+
+
+def sample_debug(logger: logging.Logger, key: str) -> bool:
+    """True, wenn ein ausführlicher Debug-Dump geschrieben werden soll (jeder N-te pro Schlüssel)"""
+    if not logger.isEnabledFor(logging.DEBUG):
+        return False
+    counter = _sample_counters.setdefault(key, itertools.count())
+    return next(counter) % _sample_rate == 0
+
+
+class CorrelationFilter(logging.Filter):
+    """Hängt die aktuelle Korrelations-ID an jeden Record (läuft im erzeugenden Thread)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.correlation_id = correlation_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Ein JSON-Objekt pro Zeile"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'correlation_id': getattr(record, 'correlation_id', '-'),
+            'msg': record.getMessage(),
+        }
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data['exc'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, der bei voller Queue verwirft statt den Verarbeitungs-Thread zu blockieren"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(log_config: dict) -> logging.handlers.QueueListener:
+    """Richtet Root-Logging über eine Queue ein - Datei- und Konsolen-I/O laufen im Listener-Thread"""
+    global _sample_rate
+    _sample_rate = max(1, int(log_config.get('debug_sample_rate', 1)))
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        log_config['file'],
+        maxBytes=parse_size(log_config.get('max_file_size', '10MB')),
+        backupCount=log_config.get('backup_count', 5),
+        encoding='utf-8'
+    )
+    if log_config.get('format', 'text') == 'json':
+        file_handler.setFormatter(JsonFormatter())
+    else:
+        file_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    log_queue = queue.Queue(maxsize=log_config.get('queue_size', 10000))
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(CorrelationFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(getattr(logging, log_config['level']))
+
+    listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler,
+                                              respect_handler_level=True)
+    listener.start()
+    # Restliche Einträge beim Beenden noch schreiben
+    atexit.register(stop_listener, listener)
+    return listener
+
+
+def stop_listener(listener: logging.handlers.QueueListener):
+    """Stoppt den Listener (mehrfacher Aufruf unschädlich) und leert die Queue"""
+    if getattr(listener, '_thread', None) is not None:
+        listener.stop()
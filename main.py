@@ -4,89 +4,119 @@ KI-Kontaktassistent für Odoo - Hauptprogramm
 Automatische Erfassung und Pflege von Kontaktdaten aus E-Mails
 """
 
+import argparse
 import imaplib
 import email
+import email.parser
 import re
 import time
-import os
 import hashlib
+import threading
 from datetime import datetime
 from email.header import decode_header
-from typing import Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 import sys
 
 # Import der anderen Module
 from config_manager import ConfigManager
-from data_extractor import DataExtractor
+from data_extractor import DataExtractor, LLMCache
+from dry_run import Journal, JournalingOdooModels, JournalingSMTPSender
+from fingerprint import content_fingerprint
+from inquiry_store import referenced_message_ids
+from forward_parser import ForwardChain, parse_forward_chain
+from lease_store import LeaseStore
+from log_setup import correlation_scope
+from mime_worker import (MimeParsePool, candidate_emails, extract_biography, html_to_text, message_body_text,
+                         safe_message_cards)
+from metrics import metrics, start_metrics_server
 from odoo_manager import OdooManager
+from processed_store import ProcessedStore
+from profiler import CycleProfiler
+from upsert_buffer import UpsertBuffer
+
+# Eigene Adressen/Domains - nie als Kontakt übernehmen
+INTERNAL_ADDRESS_MARKERS = ('ki-adress-admin', 'ki-kontakt-admin', '@5gfrei.ch', '@andreas-gross.ch')
+
+
+def is_internal_address(address: str) -> bool:
+    return any(marker in address for marker in INTERNAL_ADDRESS_MARKERS)
 
 
 class KIKontaktAssistent:
-    def __init__(self, config_file: str = "config-sys.yml"):
-        """Initialisierung des KI-Kontaktassistenten"""
+    def __init__(self, config_file: str = "config-sys.yml", config_manager=None, profiler: Optional[CycleProfiler] = None,
+                 llm_cache: Optional[LLMCache] = None):
+        """Initialisierung des KI-Kontaktassistenten (config_manager: z.B. Offline-Ersatz für Benchmarks oder Mandant)"""
 
         # Komponenten initialisieren
-        self.config_manager = ConfigManager(config_file)
+        self.config_manager = config_manager or ConfigManager(config_file)
         self.config = self.config_manager.get_config()
         self.logger = self.config_manager.get_logger()
 
+        # Optionaler Zyklus-Profiler (--profile), None = kein Overhead
+        self.profiler = profiler
+
+        # Mandanten-Name (Metrik-Label), 'default' im Einzelbetrieb
+        self.tenant = self.config.get('tenant', {}).get('name', 'default')
+
+        # KI-Antwort-Cache (bei mehreren Mandanten geteilt), cache_size 0 = aus
+        cache_size = self.config['openai'].get('cache_size', 256)
+        if llm_cache is None and cache_size:
+            llm_cache = LLMCache(cache_size)
+
         # Odoo-Verbindung herstellen
         odoo_models, odoo_uid = self.config_manager.get_odoo_connections()
 
+        # Probelauf: Schreibzugriffe und Mails nur ins Journal, eigene lokale DB, Postfach unverändert
+        self.journal = None
+        dry_run_config = self.config.get('dry_run', {})
+        if dry_run_config.get('enabled', False):
+            self.journal = Journal(dry_run_config.get('journal', 'data/dry-run-journal.jsonl'))
+            self.config.setdefault('local_db', {})['path'] = dry_run_config.get('db_path', 'data/dry-run.db')
+            self.config.setdefault('coordination', {})['enabled'] = False
+            odoo_models = JournalingOdooModels(odoo_models, self.journal)
+        # RFC822 setzt \\Seen schon beim Abruf (fehlgeschlagene Mails kommen nicht endlos wieder),
+        # im Probelauf bleibt das Postfach mit BODY.PEEK[] unverändert
+        self.fetch_parts = '(BODY.PEEK[])' if self.journal else '(RFC822)'
+
         # Module initialisieren
-        self.data_extractor = DataExtractor(self.config, self.logger, self.config_manager.get_prompts())
+        self.data_extractor = DataExtractor(self.config, self.logger, self.config_manager.get_prompts(), llm_cache)
         self.odoo_manager = OdooManager(self.config, self.logger, odoo_models, odoo_uid, self.config_manager.get_prompts())
+        if self.journal:
+            self.odoo_manager.smtp_sender = JournalingSMTPSender(self.journal, self.logger)
 
-        # Verarbeitete E-Mails tracking
-        self.processed_emails = self.load_processed_emails()
-
-        self.logger.info("🤖 KI-Kontaktassistent gestartet")
-        self.logger.info(f"📊 {len(self.odoo_manager.odoo_categories)} Kategorien verfügbar")
-
-    def load_processed_emails(self) -> set:
-        """Lädt bereits verarbeitete E-Mail-IDs (Duplikat-Schutz)"""
-        try:
-            processed_file = "data/processed_emails.txt"
-            os.makedirs(os.path.dirname(processed_file), exist_ok=True)
-
-            if os.path.exists(processed_file):
-                with open(processed_file, 'r') as f:
-                    return set(line.strip() for line in f if line.strip())
-            return set()
-        except Exception as e:
-            self.logger.warning(f"⚠️ Fehler beim Laden verarbeiteter E-Mails: {e}")
-            return set()
+        # Verarbeitungsstatus pro E-Mail (Duplikat-Schutz + Wiederaufnahme)
+        self.processed_store = ProcessedStore(self.config, self.logger)
 
-    def save_processed_email(self, email_id: str):
-        """Speichert verarbeitete E-Mail-ID"""
-        try:
-            processed_file = "data/processed_emails.txt"
-            os.makedirs(os.path.dirname(processed_file), exist_ok=True)
+        # Extraktionen während eines Odoo-Ausfalls (gebündelt geschrieben, sobald Odoo wieder antwortet)
+        self.upsert_buffer = UpsertBuffer(self.config, self.logger)
+        self.extract_while_down = self.config.get('odoo_health', {}).get('extract_while_down', False)
+        # Archiv-Import: Extraktionen puffern (E-Mail-ID → Nachrichten-Schlüssel) und blockweise schreiben
+        self.deferred_upserts: Optional[Dict[str, str]] = None
+        self.odoo_manager.health.start()
 
-            with open(processed_file, 'a', encoding='utf-8') as f:
-                f.write(f"{email_id}\n")
-            self.processed_emails.add(email_id)
+        # Arbeits-Leases, wenn mehrere Instanzen dasselbe Postfach bedienen
+        self.leases = LeaseStore(self.config, self.logger) if self.config.get('coordination', {}).get('enabled', False) else None
 
-            # Cleanup alter Einträge (alle 1000 Einträge)
-            self.cleanup_processed_emails()
+        # Mehrere Kontakte pro E-Mail (ein KI-Aufruf, Firma einmal auflösen, Personen gebündelt anlegen)
+        self.multi_contact_config = self.config.get('multi_contact', {})
 
-        except Exception as e:
-            self.logger.warning(f"⚠️ Fehler beim Speichern der E-Mail-ID: {e}")
+        # Hintergrund-Thread für die Outbox (Timeline-Notizen, Bestätigungen)
+        self.outbox_thread = None
 
-    def cleanup_processed_emails(self):
-        """Bereinigt alte verarbeitete E-Mail-IDs"""
-        try:
-            # Vereinfacht: Behalte nur letzten 1000 Einträge
-            if len(self.processed_emails) > 1000:
-                self.processed_emails = set(list(self.processed_emails)[-1000:])
+        # Optionaler Prozess-Pool für das MIME-Parsing (mehrere Kerne)
+        self.parse_pool = MimeParsePool(self.config, self.logger) if self.config.get('parse_pool', {}).get('enabled', False) else None
 
-                processed_file = "data/processed_emails.txt"
-                with open(processed_file, 'w', encoding='utf-8') as f:
-                    for email_id in self.processed_emails:
-                        f.write(f"{email_id}\n")
+        # Optionaler Metrik-Endpunkt + periodische Zusammenfassung im Log
+        metrics_config = self.config.get('metrics', {})
+        self.metrics_summary_interval = metrics_config.get('summary_interval', 600)
+        self.last_metrics_summary = time.monotonic()
+        if metrics_config.get('enabled', False):
+            start_metrics_server(metrics_config.get('host', '127.0.0.1'), metrics_config.get('port', 9464), self.logger)
 
-        except Exception as e:
-            self.logger.warning(f"⚠️ Fehler beim Cleanup: {e}")
+        self.logger.info("🤖 KI-Kontaktassistent gestartet")
+        if self.journal:
+            self.logger.info(f"🧪 Probelauf aktiv - Änderungen gehen nur ins Journal {self.journal.path}")
+        self.logger.info(f"📊 {len(self.odoo_manager.odoo_categories)} Kategorien verfügbar")
 
     def extract_forwarder_email(self, email_message) -> Optional[str]:
         """Extrahiert die E-Mail-Adresse des Weiterleiters"""
@@ -110,96 +140,36 @@ class KIKontaktAssistent:
     def extract_primary_email(self, email_message) -> Optional[str]:
         """Extrahiert die ursprüngliche Absender-E-Mail aus weitergeleiteter E-Mail ODER aus manuellem Input"""
         try:
-            # E-Mail-Body nach ursprünglicher E-Mail durchsuchen
             body = self.get_email_body_text(email_message)
             if body:
-                # Konfigurierbare maximale Länge für bessere Extraktion
-                max_email_length = self.config.get('assistant', {}).get('max_email_length', 3000)
-                search_body = body[:max_email_length * 2]  # Doppelte Länge für Suche
-
-                self.logger.info(f"🔍 E-Mail-Body für Extraktion (erste 500 Zeichen): {search_body[:500]}...")
-
-                # NEUE: Prüfe ob es sich um manuellen Input handelt (kein E-Mail-Header-Kontext)
-                manual_input_indicators = [
-                    'von:', 'from:', 'forwarded message', 'weitergeleitete nachricht',
-                    'original message', 'subject:', 'betreff:', 'sent:', 'gesendet:'
-                ]
+                chain = self.get_forward_chain(email_message)
+                candidates = self.get_candidate_emails(email_message)
 
-                has_email_context = any(indicator in search_body.lower() for indicator in manual_input_indicators)
-
-                if not has_email_context:
+                # Manueller Input: keine Weiterleitungs-/Kopfzeilen im Text
+                if not chain.has_markers:
                     self.logger.info("📝 Manueller Kontakt-Input erkannt (kein E-Mail-Kontext)")
                     # Suche direkt nach E-Mail-Adressen im Content
-                    email_pattern = r'([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})'
-                    email_matches = re.findall(email_pattern, search_body)
-
-                    for email_addr in email_matches:
-                        clean_email = email_addr.strip()
-                        # Ausschlüsse: interne E-Mails
-                        if (clean_email and
-                            'ki-adress-admin' not in clean_email and
-                            'ki-kontakt-admin' not in clean_email and
-                            '@5gfrei.ch' not in clean_email and
-                            '@andreas-gross.ch' not in clean_email):
-                            self.logger.info(f"🎯 E-Mail aus manuellem Input gefunden: {clean_email}")
-                            return clean_email
+                    for email_addr in candidates:
+                        if not is_internal_address(email_addr):
+                            self.logger.info(f"🎯 E-Mail aus manuellem Input gefunden: {email_addr}")
+                            return email_addr
 
                     # Fallback: Keine E-Mail im manuellen Input gefunden
                     self.logger.warning("⚠️ Manueller Input ohne E-Mail-Adresse - verwende Dummy")
                     return "manual-contact@placeholder.local"
 
-                # Normale weitergeleitete E-Mail-Verarbeitung
-                # Erweiterte Suche nach "Von:" oder "From:" Zeilen in weitergeleiteten E-Mails
-                from_patterns = [
-                    # HTML-Patterns für Thunderbird-Weiterleitung
-                    r'Von:\s*</th>\s*<td><a[^>]*href="mailto:([^"]+)"',
-                    r'From:\s*</th>\s*<td><a[^>]*href="mailto:([^"]+)"',
-                    # Text-Patterns
-                    r'Von:\s*([^<\n\r\s]+@[^>\n\r\s]+)',
-                    r'From:\s*([^<\n\r\s]+@[^>\n\r\s]+)',
-                    r'Von:\s*.*?<([^>\n\r]+@[^>\n\r]+)>',
-                    r'From:\s*.*?<([^>\n\r]+@[^>\n\r]+)>',
-                    # HTML-Pattern ohne <th>
-                    r'Von:[^>]*>([^<\s]+@[^<\s]+)<',
-                    r'From:[^>]*>([^<\s]+@[^<\s]+)<',
-                    # Erweiterte Patterns für deutsche E-Mails
-                    r'Absender:\s*([^<\n\r\s]+@[^>\n\r\s]+)',
-                    r'E-Mail:\s*([^<\n\r\s]+@[^>\n\r\s]+)',
-                    # Pattern für komplexere Signaturen
-                    r'([a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,})'
-                ]
-
-                found_emails = set()
-
-                for i, pattern in enumerate(from_patterns):
-                    matches = re.findall(pattern, search_body, re.IGNORECASE | re.MULTILINE | re.DOTALL)
-                    self.logger.debug(f"🔍 Pattern {i+1}: Matches: {matches}")
-                    for match in matches:
-                        clean_email = match.strip()
-                        # Ausschlüsse: interne E-Mails
-                        if (clean_email and
-                            '@' in clean_email and
-                            'ki-adress-admin' not in clean_email and
-                            'ki-kontakt-admin' not in clean_email and
-                            '@5gfrei.ch' not in clean_email and
-                            '@andreas-gross.ch' not in clean_email and
-                            len(clean_email) > 5):
-                            found_emails.add(clean_email)
-
-                # Priorisiere E-Mails aus der Signatur (häufig am Ende)
-                if found_emails:
-                    # Sortiere nach Position im Text (E-Mails weiter hinten sind wahrscheinlicher Signaturen)
-                    email_positions = []
-                    for email_addr in found_emails:
-                        position = search_body.rfind(email_addr)
-                        email_positions.append((position, email_addr))
-
-                    # Sortiere nach Position (hinten zuerst)
-                    email_positions.sort(reverse=True)
-                    best_email = email_positions[0][1]
-
-                    self.logger.info(f"🎯 Primäre E-Mail gefunden: {best_email}")
-                    return best_email
+                # Weitergeleitete E-Mail: Absender aus der Weiterleitungskette
+                original = chain.original(is_internal_address)
+                if original:
+                    self.logger.info(f"🎯 Primäre E-Mail gefunden: {original.sender_email} "
+                                     f"(Weiterleitungskette: {len(chain)} Ebene(n))")
+                    return original.sender_email
+
+                # Fallback: Adressen im Text, weiter hinten stehende (Signatur) bevorzugt
+                for email_addr in reversed(candidates):
+                    if not is_internal_address(email_addr) and len(email_addr) > 5:
+                        self.logger.info(f"🎯 Primäre E-Mail gefunden (ohne Weiterleitungskopf): {email_addr}")
+                        return email_addr
 
             self.logger.warning("⚠️ Keine primäre E-Mail-Adresse gefunden")
             return None
@@ -208,6 +178,28 @@ class KIKontaktAssistent:
             self.logger.error(f"❌ Fehler bei E-Mail-Extraktion: {e}")
             return None
 
+    def get_forward_chain(self, email_message) -> ForwardChain:
+        """Weiterleitungskette des E-Mail-Bodys (einmal geparst, am Message-Objekt gemerkt)"""
+        chain = getattr(email_message, 'ki_forward_chain', None)
+        if chain is None:
+            body = self.get_email_body_text(email_message)
+            with metrics.timer(stage='forward_parse'):
+                chain = parse_forward_chain(body)
+            for header in chain:
+                self.logger.debug("🔗 %s: %s <%s> | %s | %s", header.kind, header.sender_name,
+                                  header.sender_email, header.date, header.subject)
+            email_message.ki_forward_chain = chain
+        return chain
+
+    def get_candidate_emails(self, email_message) -> List[str]:
+        """Adressen im vorderen Textbereich (im Parse-Pool bereits ermittelt)"""
+        candidates = getattr(email_message, 'ki_candidate_emails', None)
+        if candidates is None:
+            max_email_length = self.config.get('assistant', {}).get('max_email_length', 3000)
+            candidates = candidate_emails(self.get_email_body_text(email_message), max_email_length * 2)
+            email_message.ki_candidate_emails = candidates
+        return candidates
+
     def decode_email_header(self, header_value: str) -> str:
         """Dekodiert E-Mail-Header"""
         try:
@@ -228,80 +220,28 @@ class KIKontaktAssistent:
             return header_value
 
     def get_email_body_text(self, email_message) -> str:
-        """Extrahiert Klartext aus E-Mail-Body (mit Bild-Entfernung)"""
-        try:
-            body_text = ""
+        """Extrahiert Klartext aus E-Mail-Body (mit Bild-Entfernung, Ergebnis am Message-Objekt gemerkt)"""
+        cached = getattr(email_message, 'ki_body_text', None)
+        if cached is not None:
+            return cached
 
-            if email_message.is_multipart():
-                for part in email_message.walk():
-                    content_type = part.get_content_type()
-                    content_disposition = str(part.get('Content-Disposition', ''))
-
-                    # Überspringe Anhänge und Bilder
-                    if ('attachment' in content_disposition or
-                        content_type.startswith('image/') or
-                        content_type.startswith('application/') or
-                        content_type.startswith('audio/') or
-                        content_type.startswith('video/')):
-                        self.logger.debug(f"🖼️ Überspringe {content_type}: {content_disposition}")
-                        continue
-
-                    # Nur Text-Inhalte verarbeiten
-                    if content_type == "text/plain":
-                        payload = part.get_payload(decode=True)
-                        if payload:
-                            body_text = payload.decode('utf-8', errors='ignore')
-                            break  # Nehme ersten text/plain Teil
-                    elif content_type == "text/html" and not body_text:
-                        # HTML als Fallback wenn kein text/plain vorhanden
-                        payload = part.get_payload(decode=True)
-                        if payload:
-                            html_content = payload.decode('utf-8', errors='ignore')
-                            # Einfache HTML-zu-Text Konvertierung
-                            body_text = self.html_to_text(html_content)
-            else:
-                # Nicht-multipart E-Mail
-                content_type = email_message.get_content_type()
-                if content_type == "text/plain":
-                    payload = email_message.get_payload(decode=True)
-                    if payload:
-                        body_text = payload.decode('utf-8', errors='ignore')
-                elif content_type == "text/html":
-                    payload = email_message.get_payload(decode=True)
-                    if payload:
-                        html_content = payload.decode('utf-8', errors='ignore')
-                        body_text = self.html_to_text(html_content)
-
-            # Zusätzliche Bereinigung: Entferne Base64-kodierte Bilder und Anhänge
+        try:
+            # Nur das ungecachte Parsen messen - Cache-Treffer verfälschen sonst p50/p95
+            with metrics.timer(stage='mime_parse'):
+                body_text = message_body_text(email_message)
             if body_text:
-                # Entferne Base64-Datenblöcke
-                body_text = re.sub(r'data:image/[^;]+;base64,[A-Za-z0-9+/=]+', '[BILD_ENTFERNT]', body_text)
-                # Entferne lange Base64-Strings
-                body_text = re.sub(r'[A-Za-z0-9+/]{100,}={0,2}', '[BASE64_ENTFERNT]', body_text)
-                # Entferne CID-Referenzen
-                body_text = re.sub(r'cid:[A-Za-z0-9@.-]+', '[CID_ENTFERNT]', body_text)
-                self.logger.debug(f"📧 E-Mail-Body bereinigt (Länge: {len(body_text)} Zeichen)")
-
-            return body_text
-
+                self.logger.debug("📧 E-Mail-Body bereinigt (Länge: %d Zeichen)", len(body_text))
         except Exception as e:
             self.logger.warning(f"⚠️ Fehler beim E-Mail-Text extrahieren: {e}")
-            return ""
+            body_text = ""
+
+        email_message.ki_body_text = body_text
+        return body_text
 
     def html_to_text(self, html_content: str) -> str:
         """Einfache HTML-zu-Text Konvertierung"""
         try:
-            # Entferne HTML-Tags
-            text = re.sub(r'<[^>]+>', ' ', html_content)
-            # Entferne HTML-Entities
-            text = text.replace('&nbsp;', ' ')
-            text = text.replace('&amp;', '&')
-            text = text.replace('&lt;', '<')
-            text = text.replace('&gt;', '>')
-            text = text.replace('&quot;', '"')
-            # Normalisiere Whitespace
-            text = re.sub(r'\s+', ' ', text)
-            return text.strip()
+            return html_to_text(html_content)
         except Exception as e:
             self.logger.warning(f"⚠️ Fehler bei HTML-zu-Text Konvertierung: {e}")
             return html_content
@@ -313,41 +253,23 @@ class KIKontaktAssistent:
         if not body:
             return "", ""
 
-        # Erweiterte maximale Länge aus Konfiguration
-        max_bio_length = self.config.get('assistant', {}).get('max_biography_length', 1000)
-
-        # Erste Zeilen als Biographie - aber intelligenter
-        lines = [line.strip() for line in body.split('\n') if line.strip()]
-
-        # Suche nach Hashtags und substantiellen Inhalten in den ersten Zeilen
-        biography_lines = []
-        for i, line in enumerate(lines[:15]):  # Erste 15 Zeilen prüfen (erweitert)
-            # Stoppe bei typischen E-Mail-Weiterleitungsmarkern
-            if any(marker in line.lower() for marker in [
-                '-------- weitergeleitete nachricht',
-                'forwarded message',
-                'original message',
-                'von:', 'from:', 'sent:', 'gesendet:',
-                'subject:', 'betreff:', 'date:', 'datum:'
-            ]):
-                break
-
-            # Sammle substantielle Zeilen für Biographie
-            if (len(line) > 10 and
-                not line.startswith('>') and
-                not line.startswith('--') and
-                '@' not in line or '#' in line):  # E-Mail-Adressen vermeiden, außer es sind Hashtags dabei
-                biography_lines.append(line)
-
-        # Kombiniere zu Biographie
-        biography = ' '.join(biography_lines) if biography_lines else (lines[0] if lines else "")
-
-        # Begrenze Biographie mit konfigurierbarer Länge
-        if len(biography) > max_bio_length:
-            biography = biography[:max_bio_length] + "..."
+        # Im Worker-Prozess bereits ermittelt?
+        biography = getattr(email_message, 'ki_biography', None)
+        if biography is None:
+            # Erweiterte maximale Länge aus Konfiguration
+            max_bio_length = self.config.get('assistant', {}).get('max_biography_length', 1000)
+            biography = extract_biography(body, max_bio_length)
 
         return body, biography
 
+    def get_structured_cards(self, email_message) -> list:
+        """vCard-Anhänge und hCard-/schema.org-Signaturen (im Parse-Pool bereits ermittelt)"""
+        cards = getattr(email_message, 'ki_cards', None)
+        if cards is None:
+            cards = safe_message_cards(email_message)
+            email_message.ki_cards = cards
+        return cards
+
     def generate_email_id(self, email_message) -> str:
         """Generiert eindeutige ID für E-Mail (robuster)"""
         try:
@@ -377,84 +299,178 @@ class KIKontaktAssistent:
             self.logger.warning(f"⚠️ Fehler bei E-Mail-ID Generierung: {e}")
             return hashlib.md5(str(time.time()).encode()).hexdigest()
 
+    def open_mailbox(self) -> imaplib.IMAP4_SSL:
+        """Öffnet das IMAP-Postfach (angemeldet, INBOX ausgewählt)"""
+        mail = imaplib.IMAP4_SSL(self.config['email']['imap_server'], self.config['email']['imap_port'])
+        mail.login(self.config['email']['imap_username'], self.config['email']['imap_password'])
+        mail.select('INBOX')
+        return mail
+
+    def fetch_unseen(self, mail) -> List[bytes]:
+        """Liefert die Nummern aller ungelesenen E-Mails"""
+        _, message_numbers = mail.search(None, 'UNSEEN')
+        return message_numbers[0].split() if message_numbers[0] else []
+
+    def prefetch_batch(self, mail, numbers: List[bytes]):
+        """Lädt einen Block roher E-Mails und übergibt ihn dem Parse-Pool (läuft parallel weiter)"""
+        raws = []
+        for num in numbers:
+            with metrics.timer(stage='imap_fetch'):
+                _, msg_data = mail.fetch(num, self.fetch_parts)
+            raws.append(msg_data[0][1])
+        return numbers, raws, self.parse_pool.submit_many(raws)
+
+    def mark_seen(self, mail, email_num):
+        """Markiert die E-Mail im Postfach als gelesen (mail=None: Archiv-Import ohne IMAP; nicht im Probelauf)"""
+        if mail is not None and self.journal is None:
+            mail.store(email_num, '+FLAGS', '\\Seen')
+
+    def mark_unseen(self, mail, email_num):
+        """Nimmt das beim Abruf (RFC822) gesetzte \\Seen zurück - die E-Mail kommt im nächsten Zyklus erneut"""
+        if mail is not None and self.journal is None:
+            mail.store(email_num, '-FLAGS', '\\Seen')
+
+    def process_message(self, mail, num, position: int, total: int,
+                        raw: Optional[bytes] = None, parsed: Optional[dict] = None) -> bool:
+        """Verarbeitet eine E-Mail mit eigener Korrelations-ID und zählt das Ergebnis"""
+        try:
+            with correlation_scope():
+                self.logger.info("📧 Verarbeite E-Mail %d/%d", position, total)
+                processed = self.process_single_email(mail, num, raw, parsed)
+        except Exception as e:
+            self.logger.error(f"❌ Fehler bei E-Mail {num}: {e}")
+            processed = False
+        finally:
+            # Nicht abgeschlossene Leases sofort freigeben (Fehler → andere Instanz darf erneut versuchen)
+            if self.leases:
+                self.leases.release_owned()
+
+        metrics.inc('ki_messages', result='success' if processed else 'error', tenant=self.tenant)
+        return processed
+
     def process_emails(self):
         """Hauptschleife: Verarbeitet E-Mails"""
         self.logger.info("📧 Starte E-Mail-Verarbeitung...")
 
-        try:
-            with imaplib.IMAP4_SSL(self.config['email']['imap_server'], self.config['email']['imap_port']) as mail:
-                mail.login(self.config['email']['imap_username'], self.config['email']['imap_password'])
-                mail.select('INBOX')
+        # Nach einem Odoo-Ausfall zuerst die gepufferten Ergebnisse schreiben
+        self.drain_upsert_buffer()
+        if self.mailbox_paused():
+            return
 
+        try:
+            with self.open_mailbox() as mail:
                 # Ungelesene E-Mails suchen
-                _, message_numbers = mail.search(None, 'UNSEEN')
+                message_numbers = self.fetch_unseen(mail)
 
-                if not message_numbers[0]:
+                if not message_numbers:
                     self.logger.info("📭 Keine neuen E-Mails")
                     return
 
-                email_count = len(message_numbers[0].split())
+                email_count = len(message_numbers)
                 self.logger.info(f"📬 {email_count} neue E-Mail(s) gefunden")
 
                 success_count = 0
                 error_count = 0
 
-                for i, num in enumerate(message_numbers[0].split(), 1):
-                    try:
-                        self.logger.info(f"📧 Verarbeite E-Mail {i}/{email_count}")
-                        if self.process_single_email(mail, num):
+                if self.parse_pool:
+                    # Pipeline: nächster Block wird in den Worker-Prozessen geparst, während dieser verarbeitet wird
+                    size = self.parse_pool.batch_size
+                    batches = [message_numbers[i:i + size] for i in range(0, email_count, size)]
+                    results = []
+                    pending = self.prefetch_batch(mail, batches[0])
+                    for index in range(len(batches)):
+                        numbers, raws, handle = pending
+                        if index + 1 < len(batches):
+                            pending = self.prefetch_batch(mail, batches[index + 1])
+                        parsed_results = self.parse_pool.collect(handle)
+                        for num, raw, parsed in zip(numbers, raws, parsed_results):
+                            results.append(self.process_message(mail, num, len(results) + 1, email_count, raw, parsed))
+                    success_count = sum(1 for ok in results if ok)
+                    error_count = len(results) - success_count
+                else:
+                    for i, num in enumerate(message_numbers, 1):
+                        if self.process_message(mail, num, i, email_count):
                             success_count += 1
                         else:
                             error_count += 1
-                    except Exception as e:
-                        self.logger.error(f"❌ Fehler bei E-Mail {num}: {e}")
-                        error_count += 1
 
                 self.logger.info(f"📊 Ergebnis: ✅ {success_count} erfolgreich, ❌ {error_count} Fehler")
 
         except Exception as e:
             self.logger.error(f"❌ Fehler beim E-Mail-Abruf: {e}")
 
-    def process_single_email(self, mail, email_num) -> bool:
-        """Verarbeitet eine einzelne E-Mail (erweitert für manuellen Input)"""
+    def process_single_email(self, mail, email_num, raw: Optional[bytes] = None, parsed: Optional[dict] = None) -> bool:
+        """Verarbeitet eine einzelne E-Mail (raw/parsed: bereits geladen bzw. im Parse-Pool geparst)"""
         try:
             # E-Mail abrufen
-            _, msg_data = mail.fetch(email_num, '(RFC822)')
-            email_message = email.message_from_bytes(msg_data[0][1])
+            if raw is None:
+                with metrics.timer(stage='imap_fetch'):
+                    _, msg_data = mail.fetch(email_num, self.fetch_parts)
+                raw = msg_data[0][1]
+
+            if parsed:
+                # Body, Biographie, Weiterleitungskette und Adressen kommen aus dem Worker-Prozess -
+                # hier nur noch die Header parsen
+                email_message = email.parser.BytesParser().parsebytes(raw, headersonly=True)
+                email_message.ki_body_text = parsed['body']
+                email_message.ki_biography = parsed['biography']
+                email_message.ki_cards = parsed.get('cards', [])
+                email_message.ki_forward_chain = parsed.get('forward_chain')
+                email_message.ki_candidate_emails = parsed.get('candidates')
+            else:
+                email_message = email.message_from_bytes(raw)
 
             # Prüfe ob es sich um eine Antwort auf KI-Rückfrage handelt
             subject = email_message.get('Subject', '')
             body = self.get_email_body_text(email_message)
 
-            # Erweiterte Erkennung von KI-Rückfrage-Antworten
-            is_ki_response = (
+            # Antwort auf eine vorgemerkte Rückfrage: direkt über In-Reply-To/References zuordnen
+            inquiry = self.odoo_manager.inquiries.resolve(referenced_message_ids(email_message))
+
+            # Erweiterte Erkennung von KI-Rückfrage-Antworten (Fallback ohne passende Message-ID)
+            is_ki_response = inquiry is not None or (
                 'Re: KI-Rückfrage' in subject or
                 'KI-Rückfrage' in subject or
                 'ki-kontakt-admin@andreas-gross.ch' in body or
                 ('bei der Verarbeitung der E-Mail' in body and 'konnte ich folgende Kategorien nicht zuordnen' in body)
             )
 
+            if is_ki_response and not self.odoo_manager.health.available:
+                # Kategorie-Update braucht Odoo - E-Mail bleibt ungelesen und kommt nach dem Ausfall erneut
+                self.logger.info("⏸️ Antwort auf KI-Rückfrage - Odoo nicht erreichbar, später erneut")
+                self.mark_unseen(mail, email_num)
+                return False
+
             if is_ki_response:
                 self.logger.info("📧 Antwort auf KI-Rückfrage erkannt - verarbeite Kategorie-Update")
 
-                # Versuche E-Mail aus dem Body zu extrahieren (aus der zitierten Nachricht)
                 target_email = None
+                partner_id = None
 
-                # Pattern 1: "bei der Verarbeitung der E-Mail von xxx"
-                email_match1 = re.search(r'bei der Verarbeitung der E-Mail\s+(?:von\s+)?([^@\s]+@[^@\s]+)', body)
-                if email_match1:
-                    potential_email = email_match1.group(1)
-                    # Bereinige die E-Mail (entferne "von" falls vorhanden)
-                    if potential_email.startswith('von'):
-                        target_email = potential_email[3:].strip()
-                    else:
-                        target_email = potential_email.strip()
+                if inquiry:
+                    # Ziel-Partner steht in der Rückfrage-Tabelle - keine Suche, kein Zitat-Parsing
+                    target_email = inquiry['contact_email']
+                    partner_id = inquiry['partner_id']
+                    metrics.inc('ki_inquiry_replies', match='header')
+                else:
+                    # Versuche E-Mail aus dem Body zu extrahieren (aus der zitierten Nachricht)
+                    # Pattern 1: "bei der Verarbeitung der E-Mail von xxx"
+                    email_match1 = re.search(r'bei der Verarbeitung der E-Mail\s+(?:von\s+)?([^@\s]+@[^@\s]+)', body)
+                    if email_match1:
+                        potential_email = email_match1.group(1)
+                        # Bereinige die E-Mail (entferne "von" falls vorhanden)
+                        if potential_email.startswith('von'):
+                            target_email = potential_email[3:].strip()
+                        else:
+                            target_email = potential_email.strip()
 
-                # Pattern 2: Aus Betreff extrahieren (falls vorhanden)
-                if not target_email:
-                    email_match2 = re.search(r'für\s+([^@\s]+@[^@\s]+)', subject)
-                    if email_match2:
-                        target_email = email_match2.group(1)
+                    # Pattern 2: Aus Betreff extrahieren (falls vorhanden)
+                    if not target_email:
+                        email_match2 = re.search(r'für\s+([^@\s]+@[^@\s]+)', subject)
+                        if email_match2:
+                            target_email = email_match2.group(1)
+                    if target_email:
+                        metrics.inc('ki_inquiry_replies', match='text')
 
                 if target_email:
                     self.logger.info(f"🎯 Ziel-E-Mail identifiziert: {target_email}")
@@ -486,22 +502,29 @@ class KIKontaktAssistent:
                         new_biography = new_biography.strip()
 
                         # Update sowohl Kategorien als auch Biographie
-                        success = self.update_contact_categories_and_biography(target_email, all_categories, new_biography)
+                        success = self.update_contact_categories_and_biography(
+                            target_email, all_categories, new_biography, partner_id)
 
                         if success:
+                            if inquiry:
+                                self.odoo_manager.inquiries.mark_answered(inquiry['message_id'])
+
                             # Optional: Bestätigungs-E-Mail für Kategorie-Update
                             if (self.config.get('assistant', {}).get('send_confirmation_email', False) and
                                 forwarder_email):
-                                existing_contact = self.odoo_manager.find_existing_contact(target_email)
-                                if existing_contact:
+                                if not partner_id:
+                                    existing_contact = self.odoo_manager.find_existing_contact(target_email)
+                                    partner_id = existing_contact['id'] if existing_contact else None
+                                if partner_id:
                                     contact_data = {
                                         'categories': all_categories,
                                         'biography': new_biography if new_biography else "Keine neue Biographie"
                                     }
-                                    self.odoo_manager.send_confirmation_email(
-                                        target_email, contact_data, forwarder_email, 'category_updated', existing_contact['id'])
+                                    self.odoo_manager.queue_confirmation_email(
+                                        target_email, contact_data, forwarder_email, 'category_updated',
+                                        partner_id, self.generate_email_id(email_message))
 
-                            mail.store(email_num, '+FLAGS', '\\Seen')
+                            self.mark_seen(mail, email_num)
                             return True
                         else:
                             self.logger.warning("⚠️ Kategorie-/Biographie-Update fehlgeschlagen")
@@ -515,10 +538,32 @@ class KIKontaktAssistent:
 
             # Duplikat-Schutz
             email_id = self.generate_email_id(email_message)
-            if email_id in self.processed_emails:
+            if email_id in self.processed_store:
                 self.logger.info(f"⏭️ E-Mail bereits verarbeitet")
+                metrics.inc('ki_duplicates', kind='message_id')
+                self.mark_seen(mail, email_num)
+                self.processed_store.mark(email_id, 'notified')
                 return True
 
+            # Scale-out: nur die Instanz mit dem Lease verarbeitet die E-Mail
+            if self.leases:
+                if self.leases.is_done(email_id):
+                    self.logger.info("⏭️ E-Mail bereits von anderer Instanz verarbeitet")
+                    metrics.inc('ki_duplicates', kind='lease')
+                    self.mark_seen(mail, email_num)
+                    self.processed_store.mark(email_id, 'notified')
+                    return True
+                if not self.leases.claim(email_id):
+                    self.logger.info("🔒 E-Mail wird gerade von anderer Instanz verarbeitet - überspringe")
+                    return True
+
+            # Wiederaufnahme: bereits extrahierte Daten ohne neuen KI-Aufruf verwenden
+            resumed = None
+            if self.processed_store.get_state(email_id) == 'extracted':
+                resumed = self.processed_store.get_contact_data(email_id)
+            if not resumed:
+                self.processed_store.mark(email_id, 'fetched')
+
             # Weiterleiter-E-Mail extrahieren
             forwarder_email = self.extract_forwarder_email(email_message)
             if not forwarder_email:
@@ -542,31 +587,87 @@ class KIKontaktAssistent:
                 primary_email = f"manual-{content_hash}@manual-contact.local"
 
                 self.logger.info(f"📧 Generierte E-Mail für manuellen Kontakt: {primary_email}")
+            else:
+                # Odoo-Lesezugriffe für den Upsert laufen parallel zur KI-Extraktion
+                self.odoo_manager.prefetch_contact(primary_email)
 
             # E-Mail-Inhalt extrahieren
             email_text, biography = self.extract_email_content(email_message)
 
             self.logger.info(f"📧 Verarbeite: {primary_email} (von: {forwarder_email}) {'[MANUELL]' if is_manual_input else ''}")
 
+            # Near-Duplicate: dieselbe Original-Mail von anderem Weiterleiter → nur Biographie/Hashtags übernehmen
+            fingerprint = None
+            if not is_manual_input and not resumed:
+                fingerprint = content_fingerprint(primary_email, email_text)
+                if (fingerprint is not None and self.odoo_manager.health.available and
+                        self.handle_near_duplicate(email_id, primary_email, fingerprint, biography)):
+                    self.mark_seen(mail, email_num)
+                    if self.leases:
+                        self.leases.complete(email_id)
+                    return True
+
             # KI-Datenextraktion mit spezieller Behandlung für manuellen Input
-            if is_manual_input:
+            if resumed:
+                self.logger.info("♻️ Setze Verarbeitung mit gespeicherten Extraktionsdaten fort")
+                primary_email = resumed['primary_email'] or primary_email
+                contact_data = resumed['contact_data']
+            elif is_manual_input:
                 contact_data = self.data_extractor.extract_manual_contact_data(email_text, biography, primary_email)
             else:
-                contact_data = self.data_extractor.extract_contact_data(email_text, biography, primary_email)
+                # Vollständige Visitenkarte des Absenders (vCard/hCard) → ohne KI-Aufruf
+                contact_data = self.data_extractor.extract_structured_contact(
+                    self.get_structured_cards(email_message), primary_email, biography)
+                if not contact_data:
+                    # Smart-Strategy-Fenster auf die Nachricht des Original-Absenders ausrichten
+                    focus = self.get_forward_chain(email_message).original(is_internal_address)
+                    if focus and focus.sender_email != primary_email:
+                        focus = None
+                    if self.multi_contact_config.get('enabled', False):
+                        # Ein KI-Aufruf für alle Kontakte der E-Mail - weitere Kontakte hängen am Absender
+                        # (bleiben so auch für die Wiederaufnahme gespeichert)
+                        contacts = self.data_extractor.extract_contacts(
+                            email_text, biography, primary_email, focus, self.multi_contact_config.get('max_contacts', 5))
+                        contact_data = contacts[0]
+                        if len(contacts) > 1:
+                            contact_data['additional_contacts'] = contacts[1:]
+                    else:
+                        contact_data = self.data_extractor.extract_contact_data(email_text, biography, primary_email, focus)
 
             if not contact_data:
                 self.logger.warning("⚠️ Keine Kontaktdaten extrahiert")
                 return False
 
+            if not resumed:
+                self.processed_store.mark(email_id, 'extracted', primary_email, contact_data)
+
             # Debug-Info
             self.data_extractor.log_extracted_data(contact_data)
 
-            # Kontakt erstellen/aktualisieren
-            success = self.odoo_manager.create_or_update_contact(primary_email, contact_data, forwarder_email)
+            # Lease vor dem Upsert bestätigen - abgelaufen und übernommen → nicht doppelt schreiben
+            if self.leases and not self.leases.renew(email_id):
+                self.logger.warning("🔒 Lease verloren (Ablauf) - andere Instanz übernimmt diese E-Mail")
+                return False
+
+            if self.deferred_upserts is not None:
+                # Archiv-Import: geschrieben wird gebündelt pro Block (drain_upsert_buffer)
+                self.upsert_buffer.add(email_id, primary_email, forwarder_email, contact_data, fingerprint)
+                self.deferred_upserts[email_id] = email_num
+                return True
+
+            # Kontakt erstellen/aktualisieren - Odoo nicht erreichbar (vorher oder dabei) → puffern
+            success = self.odoo_manager.health.available and self.upsert_contact(
+                email_id, primary_email, contact_data, forwarder_email)
+            if not success and not self.odoo_manager.health.available:
+                self.buffer_upsert(email_id, primary_email, contact_data, forwarder_email, fingerprint)
+                self.mark_seen(mail, email_num)
+                return True
 
             if success:
-                mail.store(email_num, '+FLAGS', '\\Seen')
-                self.save_processed_email(email_id)
+                self.complete_upsert(email_id, primary_email, fingerprint)
+                self.mark_seen(mail, email_num)
+                # Seiteneffekte liegen in der Outbox - E-Mail ist abgeschlossen
+                self.processed_store.mark(email_id, 'notified')
                 self.logger.info(f"✅ {'Manueller Kontakt' if is_manual_input else 'E-Mail'} erfolgreich verarbeitet")
                 return True
             else:
@@ -574,14 +675,115 @@ class KIKontaktAssistent:
                 return False
 
         except Exception as e:
+            metrics.inc('ki_errors', stage='process_email')
             self.logger.error(f"❌ Fehler bei E-Mail-Verarbeitung: {e}")
             return False
 
-    def update_contact_categories_and_biography(self, email: str, new_categories: list, new_biography: str):
-        """Aktualisiert Kategorien UND Biographie für existierenden Kontakt"""
+    def upsert_contact(self, email_id: str, primary_email: str, contact_data: dict, forwarder_email: str) -> bool:
+        """Schreibt die Extraktion nach Odoo (weitere Kontakte der E-Mail gebündelt)"""
+        additional_contacts = contact_data.pop('additional_contacts', None)
+        if additional_contacts:
+            success = self.odoo_manager.create_or_update_contacts([contact_data] + additional_contacts,
+                                                                  forwarder_email, email_id)
+        else:
+            success = self.odoo_manager.create_or_update_contact(primary_email, contact_data, forwarder_email, email_id)
+        if additional_contacts and not success:
+            contact_data['additional_contacts'] = additional_contacts  # für Puffer/Wiederaufnahme erhalten
+        return success
+
+    def complete_upsert(self, email_id: str, primary_email: str, fingerprint: Optional[int]):
+        """Status nach erfolgreichem Upsert (Lease, Fingerprint für Near-Duplicates)"""
+        self.processed_store.mark(email_id, 'upserted')
+        if self.leases:
+            self.leases.complete(email_id)
+        if fingerprint is not None:
+            self.processed_store.add_fingerprint(email_id, primary_email, fingerprint)
+
+    def buffer_upsert(self, email_id: str, primary_email: str, contact_data: dict, forwarder_email: str,
+                      fingerprint: Optional[int]):
+        """Odoo nicht erreichbar: Extraktion auf Platte puffern - die E-Mail wird nicht erneut abgerufen"""
+        self.upsert_buffer.add(email_id, primary_email, forwarder_email, contact_data, fingerprint)
+        if self.leases:
+            self.leases.complete(email_id)
+        metrics.inc('ki_upsert_buffer', action='buffered')
+        self.logger.warning(f"⏸️ Odoo nicht erreichbar - Kontaktdaten für {primary_email} gepuffert "
+                            f"({len(self.upsert_buffer)} offen)")
+
+    def drain_upsert_buffer(self) -> Dict[str, bool]:
+        """Gepufferte Extraktionen gebündelt schreiben, sobald Odoo wieder erreichbar ist
+        → {E-Mail-ID: geschrieben} (jeder Eintrag höchstens ein Versuch pro Aufruf)"""
+        health = self.odoo_manager.health
+        results: Dict[str, bool] = {}
+        entries = self.upsert_buffer.pending(skip=results) if health.available else []
+        while entries and health.available:
+            self.logger.info(f"▶️ Schreibe {len(entries)} gepufferte Kontakte nach Odoo")
+            # Partner-Lesezugriffe des ganzen Blocks vorab parallel starten
+            for entry in entries:
+                self.odoo_manager.prefetch_contact(entry['primary_email'])
+
+            for entry in entries:
+                with correlation_scope():
+                    if self.upsert_contact(entry['email_id'], entry['primary_email'], entry['contact_data'],
+                                           entry['forwarder']):
+                        self.complete_upsert(entry['email_id'], entry['primary_email'], entry['fingerprint'])
+                        self.processed_store.mark(entry['email_id'], 'notified')
+                        self.upsert_buffer.remove(entry['email_id'])
+                        metrics.inc('ki_upsert_buffer', action='drained')
+                        results[entry['email_id']] = True
+                    elif not health.available:
+                        break  # erneuter Ausfall - Rest bleibt gepuffert
+                    else:
+                        self.upsert_buffer.mark_failed(entry['email_id'])
+                        metrics.inc('ki_upsert_buffer', action='failed')
+                        results[entry['email_id']] = False
+            entries = self.upsert_buffer.pending(skip=results) if health.available else []
+        return results
+
+    def mailbox_paused(self) -> bool:
+        """True, wenn Odoo ausgefallen ist und ohne Upsert nicht vorab extrahiert werden soll
+        (odoo_health.extract_while_down) - E-Mails bleiben dann ungelesen im Postfach"""
+        if self.odoo_manager.health.available or self.extract_while_down:
+            return False
+        self.logger.warning(f"⏸️ Odoo nicht erreichbar - Postfach wird nach dem Ausfall abgearbeitet "
+                            f"({self.odoo_manager.health.last_error})")
+        return True
+
+    def handle_near_duplicate(self, email_id: str, primary_email: str, fingerprint: int, biography: str) -> bool:
+        """Erkennt bereits verarbeitete Original-Mails und ergänzt nur Biographie/Hashtags (ohne KI-Aufruf)"""
+        dedup_config = self.config.get('dedup', {})
+        if not dedup_config.get('enabled', True):
+            return False
+
+        duplicate_of = self.processed_store.find_near_duplicate(
+            primary_email, fingerprint, dedup_config.get('max_hamming_distance', 3))
+        if not duplicate_of:
+            return False
+
+        self.logger.info(f"♻️ Inhalt bereits verarbeitet (Near-Duplicate von {duplicate_of[:8]}) - überspringe KI-Extraktion")
+        metrics.inc('ki_duplicates', kind='content')
+
+        # Nur die Ergänzungen des Weiterleiters übernehmen
+        hashtags = re.findall(r'#([a-zA-ZäöüÄÖÜß0-9]+)', biography or '')
+        clean_biography = re.sub(r'#[a-zA-ZäöüÄÖÜß0-9]+', '', biography or '')
+        clean_biography = re.sub(r'\s+', ' ', clean_biography).strip()
+
+        if hashtags or clean_biography:
+            if not self.update_contact_categories_and_biography(primary_email, hashtags, clean_biography):
+                # Kontakt nicht (mehr) vorhanden → normale Verarbeitung
+                return False
+
+        self.processed_store.mark(email_id, 'notified', primary_email)
+        self.processed_store.add_fingerprint(email_id, primary_email, fingerprint)
+        return True
+
+    def update_contact_categories_and_biography(self, email: str, new_categories: list, new_biography: str,
+                                                partner_id: Optional[int] = None):
+        """Aktualisiert Kategorien UND Biographie für existierenden Kontakt (partner_id: bekannt, ohne Suche)"""
         try:
-            # Kontakt suchen
-            existing_contact = self.odoo_manager.find_existing_contact(email)
+            # Kontakt direkt lesen, sonst (unbekannt oder inzwischen gelöscht/zusammengeführt) suchen
+            existing_contact = self.odoo_manager.read_contact(partner_id) if partner_id else None
+            if not existing_contact:
+                existing_contact = self.odoo_manager.find_existing_contact(email)
             if not existing_contact:
                 self.logger.warning(f"⚠️ Kontakt {email} nicht gefunden für Update")
                 return False
@@ -595,34 +797,32 @@ class KIKontaktAssistent:
             # Update-Daten zusammenstellen
             update_data = {}
 
-            # Kategorien aktualisieren
-            if valid_category_ids:
-                existing_cat_ids = [cat[0] if isinstance(cat, (list, tuple)) else cat
-                                  for cat in existing_contact.get('category_id', [])]
-                combined_cat_ids = list(set(existing_cat_ids + valid_category_ids))
-                update_data['category_id'] = [(6, 0, combined_cat_ids)]
+            # Kategorien aktualisieren (nur wenn wirklich neue dazukommen)
+            existing_cat_ids = {cat[0] if isinstance(cat, (list, tuple)) else cat
+                                for cat in existing_contact.get('category_id') or []}
+            if not set(valid_category_ids) <= existing_cat_ids:
+                update_data['category_id'] = [(6, 0, sorted(existing_cat_ids | set(valid_category_ids)))]
                 self.logger.info(f"🏷️ Kategorien werden erweitert: {new_categories}")
 
-            # Biographie aktualisieren
+            # Biographie aktualisieren (Zeitpunkt steht im lokalen Herkunfts-Log, nicht im Kommentar)
             if new_biography and new_biography.strip():
-                existing_comment = existing_contact.get('comment', '').strip()
-                timestamp = datetime.now().strftime('%Y-%m-%d %H:%M')
-                enhanced_biography = f"{new_biography}\n\n[KI-Update {timestamp}]"
+                existing_comment = (existing_contact.get('comment') or '').strip()
 
                 if existing_comment:
                     # Prüfe ob die neue Biographie bereits vorhanden ist
                     if new_biography.strip() not in existing_comment:
-                        combined_comment = f"{existing_comment}\n\n{enhanced_biography}"
+                        combined_comment = f"{existing_comment}\n\n{new_biography.strip()}"
                         update_data['comment'] = combined_comment
                         self.logger.info(f"📝 Biographie erweitert: {new_biography[:50]}...")
                     else:
                         self.logger.info("📝 Biographie bereits vorhanden - überspringe")
                 else:
-                    update_data['comment'] = enhanced_biography
+                    update_data['comment'] = new_biography.strip()
                     self.logger.info("📝 Neue Biographie hinzugefügt")
 
             # Update durchführen wenn Änderungen vorhanden
             if update_data:
+                self.odoo_manager.discard_prefetch(email)
                 try:
                     result = self.odoo_manager.odoo_models.execute_kw(
                         self.odoo_manager.config['odoo']['database'],
@@ -634,6 +834,9 @@ class KIKontaktAssistent:
 
                     if result:
                         self.logger.info(f"✅ Kontakt erfolgreich aktualisiert für {email}")
+                        metrics.inc('ki_upserts', action='updated')
+                        self.odoo_manager.provenance.record(existing_contact['id'], email, 'category_update',
+                                                            fields=list(update_data))
                         return True
                     else:
                         self.logger.error(f"❌ Odoo-Update gab False zurück für {email}")
@@ -650,6 +853,36 @@ class KIKontaktAssistent:
             self.logger.error(f"❌ Fehler beim Kontakt-Update: {e}")
             return False
 
+    def start_outbox_flush(self):
+        """Startet die Outbox-Abarbeitung im Hintergrund (falls nicht bereits aktiv)"""
+        if not self.odoo_manager.outbox:
+            return
+        if not self.odoo_manager.health.available:
+            return  # Fehlversuche im Ausfall würden die Outbox-Einträge aufbrauchen
+        if self.outbox_thread and self.outbox_thread.is_alive():
+            self.logger.debug("📮 Outbox-Flush läuft noch - überspringe")
+            return
+
+        self.outbox_thread = threading.Thread(target=self.flush_outbox, name="outbox-flush", daemon=True)
+        self.outbox_thread.start()
+
+    def flush_outbox(self):
+        """Arbeitet alle fälligen Outbox-Einträge ab (fehlgeschlagene warten ihre Backoff-Zeit ab)"""
+        try:
+            while True:
+                done, failed = self.odoo_manager.flush_outbox()
+                if not done and not failed:
+                    break
+        except Exception as e:
+            self.logger.error(f"❌ Fehler beim Outbox-Flush: {e}")
+
+    def log_metrics_summary(self, force: bool = False):
+        """Schreibt periodisch eine Metrik-Zusammenfassung ins Log"""
+        if not force and time.monotonic() - self.last_metrics_summary < self.metrics_summary_interval:
+            return
+        self.last_metrics_summary = time.monotonic()
+        self.logger.info(f"📈 Metriken (p50/p95): {metrics.summary()}")
+
     def run(self):
         """Startet den KI-Assistenten"""
         self.logger.info("🚀 KI-Kontaktassistent läuft...")
@@ -664,28 +897,67 @@ class KIKontaktAssistent:
                 self.logger.info(f"🔄 Iteration {iteration} - {datetime.now().strftime('%H:%M:%S')}")
 
                 # E-Mails verarbeiten
-                self.process_emails()
+                if self.profiler:
+                    with self.profiler.cycle(f"iteration{iteration}"):
+                        self.process_emails()
+                else:
+                    self.process_emails()
+
+                # Seiteneffekte (Notizen, Bestätigungen) gebündelt im Hintergrund abarbeiten
+                self.start_outbox_flush()
 
-                # Kategorien neu laden (alle 50 Iterationen)
-                if iteration % 50 == 0:
-                    self.logger.info("🔄 Lade Kategorien neu...")
-                    self.odoo_manager.odoo_categories = self.odoo_manager.load_odoo_categories()
+                # Unbenutzte SMTP-Sitzung nicht über das Warte-Intervall offen halten
+                self.odoo_manager.smtp_sender.close_if_idle()
+
+                self.log_metrics_summary()
+
+                # Kategorien nur bei Änderung in Odoo neu laden (günstiger Signatur-Check)
+                self.odoo_manager.refresh_categories_if_changed()
+
+                # Stammdaten für den nächsten Warmstart sichern
+                self.odoo_manager.save_snapshot_if_due()
 
                 time.sleep(check_interval)
 
         except KeyboardInterrupt:
+            self.odoo_manager.save_snapshot()
             self.logger.info("🛑 KI-Assistent gestoppt (Ctrl+C)")
         except Exception as e:
             self.logger.error(f"❌ Kritischer Fehler: {e}")
 
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="KI-Kontaktassistent für Odoo")
+    parser.add_argument('--config', default='config-sys.yml', help="Konfigurationsdatei")
+    parser.add_argument('--profile', action='store_true', help="Verarbeitungszyklen profilieren (logs/profiles/)")
+    parser.add_argument('--profile-every', type=int, default=1, help="Nur jeden N-ten Zyklus profilieren")
+    parser.add_argument('--profile-top', type=int, default=30, help="Anzahl Funktionen in der Top-N-Übersicht")
+    parser.add_argument('--profile-dir', default='logs/profiles', help="Zielverzeichnis für Profile")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Probelauf: Odoo-Änderungen und Mails nur ins Journal schreiben (dry_run.journal)")
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
     print("🤖 KI-Kontaktassistent für Odoo")
     print("=" * 50)
 
+    arguments = parse_args()
     try:
-        assistant = KIKontaktAssistent()
-        assistant.run()
+        config_manager = ConfigManager(arguments.config)
+        if arguments.dry_run:
+            config_manager.get_config().setdefault('dry_run', {})['enabled'] = True
+        profiler = None
+        if arguments.profile:
+            profiler = CycleProfiler(config_manager.get_logger(), arguments.profile_dir,
+                                     every=arguments.profile_every, top_n=arguments.profile_top)
+
+        if config_manager.get_config().get('tenants'):
+            # Mehrere Postfach/Odoo-Paare in einem Prozess
+            from tenants import TenantScheduler
+            TenantScheduler(config_manager, profiler).run()
+        else:
+            KIKontaktAssistent(config_manager=config_manager, profiler=profiler).run()
     except Exception as e:
         print(f"❌ Fehler beim Start: {e}")
         sys.exit(1)
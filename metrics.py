@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Laufzeit-Metriken für KI-Kontaktassistent
+Histogramme und Zähler für die einzelnen Pipeline-Stufen, Ausgabe im
+Prometheus/OpenMetrics-Textformat (optionaler lokaler HTTP-Endpunkt) und als Log-Zusammenfassung
+"""
+
+import bisect
+import functools
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Beschreibungen für die OpenMetrics-Ausgabe
+DESCRIPTIONS = {
+    'ki_stage_seconds': 'Dauer der Pipeline-Stufen in Sekunden',
+    'ki_odoo_rpc_seconds': 'Dauer der Odoo-execute_kw-Aufrufe in Sekunden',
+    'ki_llm_tokens': 'Verbrauchte OpenAI-Tokens',
+    'ki_llm_cache_hits': 'KI-Antworten aus dem geteilten Cache',
+    'ki_messages': 'Verarbeitete E-Mails nach Ergebnis',
+    'ki_fallbacks': 'Fallback-Kontaktdaten statt KI-Ergebnis',
+    'ki_structured_contacts': 'Kontakte direkt aus vCard-Anhang bzw. HTML-Signatur (ohne KI-Aufruf)',
+    'ki_rueckfragen': 'Gesendete Kategorie-Rückfragen',
+    'ki_inquiry_replies': 'Antworten auf Rückfragen nach Zuordnung (header = In-Reply-To/References, text = Fallback)',
+    'ki_duplicates': 'Übersprungene Duplikate',
+    'ki_partner_duplicates': 'Mögliche Partner-Duplikate vor dem Anlegen nach Policy (merge, link, flag)',
+    'ki_upserts': 'Kontakt-Abgleiche nach Aktion (created, updated, unchanged = kein Schreibzugriff, company_created)',
+    'ki_upsert_buffer': 'Während eines Odoo-Ausfalls gepufferte Extraktionen (buffered, drained, failed)',
+    'ki_odoo_outages': 'Erkannte Odoo-Ausfälle zur Laufzeit (Upserts pausiert)',
+    'ki_prefetch': 'Vorgeladene Odoo-Kontakte nach Ergebnis (hit, stale, error)',
+    'ki_errors': 'Fehler nach Stufe',
+}
+
+
+def _label_key(labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(key: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in items) + '}'
+
+
+class Histogram:
+    """Histogramm mit festen Buckets und einem Fenster der letzten Werte für Quantile"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, window: int = 1024):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.bucket_counts):
+            self.bucket_counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.recent.append(value)
+
+    def quantile(self, q: float) -> float:
+        if not self.recent:
+            return 0.0
+        ordered = sorted(self.recent)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class MetricsRegistry:
+    """Thread-sichere Sammlung aller Zähler und Histogramme"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, Dict[tuple, float]] = {}
+        self.histograms: Dict[str, Dict[tuple, Histogram]] = {}
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        """Erhöht einen Zähler"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels):
+        """Trägt einen Messwert in ein Histogramm ein"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str = 'ki_stage_seconds', **labels):
+        """Misst die Dauer eines Blocks"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def render_openmetrics(self) -> str:
+        """Textformat für Prometheus/OpenMetrics"""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f'# HELP {name} {DESCRIPTIONS.get(name, name)}')
+                lines.append(f'# TYPE {name} counter')
+                for key, value in sorted(series.items()):
+                    lines.append(f'{name}_total{_format_labels(key)} {value}')
+
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f'# HELP {name} {DESCRIPTIONS.get(name, name)}')
+                lines.append(f'# TYPE {name} histogram')
+                for key, histogram in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.bucket_counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{_format_labels(key, ("le", str(bound)))} {cumulative}')
+                    lines.append(f'{name}_bucket{_format_labels(key, ("le", "+Inf"))} {histogram.count}')
+                    lines.append(f'{name}_count{_format_labels(key)} {histogram.count}')
+                    lines.append(f'{name}_sum{_format_labels(key)} {histogram.sum:.6f}')
+
+        lines.append('# EOF')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> str:
+        """Kompakte Zusammenfassung für das Log (p50/p95 pro Stufe + Zähler)"""
+        parts = []
+        with self._lock:
+            for name in ('ki_stage_seconds', 'ki_odoo_rpc_seconds'):
+                for key, histogram in sorted(self.histograms.get(name, {}).items()):
+                    label = '/'.join(value for _, value in key) or name
+                    parts.append(f"{label}={histogram.quantile(0.5) * 1000:.0f}/{histogram.quantile(0.95) * 1000:.0f}ms"
+                                 f"(n={histogram.count})")
+            for name, series in sorted(self.counters.items()):
+                total = sum(series.values())
+                parts.append(f"{name.replace('ki_', '')}={total:g}")
+        return ' '.join(parts) if parts else 'keine Daten'
+
+
+# Prozessweite Registry (wie bei Prometheus-Clients üblich)
+metrics = MetricsRegistry()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = metrics.render_openmetrics().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/openmetrics-text; version=1.0.0; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_servers: Dict[Tuple[str, int], ThreadingHTTPServer] = {}
+
+
+def start_metrics_server(host: str, port: int, logger: logging.Logger) -> Optional[ThreadingHTTPServer]:
+    """Startet den lokalen Metrik-Endpunkt in einem Hintergrund-Thread (einmal pro Prozess und Adresse)"""
+    if (host, port) in _servers:
+        return _servers[(host, port)]
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        logger.warning(f"⚠️ Metrik-Endpunkt konnte nicht starten ({host}:{port}): {e}")
+        return None
+
+    thread = threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True)
+    thread.start()
+    _servers[(host, port)] = server
+    logger.info(f"📈 Metrik-Endpunkt aktiv: http://{host}:{port}/metrics")
+    return server
+
+
+class InstrumentedOdooModels:
+    """Hülle um den Odoo-Objekt-Proxy, misst jeden execute_kw-Aufruf nach Modell/Methode"""
+
+    def __init__(self, models):
+        self._models = models
+
+    def execute_kw(self, db, uid, password, model, method, *args):
+        start = time.perf_counter()
+        try:
+            return self._models.execute_kw(db, uid, password, model, method, *args)
+        except Exception:
+            metrics.inc('ki_errors', stage='odoo_rpc', method=method)
+            raise
+        finally:
+            metrics.observe('ki_odoo_rpc_seconds', time.perf_counter() - start, model=model, method=method)
+
+    def __getattr__(self, name):
+        return getattr(self._models, name)
+
+
+def timed(stage: str):
+    """Decorator: misst die Dauer einer Methode als Pipeline-Stufe"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with metrics.timer(stage=stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
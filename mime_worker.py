@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+MIME-Parsing und Text-Normalisierung für KI-Kontaktassistent
+Reine Funktionen (ohne Logger/Konfiguration), damit sie auch in Worker-Prozessen laufen können.
+MimeParsePool verteilt das Parsen roher RFC822-Bytes auf mehrere Kerne; grosse Mails werden
+über Shared Memory statt per Pickle übergeben.
+"""
+
+import email
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, List, Optional
+
+from forward_parser import EMAIL_ADDRESS, parse_forward_chain
+from structured_contact import message_cards
+
+# Typische Weiterleitungsmarker - ab hier endet die Biographie des Weiterleiters
+BIOGRAPHY_STOP_MARKERS = [
+    '-------- weitergeleitete nachricht',
+    'forwarded message',
+    'original message',
+    'von:', 'from:', 'sent:', 'gesendet:',
+    'subject:', 'betreff:', 'date:', 'datum:'
+]
+
+_DATA_IMAGE = re.compile(r'data:image/[^;]+;base64,[A-Za-z0-9+/=]+')
+_LONG_BASE64 = re.compile(r'[A-Za-z0-9+/]{100,}={0,2}')
+_CID = re.compile(r'cid:[A-Za-z0-9@.-]+')
+_HTML_TAG = re.compile(r'<[^>]+>')
+_MAILTO_LINK = re.compile(r'<a\s[^>]*href=["\']mailto:([^"\'?>]+)[^>]*>(.*?)</a>', re.IGNORECASE | re.DOTALL)
+_WHITESPACE = re.compile(r'\s+')
+
+
+def html_to_text(html_content: str) -> str:
+    """Einfache HTML-zu-Text Konvertierung"""
+    # mailto-Links als "Name (adresse)" erhalten (Weiterleitungsköpfe in HTML-Mails)
+    text = _MAILTO_LINK.sub(lambda m: f"{m.group(2)} ({m.group(1)})", html_content)
+    # Entferne HTML-Tags
+    text = _HTML_TAG.sub(' ', text)
+    # Entferne HTML-Entities
+    text = text.replace('&nbsp;', ' ')
+    text = text.replace('&amp;', '&')
+    text = text.replace('&lt;', '<')
+    text = text.replace('&gt;', '>')
+    text = text.replace('&quot;', '"')
+    # Normalisiere Whitespace
+    text = _WHITESPACE.sub(' ', text)
+    return text.strip()
+
+
+def _skip_part(content_type: str, content_disposition: str) -> bool:
+    """Anhänge, Bilder und Binärteile überspringen"""
+    return ('attachment' in content_disposition or
+            content_type.startswith('image/') or
+            content_type.startswith('application/') or
+            content_type.startswith('audio/') or
+            content_type.startswith('video/'))
+
+
+def message_body_text(email_message) -> str:
+    """Extrahiert Klartext aus dem E-Mail-Body (text/plain bevorzugt, HTML als Fallback)"""
+    body_text = ""
+
+    if email_message.is_multipart():
+        for part in email_message.walk():
+            content_type = part.get_content_type()
+            if _skip_part(content_type, str(part.get('Content-Disposition', ''))):
+                continue
+
+            # Nur Text-Inhalte verarbeiten
+            if content_type == "text/plain":
+                payload = part.get_payload(decode=True)
+                if payload:
+                    body_text = payload.decode('utf-8', errors='ignore')
+                    break  # Nehme ersten text/plain Teil
+            elif content_type == "text/html" and not body_text:
+                # HTML als Fallback wenn kein text/plain vorhanden
+                payload = part.get_payload(decode=True)
+                if payload:
+                    body_text = html_to_text(payload.decode('utf-8', errors='ignore'))
+    else:
+        # Nicht-multipart E-Mail
+        content_type = email_message.get_content_type()
+        payload = email_message.get_payload(decode=True)
+        if payload and content_type == "text/plain":
+            body_text = payload.decode('utf-8', errors='ignore')
+        elif payload and content_type == "text/html":
+            body_text = html_to_text(payload.decode('utf-8', errors='ignore'))
+
+    return strip_binary_noise(body_text) if body_text else body_text
+
+
+def strip_binary_noise(body_text: str) -> str:
+    """Entfernt Base64-kodierte Bilder, lange Base64-Strings und CID-Referenzen"""
+    body_text = _DATA_IMAGE.sub('[BILD_ENTFERNT]', body_text)
+    body_text = _LONG_BASE64.sub('[BASE64_ENTFERNT]', body_text)
+    return _CID.sub('[CID_ENTFERNT]', body_text)
+
+
+def extract_biography(body: str, max_bio_length: int = 1000) -> str:
+    """Biographie des Weiterleiters: substantielle Zeilen vor dem ersten Weiterleitungsmarker"""
+    if not body:
+        return ""
+
+    lines = [line.strip() for line in body.split('\n') if line.strip()]
+
+    biography_lines = []
+    for line in lines[:15]:  # Erste 15 Zeilen prüfen
+        if any(marker in line.lower() for marker in BIOGRAPHY_STOP_MARKERS):
+            break
+
+        # Sammle substantielle Zeilen (E-Mail-Adressen vermeiden, außer es sind Hashtags dabei)
+        if (len(line) > 10 and
+            not line.startswith('>') and
+            not line.startswith('--') and
+            '@' not in line or '#' in line):
+            biography_lines.append(line)
+
+    biography = ' '.join(biography_lines) if biography_lines else (lines[0] if lines else "")
+
+    if len(biography) > max_bio_length:
+        biography = biography[:max_bio_length] + "..."
+    return biography
+
+
+def safe_message_cards(email_message) -> List[Dict]:
+    """vCard-/hCard-Karten der Mail - defekte Karten verhindern nie die normale Verarbeitung"""
+    try:
+        return message_cards(email_message)
+    except Exception:
+        return []
+
+
+def candidate_emails(body: str, max_search_length: int = 6000) -> List[str]:
+    """Adressen im vorderen Textbereich in Textreihenfolge (Kandidaten für die primäre E-Mail)"""
+    return EMAIL_ADDRESS.findall(body[:max_search_length]) if body else []
+
+
+def parse_raw(raw: bytes, max_bio_length: int = 1000, max_search_length: int = 6000) -> Dict:
+    """Kompaktes Parse-Ergebnis einer rohen RFC822-Mail
+    (body, biography, cards, forward_chain, candidates)"""
+    email_message = email.message_from_bytes(raw)
+    body = message_body_text(email_message)
+    return {'body': body, 'biography': extract_biography(body, max_bio_length),
+            'cards': safe_message_cards(email_message),
+            'forward_chain': parse_forward_chain(body),
+            'candidates': candidate_emails(body, max_search_length)}
+
+
+def _parse_shared(name: str, size: int, max_bio_length: int, max_search_length: int) -> Dict:
+    """Worker-Einstieg für grosse Mails: liest die Bytes direkt aus dem Shared-Memory-Block"""
+    try:
+        block = shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13: nicht beim Resource-Tracker anmelden, der Block gehört dem Hauptprozess
+        block = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(block._name, 'shared_memory')
+    try:
+        return parse_raw(bytes(block.buf[:size]), max_bio_length, max_search_length)
+    finally:
+        block.close()
+
+
+class MimeParsePool:
+    """Prozess-Pool für das CPU-lastige MIME-Parsing (optional, parse_pool.enabled)"""
+
+    def __init__(self, config: dict, logger: logging.Logger):
+        self.logger = logger
+        pool_config = config.get('parse_pool', {})
+        self.workers = pool_config.get('workers', 0) or os.cpu_count() or 1
+        self.batch_size = pool_config.get('batch_size', 16)
+        self.shared_memory_min_bytes = pool_config.get('shared_memory_min_bytes', 256 * 1024)
+        self.max_bio_length = config.get('assistant', {}).get('max_biography_length', 1000)
+        # Wie extract_primary_email: Adressen nur im vorderen Textbereich suchen
+        self.max_search_length = config.get('assistant', {}).get('max_email_length', 3000) * 2
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            self.logger.info(f"⚙️ MIME-Parse-Pool gestartet ({self.workers} Prozesse)")
+        return self._executor
+
+    def parse_many(self, raws: List[bytes]) -> List[Optional[Dict]]:
+        """Parst mehrere Mails parallel (None für Mails, deren Parsing fehlschlug)"""
+        return self.collect(self.submit_many(raws))
+
+    def submit_many(self, raws: List[bytes]):
+        """Übergibt Mails an die Worker, ohne auf das Ergebnis zu warten (Handle für collect)"""
+        executor = self._get_executor()
+        futures, blocks = [], []
+        for raw in raws:
+            if len(raw) >= self.shared_memory_min_bytes:
+                block = shared_memory.SharedMemory(create=True, size=len(raw))
+                block.buf[:len(raw)] = raw
+                blocks.append(block)
+                futures.append(executor.submit(_parse_shared, block.name, len(raw),
+                                               self.max_bio_length, self.max_search_length))
+            else:
+                futures.append(executor.submit(parse_raw, raw, self.max_bio_length, self.max_search_length))
+        return futures, blocks
+
+    def collect(self, handle) -> List[Optional[Dict]]:
+        """Wartet auf die Ergebnisse von submit_many und gibt Shared-Memory-Blöcke frei"""
+        futures, blocks = handle
+        results = []
+        try:
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    self.logger.warning(f"⚠️ MIME-Parsing im Worker fehlgeschlagen: {e}")
+                    results.append(None)
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+        return results
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
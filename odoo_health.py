@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Odoo-Verfügbarkeit zur Laufzeit
+Hintergrund-Thread prüft Odoo periodisch mit einem billigen Aufruf und hält den Status im Speicher.
+Fehlgeschlagene Schreibzugriffe mit Verbindungsfehler melden den Ausfall sofort - die Pipeline
+pausiert dann den Upsert und puffert Extraktionen (siehe upsert_buffer.py), statt jede E-Mail
+einzeln an Odoo scheitern zu lassen.
+"""
+
+import http.client
+import logging
+import threading
+import time
+import xmlrpc.client
+from typing import Callable, Optional
+
+from metrics import metrics
+
+# Fehlertexte, die auf Ausfall/Wartung statt auf einen Anwendungsfehler hindeuten
+OUTAGE_MARKERS = ('timed out', 'timeout', 'connection refused', 'connection reset', 'connection aborted',
+                  'bad gateway', 'service unavailable', 'gateway timeout', '502', '503', '504')
+
+
+def is_outage_error(error: Exception) -> bool:
+    """True bei Netzwerk-/Gateway-Fehlern; Odoo-Faults (Server antwortet) zählen nicht als Ausfall"""
+    if isinstance(error, xmlrpc.client.Fault):
+        return False
+    if isinstance(error, xmlrpc.client.ProtocolError):
+        return error.errcode >= 500
+    if isinstance(error, (OSError, http.client.HTTPException)):
+        return True
+    return any(marker in str(error).lower() for marker in OUTAGE_MARKERS)
+
+
+class OdooHealthMonitor:
+    def __init__(self, config: dict, logger: logging.Logger, odoo_models, odoo_uid):
+        """Initialisiert die Verfügbarkeitsprüfung (odoo_health.enabled, Prüfintervalle)"""
+        self.config = config
+        self.logger = logger
+        self.odoo_models = odoo_models
+        self.odoo_uid = odoo_uid
+
+        health_config = config.get('odoo_health', {})
+        self.enabled = health_config.get('enabled', True)
+        self.interval = health_config.get('interval', 60)
+        self.down_interval = health_config.get('down_interval', 15)
+
+        self.available = True
+        # Wird nach einem Ausfall im Prüf-Thread aufgerufen (z.B. Startdaten nachladen)
+        self.on_recover: Optional[Callable[[], None]] = None
+        self.down_since: Optional[float] = None
+        self.last_error = ''
+        self.checked_at = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Startet die periodische Prüfung im Hintergrund (einmalig)"""
+        if not self.enabled or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='odoo-health', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        # Im Ausfall häufiger prüfen, damit der Puffer zügig abgearbeitet wird
+        while not self._stop.wait(self.interval if self.available else self.down_interval):
+            self.check()
+
+    def check(self) -> bool:
+        """Ein Prüfaufruf gegen Odoo (search_count ohne Treffer) → aktualisiert den Status"""
+        try:
+            self.odoo_models.execute_kw(
+                self.config['odoo']['database'],
+                self.odoo_uid,
+                self.config['odoo']['password'],
+                'res.partner', 'search_count',
+                [[['id', '=', 0]]]
+            )
+            self._set(True)
+        except Exception as e:
+            self._set(not is_outage_error(e), str(e))
+        self.checked_at = time.monotonic()
+        return self.available
+
+    def report_failure(self, error: Exception):
+        """Fehlgeschlagener Odoo-Aufruf aus der Pipeline - Ausfall sofort übernehmen statt auf die Prüfung warten"""
+        if self.enabled and is_outage_error(error):
+            self._set(False, str(error))
+
+    def _set(self, available: bool, error: str = ''):
+        with self._lock:
+            changed = available != self.available
+            self.available = available
+            if available:
+                down_for = time.monotonic() - self.down_since if self.down_since else 0.0
+                self.down_since = None
+            else:
+                self.last_error = error
+                if changed:
+                    self.down_since = time.monotonic()
+        if changed and available:
+            self.logger.info(f"✅ Odoo wieder erreichbar (Ausfall {down_for:.0f}s) - Upserts laufen wieder")
+            if self.on_recover:
+                self.on_recover()
+        elif changed:
+            metrics.inc('ki_odoo_outages')
+            self.logger.error(f"🚨 Odoo nicht erreichbar - Upserts pausiert, Ergebnisse werden gepuffert ({error})")
@@ -5,24 +5,173 @@ Handles Odoo-Operationen, Kategorien und Kontakt-CRUD mit YAML-Templates
 FIXED VERSION: Korrekte Firmen-Namen-Zuordnung + Timeline-Notizen
 """
 
+import contextvars
 import logging
 import re
-import smtplib
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from email.utils import make_msgid
 from typing import Dict, List, Optional, Tuple
 
+from company_index import CompanyIndex, email_domain, normalize_company_name
+from duplicate_index import DuplicateIndex
+from inquiry_store import InquiryStore
+from log_setup import sample_debug
+from metrics import InstrumentedOdooModels, metrics, timed
+from odoo_health import OdooHealthMonitor
+from outbox import Outbox
+from provenance import ProvenanceLog
+from smtp_sender import SMTPSender
+from warm_snapshot import WarmSnapshot
+
+
+# Partnerfelder, die der Abgleich in get_update_values vergleicht
+CONTACT_FIELDS = ['name', 'email', 'phone', 'street', 'street2', 'city', 'zip', 'country_id', 'website',
+                  'function', 'lang', 'is_company', 'comment', 'category_id', 'parent_id']
+
+# Frühere Import-Stempel im Kommentar ("[KI-Import 2025-06-10 14:03 - Confidence: high]") - reine Herkunft
+PROVENANCE_LINE = re.compile(r'^\[KI-(?:Import|Update) [^\]]*\]$')
+
 
 class OdooManager:
     def __init__(self, config: dict, logger: logging.Logger, odoo_models, odoo_uid, prompts: dict):
         """Initialisiert Odoo-Manager"""
         self.config = config
         self.logger = logger
-        self.odoo_models = odoo_models
+        # Jeder execute_kw-Aufruf wird pro Modell/Methode gemessen
+        self.odoo_models = InstrumentedOdooModels(odoo_models)
         self.odoo_uid = odoo_uid
         self.prompts = prompts
-        self.odoo_categories = self.load_odoo_categories()
+        # Signatur (Anzahl, neuestes write_date) des geladenen Kategorie-Stands
+        self.categories_signature = None
+        self.odoo_categories: Dict[str, int] = {}
+
+        # Odoo-Verfügbarkeit zur Laufzeit (Ausfall → Upserts pausieren und puffern)
+        self.health = OdooHealthMonitor(self.config, self.logger, self.odoo_models, self.odoo_uid)
+        self.health.on_recover = self.warm_up
+
+        # Outbox für verzögerte Seiteneffekte (Timeline-Notizen, Bestätigungen)
+        outbox_config = self.config.get('outbox', {})
+        self.outbox_enabled = outbox_config.get('enabled', True)
+        self.outbox_batch_size = outbox_config.get('batch_size', 100)
+        self.outbox = Outbox(self.config, self.logger) if self.outbox_enabled else None
+
+        # Import-Herkunft lokal statt als Zeitstempel im Odoo-Kommentar
+        self.provenance = ProvenanceLog(self.config, self.logger)
+
+        # Firmen-Partner nach Name/Domain (Personen an ihre Firma hängen, Firmen nur einmal anlegen)
+        self.companies = CompanyIndex(self.config, self.logger, self.odoo_models, self.odoo_uid)
+
+        # Personen nach Telefon/Name/Adresse (gleiche Person unter zweiter Adresse nicht neu anlegen)
+        duplicate_config = self.config.get('duplicates', {})
+        self.duplicate_policy = duplicate_config.get('policy', 'link')
+        self.duplicate_flag_category = duplicate_config.get('flag_category', 'Duplikat-Verdacht')
+        self.duplicates = DuplicateIndex(self.config, self.logger, self.odoo_models, self.odoo_uid)
+
+        # Gesendete Kategorie-Rückfragen (Message-ID → Partner) für die Zuordnung der Antworten
+        self.inquiries = InquiryStore(self.config, self.logger)
+
+        # Langlebige SMTP-Sitzung für Rückfragen und Bestätigungen
+        self.smtp_sender = SMTPSender(self.config, self.logger)
+
+        # Spekulatives Vorladen (Partner, Kategorie-Stand, Länder) parallel zum KI-Aufruf
+        prefetch_config = self.config.get('prefetch', {})
+        self.prefetch_enabled = prefetch_config.get('enabled', True)
+        self.prefetch_workers = prefetch_config.get('workers', 2)
+        self.prefetch_max_age = prefetch_config.get('max_age', 120)
+        self._prefetch_executor: Optional[ThreadPoolExecutor] = None
+        self._prefetched: Dict[str, Tuple[float, Future]] = {}
+        self._prefetch_lock = threading.Lock()
+        # ISO-Code → res.country-ID (einmal komplett geladen), Zeitpunkt der letzten Kategorie-Prüfung
+        self.country_ids: Optional[Dict[str, int]] = None
+        self.categories_checked_at = 0.0
+
+        # Warmstart: Stammdaten aus dem lokalen Snapshot sofort verfügbar, Abgleich mit Odoo danach
+        self.snapshot = WarmSnapshot(self.config, self.logger)
+        restored = self.restore_snapshot()
+
+        if odoo_uid is None:
+            # Eingeschränkter Start (Odoo nicht erreichbar) - Startdaten kommen nach der Verbindung
+            self.health.report_failure(ConnectionError("Odoo beim Start nicht verbunden"))
+        elif restored:
+            threading.Thread(target=self.warm_up, name='odoo-warmup', daemon=True).start()
+        else:
+            self.warm_up()
+
+    def warm_up(self):
+        """Startdaten parallel laden bzw. abgleichen: Kategorien, Firmen-/Duplikat-Index und Länder.
+        Aus dem Snapshot übernommene Stände werden nur inkrementell (write_date) nachgezogen."""
+        categories = None
+        with ThreadPoolExecutor(max_workers=4, thread_name_prefix='odoo-warmup') as executor:
+            if self.odoo_categories:
+                executor.submit(self.refresh_categories_if_changed)
+            else:
+                categories = executor.submit(self.load_odoo_categories)
+            executor.submit(self.companies.sync_if_due, True)
+            executor.submit(self.duplicates.sync_if_due, True)
+            if self.country_ids is None:
+                executor.submit(self.load_countries)
+        if categories is not None:
+            self.odoo_categories = categories.result()
+        self.save_snapshot()
+
+    def restore_snapshot(self) -> bool:
+        """Lädt Kategorien, Länder, Firmen- und Duplikat-Index aus dem Snapshot (True = etwas übernommen)"""
+        if not self.snapshot.enabled:
+            return False
+        restored = []
+        try:
+            categories = self.snapshot.load('categories')
+            if categories and categories['data']['map']:
+                self.odoo_categories = categories['data']['map']
+                self.categories_signature = tuple(categories['data']['signature'])
+                restored.append('categories')
+            countries = self.snapshot.load('countries')
+            if countries and countries['data']:
+                self.country_ids = countries['data']
+                restored.append('countries')
+            for name, index in (('companies', self.companies), ('duplicates', self.duplicates)):
+                snapshot = self.snapshot.load(name)
+                if snapshot and index.restore(snapshot):
+                    restored.append(name)
+        except (KeyError, TypeError, ValueError) as e:
+            # Unerwartete Struktur: kalt starten statt mit halbem Stand
+            self.logger.warning(f"⚠️ Snapshot unbrauchbar - Stammdaten werden neu geladen: {e}")
+            self.odoo_categories, self.categories_signature, self.country_ids = {}, None, None
+            for index in (self.companies, self.duplicates):
+                # Ohne Hochwassermarke baut sync_if_due den Index komplett neu auf
+                index.high_water, index.loaded_wall = None, 0.0
+            return False
+        if restored:
+            self.logger.info(f"💾 Warmstart aus Snapshot: {', '.join(restored)}")
+        return bool(restored)
+
+    def save_snapshot(self):
+        """Sichert die aktuell geladenen Stammdaten (nur vollständig geladene Teile)"""
+        if not self.snapshot.enabled:
+            return
+        snapshots = {}
+        if self.odoo_categories and self.categories_signature:
+            snapshots['categories'] = {'data': {'map': self.odoo_categories,
+                                                'signature': list(self.categories_signature)},
+                                       'high_water': self.categories_signature[1]}
+        if self.country_ids:
+            snapshots['countries'] = {'data': self.country_ids, 'high_water': None}
+        for name, index in (('companies', self.companies), ('duplicates', self.duplicates)):
+            snapshot = index.snapshot()
+            if snapshot:
+                snapshots[name] = snapshot
+        if snapshots:
+            self.snapshot.save(snapshots)
+
+    def save_snapshot_if_due(self):
+        """Periodische Sicherung aus der Hauptschleife (snapshot.save_interval)"""
+        if self.snapshot.save_due() and self.health.available:
+            self.save_snapshot()
 
     def load_odoo_categories(self) -> Dict[str, int]:
         """Lädt alle verfügbaren Kategorien aus Odoo"""
@@ -32,9 +181,13 @@ class OdooManager:
                 self.odoo_uid,
                 self.config['odoo']['password'],
                 'res.partner.category', 'search_read', [[]],
-                {'fields': ['name']}
+                {'fields': ['name', 'write_date']}
             )
 
+            # Signatur direkt aus dem geladenen Stand ableiten (kein Extra-RPC)
+            write_dates = [cat.get('write_date') for cat in categories if cat.get('write_date')]
+            self.categories_signature = (len(categories), max(write_dates) if write_dates else None)
+
             # Case-insensitive Mapping erstellen
             category_map = {}
             for cat in categories:
@@ -61,7 +214,49 @@ class OdooManager:
             self.logger.error(f"❌ Fehler beim Laden der Kategorien: {e}")
             return {}
 
-    def validate_categories(self, categories: List[str]) -> Tuple[List[int], List[str]]:
+    def get_categories_signature(self) -> Optional[Tuple[int, Optional[str]]]:
+        """Ermittelt günstig Anzahl und neuestes write_date der Kategorien"""
+        try:
+            count = self.odoo_models.execute_kw(
+                self.config['odoo']['database'],
+                self.odoo_uid,
+                self.config['odoo']['password'],
+                'res.partner.category', 'search_count', [[]]
+            )
+            latest = self.odoo_models.execute_kw(
+                self.config['odoo']['database'],
+                self.odoo_uid,
+                self.config['odoo']['password'],
+                'res.partner.category', 'search_read', [[]],
+                {'fields': ['write_date'], 'order': 'write_date desc', 'limit': 1}
+            )
+            return count, (latest[0].get('write_date') if latest else None)
+
+        except Exception as e:
+            self.logger.warning(f"⚠️ Kategorie-Signatur nicht abrufbar: {e}")
+            return None
+
+    def refresh_categories_if_changed(self, max_age: float = 0) -> bool:
+        """Lädt Kategorien nur neu, wenn sich Anzahl oder write_date geändert haben
+        (max_age: Prüfung überspringen, wenn die letzte höchstens so viele Sekunden zurückliegt)"""
+        if max_age and time.monotonic() - self.categories_checked_at < max_age:
+            return False
+        signature = self.get_categories_signature()
+        if signature is not None:
+            self.categories_checked_at = time.monotonic()
+        if signature is None or signature == self.categories_signature:
+            return False
+
+        self.logger.info(f"🔄 Kategorien in Odoo geändert ({self.categories_signature} → {signature}) - lade neu...")
+        categories = self.load_odoo_categories()
+        if not categories and self.odoo_categories:
+            # Fehler beim Laden: alten Stand behalten
+            return False
+
+        self.odoo_categories = categories
+        return True
+
+    def validate_categories(self, categories: List[str], refresh_on_miss: bool = True) -> Tuple[List[int], List[str]]:
         """Validiert Kategorien gegen Odoo-Kategorien"""
         valid_category_ids = []
         invalid_categories = []
@@ -87,6 +282,13 @@ class OdooManager:
             if not found:
                 invalid_categories.append(category)
 
+        # Unbekannte Kategorien: evtl. gerade erst in Odoo angelegt → Cache prüfen und erneut validieren
+        # (gerade erst vom Prefetch geprüft → keine erneute Signatur-Abfrage)
+        max_age = self.prefetch_max_age if self.prefetch_enabled else 0
+        if invalid_categories and refresh_on_miss and self.refresh_categories_if_changed(max_age):
+            self.logger.info(f"🔁 Validiere Kategorien nach Cache-Refresh erneut: {invalid_categories}")
+            return self.validate_categories(categories, refresh_on_miss=False)
+
         # Standard-Kategorie "Neuer-KI-Eintrag" hinzufügen
         default_cats = self.config['assistant']['default_categories']
         for default_cat in default_cats:
@@ -98,11 +300,126 @@ class OdooManager:
 
         return valid_category_ids, invalid_categories
 
+    def prefetch_contact(self, email: str):
+        """Startet die Odoo-Lesezugriffe für den Upsert im Hintergrund (während die KI noch arbeitet)"""
+        if not self.prefetch_enabled or not email or '@' not in email or not self.health.available:
+            return
+
+        now = time.monotonic()
+        with self._prefetch_lock:
+            # Nie abgeholte Ergebnisse verwerfen
+            for key in [key for key, (started, _) in self._prefetched.items() if now - started > self.prefetch_max_age]:
+                del self._prefetched[key]
+            if email in self._prefetched:
+                return
+            if self._prefetch_executor is None:
+                self._prefetch_executor = ThreadPoolExecutor(max_workers=self.prefetch_workers,
+                                                             thread_name_prefix='odoo-prefetch')
+            # Kontext kopieren: Log-Zeilen des Hintergrund-Threads tragen die Korrelations-ID der E-Mail
+            future = self._prefetch_executor.submit(contextvars.copy_context().run, self._prefetch, email)
+            self._prefetched[email] = (now, future)
+
+    def _prefetch(self, email: str) -> Optional[Dict]:
+        if self.country_ids is None:
+            self.load_countries()
+        self.refresh_categories_if_changed(self.prefetch_max_age)
+        self.companies.sync_if_due()
+        self.duplicates.sync_if_due()
+        return self._lookup_contact(email)
+
+    def discard_prefetch(self, email: str):
+        """Vorgeladenen Stand verwerfen (nach eigenem Schreibzugriff auf den Kontakt)"""
+        with self._prefetch_lock:
+            self._prefetched.pop(email, None)
+
+    def _take_prefetched(self, email: str) -> Tuple[bool, Optional[Dict]]:
+        """(True, Kontakt) wenn ein frisches Prefetch-Ergebnis vorliegt - wartet ggf. auf dessen Ende"""
+        with self._prefetch_lock:
+            entry = self._prefetched.pop(email, None)
+        if entry is None:
+            return False, None
+
+        started, future = entry
+        if time.monotonic() - started > self.prefetch_max_age:
+            metrics.inc('ki_prefetch', result='stale')
+            return False, None
+        try:
+            contact = future.result()
+        except Exception as e:
+            metrics.inc('ki_prefetch', result='error')
+            self.logger.debug("⚠️ Prefetch fehlgeschlagen (%s) - lese direkt", e)
+            return False, None
+        metrics.inc('ki_prefetch', result='hit')
+        return True, contact
+
     def find_existing_contact(self, email: str) -> Optional[Dict]:
-        """Sucht nach existierendem Kontakt anhand der E-Mail-Adresse"""
+        """Sucht nach existierendem Kontakt anhand der E-Mail-Adresse (vorgeladen, falls vorhanden)"""
+        if not email or not isinstance(email, str) or '@' not in email:
+            return None
+
+        hit, contact = self._take_prefetched(email)
+        if hit:
+            return contact
+        return self._lookup_contact(email)
+
+    def read_contact(self, partner_id: int) -> Optional[Dict]:
+        """Liest einen Kontakt direkt über seine ID (ohne Suche)"""
+        try:
+            contacts = self.odoo_models.execute_kw(
+                self.config['odoo']['database'],
+                self.odoo_uid,
+                self.config['odoo']['password'],
+                'res.partner', 'read',
+                [[partner_id]],
+                {'fields': CONTACT_FIELDS}
+            )
+            return contacts[0] if contacts else None
+        except Exception as e:
+            self.logger.warning(f"⚠️ Kontakt {partner_id} nicht lesbar: {e}")
+            return None
+
+    def find_duplicate(self, primary_email: str, contact_data: Dict) -> Optional[Dict]:
+        """Duplikat-Prüfung vor dem Anlegen einer Person (duplicates.policy):
+        merge → bestehender Partner wird ergänzt statt neu angelegt (nur bei eindeutigem Kandidaten),
+        link → neuer Partner mit Verweis auf den Kandidaten im Kommentar,
+        flag → neuer Partner mit Kategorie duplicates.flag_category"""
+        contact_data.pop('duplicate_of', None)  # Stand eines früheren (gepufferten) Versuchs
+        if not self.duplicates.enabled or self.duplicate_policy == 'off' or contact_data.get('is_company'):
+            return None
+
+        phones = contact_data.get('phones') or []
+        address = contact_data.get('address') or {}
+        name = (contact_data.get('full_name') or
+                f"{contact_data.get('first_name', '')} {contact_data.get('last_name', '')}").strip()
+        candidates = [candidate for candidate in self.duplicates.candidates({
+            'name': name,
+            'phone': phones[0] if len(phones) > 0 else '',
+            'mobile': phones[1] if len(phones) > 1 else '',
+            'street': address.get('street', '') if isinstance(address, dict) else '',
+            'zip': address.get('zip', '') if isinstance(address, dict) else '',
+        }) if candidate['strong']]
+        if not candidates:
+            return None
+
+        best = candidates[0]
+        policy = self.duplicate_policy
+        if policy == 'merge' and len(candidates) > 1:
+            policy = 'link'  # mehrdeutig → nicht automatisch zusammenführen
+        metrics.inc('ki_partner_duplicates', policy=policy)
+        self.logger.warning(f"👥 Mögliches Duplikat für {primary_email}: {best['name']} <{best['email']}> "
+                            f"(ID: {best['id']}, gleich: {', '.join(best['reasons'])}) → {policy}")
+
+        if policy == 'merge':
+            existing_contact = self.read_contact(best['id'])
+            if existing_contact:
+                return existing_contact
+            policy = 'link'
+        contact_data['duplicate_of'] = dict(best, policy=policy)
+        return None
+
+    def _lookup_contact(self, email: str) -> Optional[Dict]:
+        """Liest den Kontakt zur E-Mail-Adresse aus Odoo (search + read)"""
         try:
-            if not email or not isinstance(email, str) or '@' not in email:
-                return None
 
             search_domain = [['email', '=', email.strip()]]
 
@@ -121,7 +438,7 @@ class OdooManager:
                     self.config['odoo']['password'],
                     'res.partner', 'read',
                     [contact_ids[0]],
-                    {'fields': ['name', 'email', 'phone', 'street', 'website', 'comment', 'category_id']}
+                    {'fields': CONTACT_FIELDS}
                 )[0]
 
                 self.logger.info(f"🔍 Existierender Kontakt gefunden: {email}")
@@ -170,46 +487,30 @@ class OdooManager:
             self.logger.error(f"❌ Fehler bei Timeline-Notiz-Erstellung: {e}")
             return False
 
-    def create_or_update_contact(self, primary_email: str, contact_data: Dict, forwarder_email: str) -> bool:
-        """Erstellt neuen Kontakt oder aktualisiert existierenden (mit Timeline-Notizen)"""
+    @timed('upsert')
+    def create_or_update_contact(self, primary_email: str, contact_data: Dict, forwarder_email: str,
+                                 source_id: Optional[str] = None, parent_id: Optional[int] = None,
+                                 deferred: Optional[List[Tuple]] = None) -> bool:
+        """Erstellt neuen Kontakt oder aktualisiert existierenden (mit Timeline-Notizen, parent_id: Firma;
+        deferred: Nacharbeiten sammeln statt sofort ausführen)"""
         try:
             existing_contact = self.find_existing_contact(primary_email)
-
-            # Kategorien validieren
-            categories = contact_data.get('categories', [])
-            valid_category_ids, invalid_categories = self.validate_categories(categories)
-
-            if invalid_categories:
-                self.logger.warning(f"⚠️ Unbekannte Kategorien: {invalid_categories}")
-                action = self.config.get('assistant', {}).get('unknown_category_action', 'ask_sender')
-
-                if action == 'ask_sender':
-                    self.send_category_error_email(primary_email, invalid_categories, contact_data, forwarder_email)
-
-            # Kontaktdaten zusammenführen
-            contact_values, biography_for_timeline = self.build_contact_values(contact_data, primary_email, valid_category_ids, existing_contact)
+            if not existing_contact and contact_data.get('is_company'):
+                # Firma unter anderer Adresse bereits vorhanden → ergänzen statt doppelt anlegen
+                company_id = self.companies.lookup(contact_data.get('company') or contact_data.get('full_name', ''),
+                                                   email_domain(primary_email))
+                existing_contact = self.read_contact(company_id) if company_id else None
+                if existing_contact:
+                    self.logger.info(f"🏢 Firma bereits vorhanden: {existing_contact.get('name')} (ID: {company_id})")
+            if not existing_contact:
+                existing_contact = self.find_duplicate(primary_email, contact_data)
+            contact_values, biography_for_timeline, invalid_categories = self.prepare_contact(
+                primary_email, contact_data, existing_contact, parent_id)
 
             if existing_contact:
                 # Kontakt aktualisieren
-                update_values = self.get_update_values(existing_contact, contact_values)
-                if update_values:
-                    for key, value in update_values.items():
-                        self.logger.debug(f"🔍 Update-Debug: {key} = {value} (Typ: {type(value)})")
-
-                    self.odoo_models.execute_kw(
-                        self.config['odoo']['database'],
-                        self.odoo_uid,
-                        self.config['odoo']['password'],
-                        'res.partner', 'write',
-                        [[existing_contact['id']], update_values]
-                    )
-                    self.logger.info(f"✅ Kontakt aktualisiert: {primary_email} (ID: {existing_contact['id']})")
-                    action = 'updated'
-                    contact_id = existing_contact['id']
-                else:
-                    self.logger.info(f"ℹ️ Kontakt bereits vollständig: {primary_email}")
-                    action = 'unchanged'
-                    contact_id = existing_contact['id']
+                action, written_fields = self.update_existing_contact(primary_email, existing_contact, contact_values)
+                contact_id = existing_contact['id']
             else:
                 # Neuen Kontakt erstellen
                 contact_id = self.odoo_models.execute_kw(
@@ -219,25 +520,342 @@ class OdooManager:
                     'res.partner', 'create',
                     [contact_values]
                 )
+                self.discard_prefetch(primary_email)
+                self.duplicates.add(contact_id, contact_values)
                 self.logger.info(f"✅ Neuer Kontakt erstellt: {primary_email} (ID: {contact_id})")
                 action = 'created'
+                written_fields = list(contact_values)
 
-            # NEUE: Timeline-Notiz für Biographie erstellen (falls vorhanden)
-            if biography_for_timeline and biography_for_timeline.strip():
-                self.create_timeline_note(contact_id, biography_for_timeline, contact_data)
-
-            # Optional: Bestätigungs-E-Mail senden
-            if (self.config.get('assistant', {}).get('send_confirmation_email', False) and
-                action in ['created', 'updated']):
-                self.send_confirmation_email(primary_email, contact_data, forwarder_email, action, contact_id)
+            # Firmen-Kontakte stehen sofort für die Zuordnung von Personen bereit
+            if contact_data.get('is_company'):
+                self.companies.add(contact_id, contact_data.get('company') or contact_data.get('full_name', ''),
+                                   email_domain(primary_email), contact_data.get('website'))
 
+            upsert = (contact_id, primary_email, contact_data, forwarder_email, source_id, action,
+                      written_fields, biography_for_timeline, invalid_categories)
+            if deferred is None:
+                self.after_upsert(*upsert)
+            else:
+                deferred.append(upsert)
             return True
 
         except Exception as e:
+            metrics.inc('ki_errors', stage='upsert')
+            self.health.report_failure(e)
             self.logger.error(f"❌ Fehler beim Speichern des Kontakts: {e}")
             return False
 
-    def send_category_error_email(self, contact_email: str, invalid_categories: List[str], contact_data: Dict, forwarder_email: str):
+    @timed('upsert')
+    def create_or_update_contacts(self, contacts: List[Dict], forwarder_email: str,
+                                  source_id: Optional[str] = None) -> bool:
+        """Mehrere Kontakte aus einer E-Mail: Firmen einmal auflösen bzw. anlegen, neue Personen
+        gebündelt anlegen (ein create) und an ihre Firma hängen (parent_id). Rückfragen, Herkunft,
+        Notizen und Bestätigungen laufen erst, wenn alle Schreibzugriffe gelungen sind - ein Teilfehler
+        wird als ganze E-Mail wiederholt, ohne doppelte Rückfragen."""
+        deferred: List[Tuple] = []
+        try:
+            # Firmen-Kontakte mit eigener Adresse zuerst - sie landen dabei im Firmen-Index
+            for contact_data in [c for c in contacts if c.get('is_company')]:
+                if not self.create_or_update_contact(contact_data['emails'][0], contact_data, forwarder_email,
+                                                     source_id, deferred=deferred):
+                    return False
+
+            persons = [c for c in contacts if not c.get('is_company')]
+            company_ids = self.resolve_companies(persons, forwarder_email, source_id)
+
+            new_values, new_contacts = [], []
+            for contact_data in persons:
+                email = contact_data['emails'][0]
+                parent_id = company_ids.get(normalize_company_name(contact_data.get('company', '')))
+                existing_contact = self.find_existing_contact(email) or self.find_duplicate(email, contact_data)
+                contact_values, biography_for_timeline, invalid_categories = self.prepare_contact(
+                    email, contact_data, existing_contact, parent_id)
+
+                if existing_contact:
+                    action, written_fields = self.update_existing_contact(email, existing_contact, contact_values)
+                    deferred.append((existing_contact['id'], email, contact_data, forwarder_email, source_id, action,
+                                     written_fields, biography_for_timeline, invalid_categories))
+                else:
+                    new_values.append(contact_values)
+                    new_contacts.append((email, contact_data, biography_for_timeline, invalid_categories))
+
+            if new_values:
+                contact_ids = self.odoo_models.execute_kw(
+                    self.config['odoo']['database'],
+                    self.odoo_uid,
+                    self.config['odoo']['password'],
+                    'res.partner', 'create',
+                    [new_values]
+                )
+                self.logger.info(f"✅ {len(contact_ids)} neue Kontakte gebündelt erstellt (IDs: {contact_ids})")
+                for contact_id, contact_values, (email, contact_data, biography, invalid) in zip(
+                        contact_ids, new_values, new_contacts):
+                    self.discard_prefetch(email)
+                    self.duplicates.add(contact_id, contact_values)
+                    deferred.append((contact_id, email, contact_data, forwarder_email, source_id, 'created',
+                                     list(contact_values), biography, invalid))
+
+            for upsert in deferred:
+                self.after_upsert(*upsert)
+            return True
+
+        except Exception as e:
+            metrics.inc('ki_errors', stage='upsert')
+            self.health.report_failure(e)
+            self.logger.error(f"❌ Fehler beim Speichern mehrerer Kontakte: {e}")
+            return False
+
+    def resolve_companies(self, persons: List[Dict], forwarder_email: str,
+                          source_id: Optional[str] = None) -> Dict[str, int]:
+        """Firmen der Personen → Partner-ID (normalisierter Name als Schlüssel); fehlende Firmen
+        werden in einem create angelegt"""
+        company_ids: Dict[str, int] = {}
+        missing: Dict[str, Tuple[Dict, Optional[str]]] = {}
+        for contact_data in persons:
+            name = (contact_data.get('company') or '').strip()
+            key = normalize_company_name(name)
+            if not key or key in company_ids or key in missing:
+                continue
+            domain = email_domain(contact_data['emails'][0])
+            company_id = self.companies.lookup(name, domain)
+            if company_id:
+                company_ids[key] = company_id
+                continue
+            values = {'name': name, 'is_company': True}
+            if contact_data.get('website'):
+                values['website'] = contact_data['website']
+            missing[key] = (values, domain)
+
+        if missing:
+            created_ids = self.odoo_models.execute_kw(
+                self.config['odoo']['database'],
+                self.odoo_uid,
+                self.config['odoo']['password'],
+                'res.partner', 'create',
+                [[values for values, _ in missing.values()]]
+            )
+            for (key, (values, domain)), company_id in zip(missing.items(), created_ids):
+                company_ids[key] = company_id
+                self.companies.add(company_id, values['name'], domain, values.get('website'))
+                metrics.inc('ki_upserts', action='company_created')
+                self.provenance.record(company_id, domain or '', 'company_created', source_id, forwarder_email,
+                                       fields=list(values))
+                self.logger.info(f"🏢 Firma angelegt: {values['name']} (ID: {company_id})")
+        return company_ids
+
+    def prepare_contact(self, primary_email: str, contact_data: Dict, existing_contact: Optional[Dict],
+                        parent_id: Optional[int] = None) -> Tuple[Dict, str, List[str]]:
+        """Kategorien validieren und Odoo-Werte bauen → (Werte, Timeline-Biographie, unbekannte Kategorien)"""
+        categories = contact_data.get('categories', [])
+        valid_category_ids, invalid_categories = self.validate_categories(categories)
+        if invalid_categories:
+            self.logger.warning(f"⚠️ Unbekannte Kategorien: {invalid_categories}")
+
+        # Kontaktdaten zusammenführen
+        contact_values, biography_for_timeline = self.build_contact_values(
+            contact_data, primary_email, valid_category_ids, existing_contact)
+
+        # Personen an ihre Firma hängen (Firmen-Index: Name, sonst E-Mail-Domain - ohne Odoo-Suche)
+        if parent_id is None and self.companies.enabled and not contact_values.get('is_company'):
+            parent_id = self.companies.lookup(contact_data.get('company', ''), email_domain(primary_email))
+        if existing_contact and parent_id == existing_contact['id']:
+            parent_id = None
+        if parent_id and not contact_values.get('is_company'):
+            contact_values['parent_id'] = parent_id
+
+        # Gefunden unter anderer Adresse (Duplikat-Index/Firmen-Index) → Adresse im Kommentar festhalten
+        comment_lines = [contact_values.get('comment', '')]
+        existing_email = (existing_contact or {}).get('email') or ''
+        if existing_contact and existing_email.strip().lower() != primary_email.strip().lower():
+            comment_lines.append(f"Weitere E-Mail: {primary_email}")
+        duplicate = contact_data.get('duplicate_of')
+        if duplicate and not existing_contact:
+            if duplicate['policy'] == 'link':
+                comment_lines.append(f"Mögliches Duplikat von: {duplicate['name']} (ID {duplicate['id']})")
+            flag_id = self.odoo_categories.get(self.duplicate_flag_category.lower())
+            if duplicate['policy'] == 'flag' and flag_id:
+                category_ids = contact_values['category_id'][0][2] if contact_values.get('category_id') else []
+                contact_values['category_id'] = [(6, 0, category_ids + [flag_id])]
+        if any(comment_lines[1:]):
+            contact_values['comment'] = "\n".join(filter(None, comment_lines))
+        return contact_values, biography_for_timeline, invalid_categories
+
+    def update_existing_contact(self, primary_email: str, existing_contact: Dict,
+                                contact_values: Dict) -> Tuple[str, List[str]]:
+        """Schreibt nur die geänderten Felder → (Aktion, geschriebene Felder)"""
+        update_values = self.get_update_values(existing_contact, contact_values)
+        if not update_values:
+            self.logger.info(f"ℹ️ Kontakt bereits vollständig: {primary_email}")
+            return 'unchanged', []
+
+        if sample_debug(self.logger, 'update_write'):
+            self.logger.debug("🔍 Update-Debug: %s", {key: type(value).__name__ for key, value in update_values.items()})
+
+        self.odoo_models.execute_kw(
+            self.config['odoo']['database'],
+            self.odoo_uid,
+            self.config['odoo']['password'],
+            'res.partner', 'write',
+            [[existing_contact['id']], update_values]
+        )
+        self.discard_prefetch(primary_email)
+        if not existing_contact.get('is_company'):
+            self.duplicates.add(existing_contact['id'], update_values)
+        self.logger.info(f"✅ Kontakt aktualisiert: {primary_email} (ID: {existing_contact['id']})")
+        return 'updated', list(update_values)
+
+    def after_upsert(self, contact_id: int, primary_email: str, contact_data: Dict, forwarder_email: str,
+                     source_id: Optional[str], action: str, written_fields: List[str], biography_for_timeline: str,
+                     invalid_categories: List[str]):
+        """Herkunft, Rückfrage, Timeline-Notiz und Bestätigung nach dem Schreibzugriff"""
+        # Herkunft lokal festhalten (statt Zeitstempel im Odoo-Kommentar)
+        metrics.inc('ki_upserts', action=action)
+        self.provenance.record(contact_id, primary_email, action, source_id, forwarder_email,
+                               contact_data.get('confidence'), written_fields)
+
+        # Rückfrage erst nach dem Upsert senden - die Partner-ID wird mit der Message-ID vorgemerkt
+        if (invalid_categories and
+                self.config.get('assistant', {}).get('unknown_category_action', 'ask_sender') == 'ask_sender'):
+            self.send_category_error_email(primary_email, invalid_categories, contact_data, forwarder_email,
+                                           contact_id)
+
+        # NEUE: Timeline-Notiz für Biographie vormerken (falls vorhanden)
+        if biography_for_timeline and biography_for_timeline.strip():
+            self.queue_timeline_note(contact_id, biography_for_timeline, contact_data)
+
+        # Optional: Bestätigungs-E-Mail vormerken
+        if (self.config.get('assistant', {}).get('send_confirmation_email', False) and
+            action in ['created', 'updated']):
+            self.queue_confirmation_email(primary_email, contact_data, forwarder_email, action, contact_id, source_id)
+
+    def queue_timeline_note(self, partner_id: int, biography: str, contact_data: Dict):
+        """Merkt Timeline-Notiz in der Outbox vor (ohne Outbox: sofort erstellen)"""
+        if not self.outbox:
+            return self.create_timeline_note(partner_id, biography, contact_data)
+
+        key = Outbox.make_key('timeline_note', partner_id, biography.strip())
+        payload = {
+            'partner_id': partner_id,
+            'biography': biography,
+            'full_name': contact_data.get('full_name', 'Kontakt'),
+            'confidence': contact_data.get('confidence', 'medium')
+        }
+        self.outbox.enqueue('timeline_note', payload, key)
+        return True
+
+    def queue_confirmation_email(self, contact_email: str, contact_data: Dict, forwarder_email: str,
+                                 action: str, contact_id: int, source_id: Optional[str] = None):
+        """Merkt Bestätigungs-E-Mail in der Outbox vor (ohne Outbox: sofort senden)"""
+        if not self.outbox:
+            return self.send_confirmation_email(contact_email, contact_data, forwarder_email, action, contact_id)
+
+        # Ohne Quell-ID: höchstens eine Bestätigung pro Kontakt/Aktion und Minute
+        source = source_id or datetime.now().strftime('%Y-%m-%d %H:%M')
+        key = Outbox.make_key('confirmation', source, contact_id, action)
+        payload = {'contact_email': contact_email, 'action': action, 'contact_id': contact_id}
+        self.outbox.enqueue('confirmation', payload, key, forwarder=forwarder_email)
+        return True
+
+    def flush_outbox(self, limit: Optional[int] = None) -> Tuple[int, int]:
+        """Arbeitet offene Outbox-Einträge gebündelt ab (eine SMTP-Sitzung pro Durchlauf)"""
+        if not self.outbox:
+            return 0, 0
+
+        entries = self.outbox.pending(limit or self.outbox_batch_size)
+        if not entries:
+            return 0, 0
+
+        self.logger.info(f"📮 Outbox: verarbeite {len(entries)} Einträge")
+        done_keys = []
+        failed = 0
+
+        # 1. Timeline-Notizen
+        for entry in [e for e in entries if e['kind'] == 'timeline_note']:
+            payload = entry['payload']
+            contact_data = {'full_name': payload.get('full_name'), 'confidence': payload.get('confidence')}
+            if self.create_timeline_note(payload['partner_id'], payload['biography'], contact_data):
+                done_keys.append(entry['key'])
+            else:
+                self.outbox.mark_failed(entry['key'], 'message_post fehlgeschlagen')
+                failed += 1
+
+        # 2. Bestätigungen: Kontakte und Kategorien gebündelt lesen, eine SMTP-Sitzung
+        confirmations = [e for e in entries if e['kind'] == 'confirmation']
+        if confirmations:
+            sent_keys, confirmation_failures = self._flush_confirmations(confirmations)
+            done_keys.extend(sent_keys)
+            failed += confirmation_failures
+
+        self.outbox.mark_done(done_keys)
+        self.outbox.prune()
+        self.logger.info(f"📮 Outbox: ✅ {len(done_keys)} erledigt, ❌ {failed} fehlgeschlagen")
+        return len(done_keys), failed
+
+    def _flush_confirmations(self, entries: List[Dict]) -> Tuple[List[str], int]:
+        """Versendet vorgemerkte Bestätigungen - optional als Digest pro Weiterleiter"""
+        contact_ids = list({e['payload']['contact_id'] for e in entries})
+        try:
+            contacts = self._read_contacts_for_confirmation(contact_ids)
+        except Exception as e:
+            self.logger.error(f"❌ Outbox: Kontakte für Bestätigungen nicht lesbar: {e}")
+            for entry in entries:
+                self.outbox.mark_failed(entry['key'], str(e))
+            return [], len(entries)
+
+        # Nach Weiterleiter gruppieren (Reihenfolge bleibt erhalten)
+        by_forwarder = {}
+        for entry in entries:
+            by_forwarder.setdefault(entry['forwarder'], []).append(entry)
+
+        digest = self.config.get('assistant', {}).get('confirmation_digest', False)
+        sent_keys = []
+        failed = 0
+        batch = []
+
+        for forwarder_email, forwarder_entries in by_forwarder.items():
+            if not forwarder_email:
+                # Ohne Empfänger nichts zu senden - als erledigt betrachten
+                sent_keys.extend(e['key'] for e in forwarder_entries)
+                continue
+
+            items = []
+            for entry in forwarder_entries:
+                payload = entry['payload']
+                contact = contacts.get(payload['contact_id'])
+                if contact is None:
+                    self.outbox.mark_failed(entry['key'], f"Kontakt {payload['contact_id']} nicht gefunden")
+                    failed += 1
+                    continue
+                items.append((entry, self._build_confirmation_data(
+                    payload['contact_email'], payload['action'], payload['contact_id'], contact)))
+
+            if not items:
+                continue
+
+            # Sammeln - versendet wird gesammelt in einer Sitzung
+            if digest and len(items) > 1:
+                batch.append((self._build_digest_message(forwarder_email, [data for _, data in items]),
+                              [entry['key'] for entry, _ in items]))
+            else:
+                for entry, data in items:
+                    batch.append((self._build_confirmation_message(
+                        forwarder_email, entry['payload']['action'], data), [entry['key']]))
+
+        for keys, error in self.smtp_sender.send_batch(batch):
+            if error is None:
+                sent_keys.extend(keys)
+            else:
+                for key in keys:
+                    self.outbox.mark_failed(key, str(error))
+                failed += len(keys)
+
+        if sent_keys:
+            self.logger.info(f"✅ Bestätigungen gesendet: {len(sent_keys)} Kontakt(e) an {len(by_forwarder)} Weiterleiter")
+
+        return sent_keys, failed
+
+    def send_category_error_email(self, contact_email: str, invalid_categories: List[str], contact_data: Dict,
+                                  forwarder_email: str, partner_id: Optional[int] = None):
         """Sendet Rückfrage bei unbekannten Kategorien an den Weiterleiter (mit YAML-Templates)"""
         try:
             self.logger.info(f"📧 Sende Kategorie-Rückfrage für: {contact_email}")
@@ -251,6 +869,9 @@ class OdooManager:
             msg['From'] = self.config['email']['smtp_username']
             msg['To'] = forwarder_email
             msg['Subject'] = subject_template.format(contact_email=contact_email)
+            # Eigene Message-ID: die Antwort verweist per In-Reply-To/References darauf
+            sender_domain = self.config['email']['smtp_username'].rpartition('@')[2] or None
+            msg['Message-ID'] = make_msgid('ki-rueckfrage', domain=sender_domain)
 
             # Ähnliche Kategorien finden
             similar_suggestions = []
@@ -296,6 +917,8 @@ class OdooManager:
 
             # E-Mail senden
             self._send_email(msg)
+            self.inquiries.add(msg['Message-ID'], partner_id, contact_email, forwarder_email, invalid_categories)
+            metrics.inc('ki_rueckfragen')
             self.logger.info(f"✅ Kategorie-Rückfrage erfolgreich gesendet an: {forwarder_email}")
 
         except Exception as e:
@@ -303,26 +926,8 @@ class OdooManager:
             self.logger.info("ℹ️ Setze Verarbeitung ohne E-Mail-Versand fort")
 
     def _send_email(self, msg):
-        """Zentrale E-Mail-Versand-Methode"""
-        smtp_config = self.config['email']
-
-        if smtp_config.get('smtp_use_ssl', False):
-            server = smtplib.SMTP_SSL(smtp_config['smtp_server'], smtp_config['smtp_port'])
-        else:
-            server = smtplib.SMTP(smtp_config['smtp_server'], smtp_config['smtp_port'])
-            server.settimeout(10)
-
-            if smtp_config.get('smtp_use_tls', False):
-                server.starttls()
-
-        try:
-            server.login(smtp_config['smtp_username'], smtp_config['smtp_password'])
-            server.send_message(msg)
-            server.quit()
-        except Exception as e:
-            self.logger.error(f"❌ SMTP-Login/Send Fehler: {e}")
-            server.quit()
-            raise
+        """Zentrale E-Mail-Versand-Methode (wiederverwendete SMTP-Sitzung)"""
+        self.smtp_sender.send(msg)
 
     def send_confirmation_email(self, contact_email: str, contact_data: Dict, forwarder_email: str,
                               action: str, contact_id: int):
@@ -330,39 +935,68 @@ class OdooManager:
         try:
             self.logger.info(f"📧 Sende Bestätigungs-E-Mail für: {contact_email}")
 
-            # Aktuellen Kontakt aus Odoo laden
-            current_contact = self.odoo_models.execute_kw(
+            # Aktuellen Kontakt (inkl. Kategorien-Namen) aus Odoo laden
+            current_contact = self._read_contacts_for_confirmation([contact_id])[contact_id]
+
+            template_data = self._build_confirmation_data(contact_email, action, contact_id, current_contact)
+            msg = self._build_confirmation_message(forwarder_email, action, template_data)
+
+            # E-Mail senden
+            self._send_email(msg)
+            self.logger.info(f"✅ Bestätigungs-E-Mail erfolgreich gesendet an: {forwarder_email}")
+
+        except Exception as e:
+            self.logger.error(f"❌ Fehler beim Senden der Bestätigungs-E-Mail: {e}")
+            self.logger.info("ℹ️ Setze Verarbeitung ohne E-Mail-Versand fort")
+
+    def _read_contacts_for_confirmation(self, contact_ids: List[int]) -> Dict[int, Dict]:
+        """Liest Kontakte für Bestätigungen gebündelt (ein read + ein Kategorie-read)"""
+        contacts = self.odoo_models.execute_kw(
+            self.config['odoo']['database'],
+            self.odoo_uid,
+            self.config['odoo']['password'],
+            'res.partner', 'read',
+            [contact_ids],
+            {'fields': ['name', 'email', 'phone', 'street', 'city', 'zip', 'country_id',
+                       'website', 'function', 'category_id', 'is_company', 'comment', 'lang']}
+        )
+
+        # Kategorien-Namen für alle Kontakte auf einmal laden
+        all_cat_ids = set()
+        for contact in contacts:
+            for cat in contact.get('category_id') or []:
+                all_cat_ids.add(cat[0] if isinstance(cat, list) else cat)
+
+        category_names = {}
+        if all_cat_ids:
+            categories = self.odoo_models.execute_kw(
                 self.config['odoo']['database'],
                 self.odoo_uid,
                 self.config['odoo']['password'],
-                'res.partner', 'read',
-                [contact_id],
-                {'fields': ['name', 'email', 'phone', 'street', 'city', 'zip', 'country_id',
-                           'website', 'function', 'category_id', 'is_company', 'comment']}
-            )[0]
-
-            # Kategorien-Namen laden
-            category_names = []
-            if current_contact.get('category_id'):
-                cat_ids = [cat[0] if isinstance(cat, list) else cat for cat in current_contact['category_id']]
-                categories = self.odoo_models.execute_kw(
-                    self.config['odoo']['database'],
-                    self.odoo_uid,
-                    self.config['odoo']['password'],
-                    'res.partner.category', 'read',
-                    [cat_ids],
-                    {'fields': ['name']}
-                )
-                category_names = [cat['name'] for cat in categories]
+                'res.partner.category', 'read',
+                [list(all_cat_ids)],
+                {'fields': ['name']}
+            )
+            category_names = {cat['id']: cat['name'] for cat in categories}
+
+        result = {}
+        for contact in contacts:
+            cat_ids = [cat[0] if isinstance(cat, list) else cat for cat in contact.get('category_id') or []]
+            contact['category_names'] = [category_names[cat_id] for cat_id in cat_ids if cat_id in category_names]
+            result[contact['id']] = contact
+
+        return result
 
-            # Template aus YAML laden oder Fallback verwenden
-            template_key = f'confirmation_{action}' if action in ['created', 'updated'] else 'confirmation_created'
-            confirmation_template = self.prompts.get(template_key, {})
+    def _get_confirmation_templates(self, action: str) -> Tuple[str, str]:
+        """Liefert Subject- und Body-Template für Bestätigungen"""
+        # Template aus YAML laden oder Fallback verwenden
+        template_key = f'confirmation_{action}' if action in ['created', 'updated'] else 'confirmation_created'
+        confirmation_template = self.prompts.get(template_key, {})
 
-            # Fallback-Template falls YAML nicht verfügbar
-            if not confirmation_template:
-                subject_template = '✅ Kontakt {action}: {contact_email}'
-                body_template = '''Hallo,
+        # Fallback-Template falls YAML nicht verfügbar
+        if not confirmation_template:
+            subject_template = '✅ Kontakt {action}: {contact_email}'
+            body_template = '''Hallo,
 
 der Kontakt {contact_email} wurde erfolgreich {action}.
 
@@ -390,75 +1024,94 @@ Die KI-extrahierte Biographie wurde als Timeline-Notiz hinterlegt und ist im Odo
 
 Viele Grüße,
 Ihr KI-Assistent'''
-            else:
-                subject_template = confirmation_template.get('subject_template', '✅ Kontakt {action}: {contact_email}')
-                body_template = confirmation_template.get('body_template', 'Kontakt {contact_email} wurde {action}.')
+        else:
+            subject_template = confirmation_template.get('subject_template', '✅ Kontakt {action}: {contact_email}')
+            body_template = confirmation_template.get('body_template', 'Kontakt {contact_email} wurde {action}.')
+
+        return subject_template, body_template
+
+    def _build_confirmation_data(self, contact_email: str, action: str, contact_id: int, current_contact: Dict) -> Dict:
+        """Stellt die Template-Daten für eine Bestätigung zusammen"""
+        category_names = current_contact.get('category_names', [])
+
+        # Adresse formatieren
+        address_parts = []
+        if current_contact.get('street'):
+            address_parts.append(current_contact['street'])
+        if current_contact.get('city') or current_contact.get('zip'):
+            city_zip = f"{current_contact.get('zip') or ''} {current_contact.get('city') or ''}".strip()
+            if city_zip:
+                address_parts.append(city_zip)
+        if current_contact.get('country_id'):
+            country_name = current_contact['country_id'][1] if isinstance(current_contact['country_id'], list) else ""
+            if country_name:
+                address_parts.append(country_name)
+
+        address_str = ", ".join(address_parts) if address_parts else "Keine Adresse"
+
+        # Action-Text definieren
+        action_text = "erstellt" if action == "created" else "aktualisiert"
+
+        # Fehlende Daten identifizieren
+        missing_data = []
+        if not current_contact.get('phone'):
+            missing_data.append("📞 Telefonnummer")
+        if not current_contact.get('street'):
+            missing_data.append("🏠 Adresse")
+        if not current_contact.get('website'):
+            missing_data.append("🌐 Website")
+        if not current_contact.get('function'):
+            missing_data.append("💼 Position/Funktion")
+        if not category_names:
+            missing_data.append("🏷️ Kategorien")
+
+        missing_text = '\n'.join(missing_data) if missing_data else "✅ Alle wichtigen Daten erfasst!"
+
+        # Template-Daten zusammenstellen mit besserer Formatierung
+        return {
+            'contact_email': contact_email,
+            'action': action_text,
+            'contact_name': current_contact.get('name', '❌ Kein Name'),
+            'contact_type': 'Firma' if current_contact.get('is_company') else 'Privatperson',
+            'contact_phones': current_contact.get('phone') or '❌ Keine Telefonnummer',
+            'contact_address': address_str if address_str != "Keine Adresse" else '❌ Keine Adresse',
+            'contact_website': current_contact.get('website') or '❌ Keine Website',
+            'contact_position': current_contact.get('function') or '❌ Keine Position',
+            'contact_language': current_contact.get('lang') or '❌ Keine Sprache',
+            'contact_categories': ', '.join(category_names) if category_names else '❌ Keine Kategorien',
+            'missing_data': missing_text,
+            'odoo_link': f"{self.config['odoo']['url']}/web#id={contact_id}&model=res.partner&view_type=form"
+        }
 
-            msg = MIMEMultipart()
-            msg['From'] = self.config['email']['smtp_username']
-            msg['To'] = forwarder_email
+    def _build_confirmation_message(self, forwarder_email: str, action: str, template_data: Dict) -> MIMEMultipart:
+        """Baut eine einzelne Bestätigungs-E-Mail"""
+        subject_template, body_template = self._get_confirmation_templates(action)
 
-            # Adresse formatieren
-            address_parts = []
-            if current_contact.get('street'):
-                address_parts.append(current_contact['street'])
-            if current_contact.get('city') or current_contact.get('zip'):
-                city_zip = f"{current_contact.get('zip', '')} {current_contact.get('city', '')}".strip()
-                if city_zip:
-                    address_parts.append(city_zip)
-            if current_contact.get('country_id'):
-                country_name = current_contact['country_id'][1] if isinstance(current_contact['country_id'], list) else ""
-                if country_name:
-                    address_parts.append(country_name)
-
-            address_str = ", ".join(address_parts) if address_parts else "Keine Adresse"
-
-            # Action-Text definieren
-            action_text = "erstellt" if action == "created" else "aktualisiert"
-
-            # Fehlende Daten identifizieren
-            missing_data = []
-            if not current_contact.get('phone'):
-                missing_data.append("📞 Telefonnummer")
-            if not current_contact.get('street'):
-                missing_data.append("🏠 Adresse")
-            if not current_contact.get('website'):
-                missing_data.append("🌐 Website")
-            if not current_contact.get('function'):
-                missing_data.append("💼 Position/Funktion")
-            if not category_names:
-                missing_data.append("🏷️ Kategorien")
-
-            missing_text = '\n'.join(missing_data) if missing_data else "✅ Alle wichtigen Daten erfasst!"
-
-            # Template-Daten zusammenstellen mit besserer Formatierung
-            template_data = {
-                'contact_email': contact_email,
-                'action': action_text,
-                'contact_name': current_contact.get('name', '❌ Kein Name'),
-                'contact_type': 'Firma' if current_contact.get('is_company') else 'Privatperson',
-                'contact_phones': current_contact.get('phone') or '❌ Keine Telefonnummer',
-                'contact_address': address_str if address_str != "Keine Adresse" else '❌ Keine Adresse',
-                'contact_website': current_contact.get('website') or '❌ Keine Website',
-                'contact_position': current_contact.get('function') or '❌ Keine Position',
-                'contact_language': current_contact.get('lang') or '❌ Keine Sprache',
-                'contact_categories': ', '.join(category_names) if category_names else '❌ Keine Kategorien',
-                'missing_data': missing_text,
-                'odoo_link': f"{self.config['odoo']['url']}/web#id={contact_id}&model=res.partner&view_type=form"
-            }
+        msg = MIMEMultipart()
+        msg['From'] = self.config['email']['smtp_username']
+        msg['To'] = forwarder_email
 
-            # Subject und Body aus Templates erstellen
-            msg['Subject'] = subject_template.format(**template_data)
-            body = body_template.format(**template_data)
-            msg.attach(MIMEText(body, 'plain', 'utf-8'))
+        # Subject und Body aus Templates erstellen
+        msg['Subject'] = subject_template.format(**template_data)
+        body = body_template.format(**template_data)
+        msg.attach(MIMEText(body, 'plain', 'utf-8'))
+        return msg
 
-            # E-Mail senden
-            self._send_email(msg)
-            self.logger.info(f"✅ Bestätigungs-E-Mail erfolgreich gesendet an: {forwarder_email}")
+    def _build_digest_message(self, forwarder_email: str, items: List[Dict]) -> MIMEMultipart:
+        """Baut eine Sammel-Bestätigung (eine E-Mail pro Weiterleiter und Zyklus)"""
+        digest_template = self.prompts.get('confirmation_digest', {})
+        subject_template = digest_template.get('subject_template', '✅ KI-Zusammenfassung: {count} Kontakte verarbeitet')
+        body_template = digest_template.get('body_template', 'Hallo,\n\n{count} Kontakte wurden verarbeitet:\n\n{entries}\n\nViele Grüße,\nIhr KI-Assistent')
+        entry_template = digest_template.get('entry_template', '• {contact_name} <{contact_email}> - {action}\n  🔗 {odoo_link}')
 
-        except Exception as e:
-            self.logger.error(f"❌ Fehler beim Senden der Bestätigungs-E-Mail: {e}")
-            self.logger.info("ℹ️ Setze Verarbeitung ohne E-Mail-Versand fort")
+        entries = '\n'.join(entry_template.format(**data) for data in items)
+
+        msg = MIMEMultipart()
+        msg['From'] = self.config['email']['smtp_username']
+        msg['To'] = forwarder_email
+        msg['Subject'] = subject_template.format(count=len(items))
+        msg.attach(MIMEText(body_template.format(count=len(items), entries=entries), 'plain', 'utf-8'))
+        return msg
 
     def build_contact_values(self, contact_data: Dict, primary_email: str, category_ids: List[int], existing_contact: Optional[Dict]) -> Tuple[Dict, str]:
         """Baut Kontakt-Datenstruktur für Odoo (FIXED VERSION für Timeline-Notizen)"""
@@ -499,10 +1152,9 @@ Ihr KI-Assistent'''
 
         # NEUE BIOGRAPHIE-STRATEGIE: Kompakter Kommentar + separate Timeline-Notiz
         original_biography = contact_data.get('biography', '').strip()  # Für Timeline-Notiz
-        confidence = contact_data.get('confidence', 'medium')
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M')
 
-        # Baue kompakten Kommentar (OHNE die lange Biographie)
+        # Baue kompakten Kommentar (OHNE die lange Biographie und OHNE Import-Stempel -
+        # Zeitpunkt/Confidence stehen im lokalen Herkunfts-Log, siehe provenance.py)
         comment_parts = []
 
         # Bei Personen: Firma erwähnen
@@ -510,16 +1162,12 @@ Ihr KI-Assistent'''
             comment_parts.append(f"Firma: {company_name}")
             self.logger.info(f"🏢 Firma zum Kommentar hinzugefügt: {company_name}")
 
-        # Kompakter KI-Import-Hinweis
-        comment_parts.append(f"[KI-Import {timestamp} - Confidence: {confidence}]")
-
         # Zusammenfügen - OHNE Biographie im Kommentar
         enhanced_comment = "\n".join(comment_parts)
 
         # DEBUG: Logs
-        self.logger.info(f"📋 Finale Kommentar-Struktur für {primary_email}:")
-        self.logger.info(f"   Kommentar: '{enhanced_comment}'")
-        self.logger.info(f"   Timeline-Biographie: '{original_biography[:50]}...' ({len(original_biography)} Zeichen)")
+        self.logger.info(f"📋 Kommentar für {primary_email}: '{enhanced_comment}' - Timeline-Biographie: "
+                         f"'{original_biography[:50]}...' ({len(original_biography)} Zeichen)")
 
         # Sprache konvertieren
         language_code = self.convert_language_to_odoo(contact_data.get('language', 'deutsch'))
@@ -530,15 +1178,12 @@ Ihr KI-Assistent'''
             'email': primary_email,
             'lang': language_code,
             'is_company': is_company,
-            'comment': enhanced_comment  # ← Jetzt kompakt OHNE Biographie
         }
+        if enhanced_comment:
+            contact_values['comment'] = enhanced_comment  # ← Jetzt kompakt OHNE Biographie
 
-        # DEBUG: Logge die kritischen Werte
-        self.logger.info(f"🎯 NAMEN-ZUORDNUNG für {primary_email}:")
-        self.logger.info(f"   is_company: {is_company}")
-        self.logger.info(f"   company (aus KI): '{company_name}'")
-        self.logger.info(f"   full_name (aus KI): '{full_name}'")
-        self.logger.info(f"   → name (für Odoo): '{display_name}'")
+        self.logger.debug("🎯 NAMEN-ZUORDNUNG für %s: is_company=%s, company='%s', full_name='%s' → name='%s'",
+                          primary_email, is_company, company_name, full_name, display_name)
 
         # FIXED: Vollständige Adress-Felder aus GPT-strukturierten Daten
         address = contact_data.get('address', {})
@@ -571,7 +1216,7 @@ Ihr KI-Assistent'''
             # Falls mehrere Telefonnummern: in Kommentar erwähnen
             if len(phones) > 1:
                 additional_phones = ", ".join(phones[1:])
-                enhanced_comment += f"\nWeitere Telefonnummern: {additional_phones}"
+                enhanced_comment = "\n".join(filter(None, [enhanced_comment, f"Weitere Telefonnummern: {additional_phones}"]))
                 contact_values['comment'] = enhanced_comment
 
         # Website
@@ -589,11 +1234,10 @@ Ihr KI-Assistent'''
             contact_values['category_id'] = [(6, 0, category_ids)]
             self.logger.debug(f"🏷️ Kategorien gesetzt: {len(category_ids)} Kategorien")
 
-        # Debug: Alle gesetzten Felder loggen
-        self.logger.info(f"📋 Odoo-Felder für {primary_email}:")
-        for field, value in contact_values.items():
-            if field != 'comment':  # Kommentar ist zu lang für Log
-                self.logger.info(f"   {field}: {value}")
+        # Debug: Alle gesetzten Felder loggen (Kommentar ist zu lang für Log)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("📋 Odoo-Felder für %s: %s", primary_email,
+                              {field: value for field, value in contact_values.items() if field != 'comment'})
 
         # RÜCKGABE: contact_values + original_biography für Timeline-Notiz
         return contact_values, original_biography
@@ -601,15 +1245,12 @@ Ihr KI-Assistent'''
     def get_update_values(self, existing_contact: Dict, new_values: Dict) -> Dict:
         """Ermittelt Update-Werte (FIXED für Firmen-Namen-Updates + Biographie-Erhaltung)"""
 
-        # NOTFALL-DEBUG: Alle existing_contact Werte prüfen
-        self.logger.debug("🔍 DEBUG existing_contact Typen:")
-        for key, value in existing_contact.items():
-            self.logger.debug(f"   {key}: {value} (Typ: {type(value)})")
-
-        # NOTFALL-DEBUG: Alle new_values Werte prüfen
-        self.logger.debug("🔍 DEBUG new_values Typen:")
-        for key, value in new_values.items():
-            self.logger.debug(f"   {key}: {value} (Typ: {type(value)})")
+        # Typ-Dump nur für jede N-te Nachricht (logging.debug_sample_rate)
+        if sample_debug(self.logger, 'update_values'):
+            self.logger.debug("🔍 DEBUG existing_contact Typen: %s",
+                              {key: type(value).__name__ for key, value in existing_contact.items()})
+            self.logger.debug("🔍 DEBUG new_values Typen: %s",
+                              {key: type(value).__name__ for key, value in new_values.items()})
 
         update_values = {}
 
@@ -635,11 +1276,11 @@ Ihr KI-Assistent'''
                 (not existing_is_company and new_is_company)  # Wechsel von Person zu Firma
             )
 
-            if should_update_name:
+            if should_update_name and new_name != existing_name:
                 update_values['name'] = new_name
                 self.logger.info(f"🏢 Firmen-Name aktualisiert: '{existing_name}' → '{new_name}'")
 
-        elif not new_is_company and new_name:
+        elif not new_is_company and new_name and new_name.lower() != existing_name.lower():
             # Bei Personen: Normale Update-Logik
             if (not existing_name or
                 len(new_name.split()) > len(existing_name.split()) or
@@ -669,6 +1310,11 @@ Ihr KI-Assistent'''
                 update_values['lang'] = new_values['lang']
                 self.logger.info(f"📝 Sprache ergänzt: {new_values['lang']}")
 
+        # Firma (parent_id) nur setzen, wenn noch keine zugeordnet ist
+        if new_values.get('parent_id') and not existing_contact.get('parent_id'):
+            update_values['parent_id'] = new_values['parent_id']
+            self.logger.info(f"🏢 Firma zugeordnet: ID {new_values['parent_id']}")
+
         # FIXED: Country separat behandeln
         if 'country_id' in new_values and new_values['country_id']:
             existing_country = existing_contact.get('country_id')
@@ -676,42 +1322,33 @@ Ihr KI-Assistent'''
                 update_values['country_id'] = new_values['country_id']
                 self.logger.info(f"📝 Land ergänzt: {new_values['country_id']}")
 
-        # FIXED: Kommentar intelligent erweitern (aber NICHT Biographie - das macht Timeline-Notiz)
-        if 'comment' in new_values:
-            existing_comment = existing_contact.get('comment', '')
-            existing_comment = str(existing_comment).strip() if existing_comment and existing_comment is not False else ''
-            new_comment = new_values['comment'].strip()
-
-            # Sicherheitscheck: Konvertiere zu String falls nötig
-            if not isinstance(existing_comment, str):
-                existing_comment = str(existing_comment) if existing_comment else ''
-            if not isinstance(new_comment, str):
-                new_comment = str(new_comment) if new_comment else ''
-
-            # INTELLIGENTE KOMMENTAR-BEHANDLUNG (Timeline-Notizen machen die Biographie)
-            if existing_comment:
-                # Prüfe ob neuer Kommentar bereits in bestehendem enthalten ist
-                if new_comment.strip() not in existing_comment:
-                    # Neuen Kommentar hinzufügen
-                    combined_comment = f"{existing_comment}\n--- Ergänzung ---\n{new_comment}"
-                    update_values['comment'] = combined_comment
-                    self.logger.info("📝 Kommentar erweitert mit neuen Informationen")
-                else:
-                    self.logger.info("📝 Kommentar bereits vorhanden - überspringe")
-            else:
-                # Kein bestehender Kommentar - neuen setzen
-                update_values['comment'] = new_comment
+        # Kommentar zeilenweise abgleichen (NICHT Biographie - das macht Timeline-Notiz);
+        # reine Herkunfts-Stempel zählen nicht als Änderung
+        if new_values.get('comment'):
+            existing_comment = existing_contact.get('comment') or ''
+            existing_comment = str(existing_comment).strip()
+            existing_lines = {line.strip() for line in existing_comment.splitlines()}
+            added_lines = [line.strip() for line in str(new_values['comment']).splitlines()
+                           if line.strip() and line.strip() not in existing_lines
+                           and not PROVENANCE_LINE.match(line.strip())]
+
+            if added_lines and existing_comment:
+                update_values['comment'] = f"{existing_comment}\n--- Ergänzung ---\n" + "\n".join(added_lines)
+                self.logger.info(f"📝 Kommentar erweitert: {added_lines}")
+            elif added_lines:
+                update_values['comment'] = "\n".join(added_lines)
                 self.logger.info("📝 Neuer Kommentar hinzugefügt")
+            else:
+                self.logger.debug("📝 Kommentar enthält bereits alle Angaben - überspringe")
 
-        # Kategorien zusammenführen
+        # Kategorien zusammenführen (Mengenvergleich - Reihenfolge ist keine Änderung)
         if 'category_id' in new_values:
             existing_cat_ids = set(cat[0] if isinstance(cat, (list, tuple)) else cat
-                                for cat in existing_contact.get('category_id', []))
+                                for cat in existing_contact.get('category_id') or [])
             new_cat_ids = set(new_values['category_id'][0][2])
 
-            combined_cat_ids = list(existing_cat_ids.union(new_cat_ids))
-            if combined_cat_ids != list(existing_cat_ids):
-                update_values['category_id'] = [(6, 0, combined_cat_ids)]
+            if not new_cat_ids <= existing_cat_ids:
+                update_values['category_id'] = [(6, 0, sorted(existing_cat_ids | new_cat_ids))]
                 self.logger.info(f"🏷️ Kategorien erweitert: {new_cat_ids - existing_cat_ids}")
 
         # Debug: Zeige was geupdatet wird
@@ -736,6 +1373,15 @@ Ihr KI-Assistent'''
 
             country_lower = country_name.lower().strip()
             iso_code = country_iso_map.get(country_lower)
+            # vCard/schema.org liefern oft direkt den ISO-Code ("CH")
+            if not iso_code and len(country_lower) == 2 and country_lower.isalpha():
+                iso_code = country_lower.upper()
+
+            if iso_code and self.country_ids is not None:
+                country_id = self.country_ids.get(iso_code)
+                if country_id:
+                    self.logger.info(f"🌍 Land erkannt: {country_name} → {iso_code} (ID: {country_id})")
+                return country_id
 
             if iso_code:
                 try:
@@ -762,6 +1408,20 @@ Ihr KI-Assistent'''
             self.logger.error(f"❌ Fehler bei Land-Mapping: {e}")
             return None
 
+    def load_countries(self):
+        """Lädt alle Länder einmalig (ISO-Code → ID) - danach ohne Odoo-Aufruf"""
+        try:
+            countries = self.odoo_models.execute_kw(
+                self.config['odoo']['database'],
+                self.odoo_uid,
+                self.config['odoo']['password'],
+                'res.country', 'search_read', [[]],
+                {'fields': ['code']}
+            )
+            self.country_ids = {country['code']: country['id'] for country in countries if country.get('code')}
+        except Exception as e:
+            self.logger.warning(f"⚠️ Länder konnten nicht vorgeladen werden: {e}")
+
     def _clean_biography(self, biography_text: str) -> str:
         """Bereinigt Biographie von HTML-Tags und kürzt sie"""
         if not biography_text:
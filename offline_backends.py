@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+In-Process-Ersatz für IMAP, OpenAI, Odoo (XML-RPC) und SMTP
+Für Benchmarks und Offline-Replays ohne Netzwerkzugriff
+"""
+
+import copy
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+import yaml
+
+
+class FakeIMAP:
+    """IMAP-Postfach im Speicher (Teilmenge von imaplib.IMAP4_SSL)"""
+
+    def __init__(self, messages: Optional[List[bytes]] = None):
+        self.messages: Dict[bytes, bytes] = {}
+        self.flags: Dict[bytes, set] = {}
+        for raw in messages or []:
+            self.append(raw)
+
+    def append(self, raw: bytes) -> bytes:
+        num = str(len(self.messages) + 1).encode()
+        self.messages[num] = raw
+        self.flags[num] = set()
+        return num
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def login(self, user, password):
+        return 'OK', [b'Logged in']
+
+    def select(self, mailbox='INBOX'):
+        return 'OK', [str(len(self.messages)).encode()]
+
+    def search(self, charset, criterion):
+        if criterion == 'UNSEEN':
+            nums = [num for num in self.messages if '\\Seen' not in self.flags[num]]
+        else:
+            nums = list(self.messages)
+        return 'OK', [b' '.join(nums)]
+
+    def fetch(self, num, parts):
+        num = num if isinstance(num, bytes) else str(num).encode()
+        raw = self.messages[num]
+        # Wie ein echter Server: RFC822/BODY[] setzen \Seen beim Abruf, BODY.PEEK[] nicht
+        if 'PEEK' not in parts.upper():
+            self.flags[num].add('\\Seen')
+            return 'OK', [(num + b' (RFC822 {%d}' % len(raw), raw), b')']
+        return 'OK', [(num + b' (BODY[] {%d}' % len(raw), raw), b')']
+
+    def store(self, num, command, flags):
+        num = num if isinstance(num, bytes) else str(num).encode()
+        if command.startswith('+'):
+            self.flags[num].update(flags.split())
+        elif command.startswith('-'):
+            self.flags[num].difference_update(flags.split())
+        return 'OK', []
+
+    def logout(self):
+        return 'BYE', []
+
+
+class FakeOpenAI:
+    """Ersatz für das openai-Modul: chat.completions.create mit Latenz und vorgefertigtem JSON"""
+
+    def __init__(self, latency: float = 0.0, canned: Optional[Dict] = None):
+        self.latency = latency
+        self.canned = canned
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model=None, messages=None, max_tokens=None, temperature=None, **kwargs):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        prompt = ' '.join(message.get('content', '') for message in messages or [])
+        match = re.search(r'(?:ABSENDER-EMAIL|GENERIERTE EMAIL):\s*(\S+@\S+)', prompt)
+        sender = match.group(1) if match else 'unbekannt@example.com'
+
+        content = json.dumps(self.canned if self.canned is not None else self.default_response(sender),
+                             ensure_ascii=False)
+        usage = SimpleNamespace(prompt_tokens=len(prompt) // 4, completion_tokens=len(content) // 4,
+                                total_tokens=(len(prompt) + len(content)) // 4)
+        choice = SimpleNamespace(message=SimpleNamespace(content=content), finish_reason='stop', index=0)
+        return SimpleNamespace(choices=[choice], usage=usage, model=model)
+
+    @staticmethod
+    def default_response(sender: str) -> Dict:
+        """Plausible Extraktion, abgeleitet aus der Absender-Adresse"""
+        local_part = sender.split('@')[0]
+        parts = [part.capitalize() for part in re.split(r'[._-]', local_part) if part]
+        first_name = parts[0] if parts else ''
+        last_name = parts[-1] if len(parts) > 1 else ''
+        return {
+            'first_name': first_name,
+            'last_name': last_name,
+            'full_name': ' '.join(parts),
+            'emails': [sender],
+            'phones': ['+41 41 123 45 67'],
+            'address': {'street': 'Bahnhofstrasse 1', 'city': 'Zug', 'zip': '6300', 'country': 'Schweiz'},
+            'website': sender.split('@')[-1],
+            'company': '',
+            'position': '',
+            'is_company': False,
+            'language': 'deutsch',
+            'categories': ['kunde'],
+            'biography': 'Offline-Benchmark-Kontakt',
+            'confidence': 'high'
+        }
+
+
+class FakeOdoo:
+    """XML-RPC-Objekt-Endpunkt im Speicher, zählt alle execute_kw-Aufrufe"""
+
+    def __init__(self, categories: Optional[List[str]] = None, latency: float = 0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._next_id = 1000
+        self.records: Dict[str, Dict[int, Dict]] = {
+            'res.partner': {},
+            'res.partner.category': {},
+            'res.country': {},
+            'mail.message': {},
+        }
+        for name in categories or ['Neuer-KI-Eintrag', 'Kunde', 'Lieferant', 'Techniker', 'EDV', 'english']:
+            self._insert('res.partner.category', {'name': name})
+        for code, name in [('CH', 'Schweiz'), ('DE', 'Deutschland'), ('AT', 'Österreich'),
+                           ('US', 'USA'), ('RU', 'Russland')]:
+            self._insert('res.country', {'code': code, 'name': name})
+
+    def _insert(self, model: str, values: Dict) -> int:
+        self._next_id += 1
+        record = dict(values)
+        record['id'] = self._next_id
+        record['write_date'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.records[model][self._next_id] = record
+        return self._next_id
+
+    @staticmethod
+    def _matches(record: Dict, domain: List) -> bool:
+        for term in domain:
+            if not isinstance(term, (list, tuple)) or len(term) != 3:
+                continue  # '&' / '|' werden als UND behandelt
+            field, operator, value = term
+            current = record.get(field)
+            if isinstance(current, list) and current and operator in ('=', 'in'):
+                current = [c[0] if isinstance(c, (list, tuple)) else c for c in current]
+                if operator == '=' and value not in current:
+                    return False
+                if operator == 'in' and not set(current) & set(value):
+                    return False
+                continue
+            if operator == '=' and current != value:
+                return False
+            if operator == '!=' and current == value:
+                return False
+            if operator == 'in' and current not in value:
+                return False
+            if operator in ('ilike', '=ilike') and (not current or str(value).lower().strip('%') not in str(current).lower()):
+                return False
+            if operator in ('>', '>=') and (current is None or (current <= value if operator == '>' else current < value)):
+                return False
+        return True
+
+    def _search(self, model: str, domain: List, kwargs: Dict) -> List[int]:
+        records = [r for r in self.records[model].values() if self._matches(r, domain)]
+        order = kwargs.get('order')
+        if order:
+            field, _, direction = order.partition(' ')
+            records.sort(key=lambda r: r.get(field) or '', reverse=direction.lower() == 'desc')
+        ids = [r['id'] for r in records]
+        offset = kwargs.get('offset', 0)
+        limit = kwargs.get('limit')
+        return ids[offset:offset + limit] if limit else ids[offset:]
+
+    def _read(self, model: str, ids: List[int], fields: Optional[List[str]]) -> List[Dict]:
+        result = []
+        for record_id in ids:
+            record = self.records[model].get(record_id)
+            if record is None:
+                continue
+            data = copy.deepcopy(record)
+            if model == 'res.partner':
+                data['category_id'] = list(data.get('category_id', []))
+                if data.get('country_id'):
+                    country = self.records['res.country'].get(data['country_id'])
+                    data['country_id'] = [data['country_id'], country['name'] if country else '']
+            if fields:
+                data = {field: data.get(field, False) for field in fields}
+                data['id'] = record_id
+            result.append(data)
+        return result
+
+    @staticmethod
+    def _apply_commands(record: Dict, values: Dict):
+        for field, value in values.items():
+            if field in ('category_id', 'child_ids') and isinstance(value, list):
+                current = set(record.get(field, []))
+                for command in value:
+                    if command[0] == 6:
+                        current = set(command[2])
+                    elif command[0] == 4:
+                        current.add(command[1])
+                    elif command[0] == 3:
+                        current.discard(command[1])
+                record[field] = sorted(current)
+            else:
+                record[field] = value
+
+    def execute_kw(self, db, uid, password, model, method, args, kwargs=None):
+        kwargs = kwargs or {}
+        with self._lock:
+            self.calls[(model, method)] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self._lock:
+            if method == 'search':
+                return self._search(model, args[0], kwargs)
+            if method == 'search_count':
+                return len(self._search(model, args[0], {}))
+            if method == 'search_read':
+                ids = self._search(model, args[0] if args else [], kwargs)
+                return self._read(model, ids, kwargs.get('fields'))
+            if method == 'read':
+                ids = args[0] if isinstance(args[0], list) else [args[0]]
+                return self._read(model, ids, kwargs.get('fields'))
+            if method == 'create':
+                values = args[0]
+                if isinstance(values, list):
+                    return [self._create(model, v) for v in values]
+                return self._create(model, values)
+            if method == 'write':
+                for record_id in args[0]:
+                    record = self.records[model].get(record_id)
+                    if record is not None:
+                        self._apply_commands(record, args[1])
+                        record['write_date'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                return True
+            if method == 'message_post':
+                return self._insert('mail.message', {'res_id': args[0], 'model': model, **kwargs})
+            if method == 'unlink':
+                for record_id in args[0]:
+                    self.records[model].pop(record_id, None)
+                return True
+
+        raise NotImplementedError(f"FakeOdoo: {model}.{method} nicht unterstützt")
+
+    def _create(self, model: str, values: Dict) -> int:
+        record_id = self._insert(model, {})
+        self._apply_commands(self.records[model][record_id], values)
+        return record_id
+
+    def version(self):
+        return {'server_version': 'offline'}
+
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+
+class FakeSMTPSender:
+    """Ersatz für SMTPSender - sammelt Nachrichten statt sie zu versenden"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.sent = []
+
+    def send(self, msg):
+        if self.latency:
+            time.sleep(self.latency)
+        self.sent.append(msg)
+
+    def send_batch(self, batch):
+        results = []
+        for msg, tag in batch:
+            self.send(msg)
+            results.append((tag, None))
+        return results
+
+    def close_if_idle(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class OfflineConfigManager:
+    """Ersatz für ConfigManager ohne Netzwerk (gleiche Getter-Schnittstelle)"""
+
+    def __init__(self, config_file: str = 'config-sys.yml.example', prompts_file: str = 'prompts.yml',
+                 overrides: Optional[Dict] = None, odoo_models=None, log_level: str = 'WARNING',
+                 log_file: Optional[str] = None):
+        with open(config_file, 'r', encoding='utf-8') as f:
+            self.config = yaml.safe_load(f)
+        with open(prompts_file, 'r', encoding='utf-8') as f:
+            self.prompts = yaml.safe_load(f)
+
+        for section, values in (overrides or {}).items():
+            if isinstance(values, dict):
+                self.config.setdefault(section, {}).update(values)
+            else:
+                self.config[section] = values
+
+        self.logger = logging.getLogger('offline')
+        self.logger.setLevel(getattr(logging, log_level))
+        self.logger.propagate = False
+        if not self.logger.handlers:
+            handler = logging.FileHandler(log_file, encoding='utf-8') if log_file else logging.StreamHandler()
+            handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+            self.logger.addHandler(handler)
+
+        self.odoo_models = odoo_models or FakeOdoo()
+        self.odoo_uid = 1
+
+    def get_config(self) -> dict:
+        return self.config
+
+    def get_logger(self) -> logging.Logger:
+        return self.logger
+
+    def get_prompts(self) -> dict:
+        return self.prompts
+
+    def get_odoo_connections(self) -> tuple:
+        return self.odoo_models, self.odoo_uid
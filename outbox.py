@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Persistente Outbox für verzögerte Seiteneffekte
+Timeline-Notizen und Bestätigungs-E-Mails werden nach dem Upsert nur vorgemerkt
+und später gebündelt abgearbeitet (mit Idempotenz-Schlüsseln gegen Doppel-Posts)
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+
+class Outbox:
+    def __init__(self, config: dict, logger: logging.Logger, db_path: Optional[str] = None):
+        """Initialisiert die Outbox (SQLite, teilt sich die lokale Datenbank)"""
+        self.config = config
+        self.logger = logger
+        self.db_path = db_path or config.get('local_db', {}).get('path', 'data/processing.db')
+
+        outbox_config = config.get('outbox', {})
+        self.max_attempts = outbox_config.get('max_attempts', 5)
+        self.keep_done_days = outbox_config.get('keep_done_days', 30)
+        # Wartezeit nach dem ersten Fehlversuch, verdoppelt sich pro weiterem Versuch
+        self.retry_delay = outbox_config.get('retry_delay', 60)
+
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS outbox (
+                idempotency_key TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                forwarder TEXT,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                next_attempt_at TEXT
+            )
+        ''')
+        # Ältere Datenbanken ohne Backoff-Spalte nachrüsten
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(outbox)')}
+        if 'next_attempt_at' not in columns:
+            self._conn.execute('ALTER TABLE outbox ADD COLUMN next_attempt_at TEXT')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox (status, created_at)')
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        """Erzeugt einen stabilen Idempotenz-Schlüssel aus beliebigen Teilen"""
+        combined = '|'.join(str(part) for part in parts)
+        return hashlib.md5(combined.encode('utf-8')).hexdigest()
+
+    def enqueue(self, kind: str, payload: Dict, key: str, forwarder: Optional[str] = None) -> bool:
+        """Merkt einen Seiteneffekt vor - bereits bekannte Schlüssel werden ignoriert"""
+        now = datetime.now().isoformat(timespec='seconds')
+        with self._lock:
+            cursor = self._conn.execute(
+                'INSERT OR IGNORE INTO outbox (idempotency_key, kind, forwarder, payload, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (key, kind, forwarder, json.dumps(payload, ensure_ascii=False), now, now)
+            )
+        if cursor.rowcount:
+            self.logger.debug(f"📮 Outbox: {kind} vorgemerkt ({key[:8]})")
+            return True
+
+        self.logger.info(f"⏭️ Outbox: {kind} bereits vorgemerkt/erledigt ({key[:8]})")
+        return False
+
+    def pending(self, limit: int = 100) -> List[Dict]:
+        """Liefert fällige offene Einträge in Einfüge-Reihenfolge (fehlgeschlagene erst nach ihrer Wartezeit -
+        sie blockieren weder neuere Einträge noch werden sie im selben Flush erneut versucht)"""
+        now = datetime.now().isoformat(timespec='seconds')
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT idempotency_key, kind, forwarder, payload, attempts FROM outbox '
+                'WHERE status = ? AND (next_attempt_at IS NULL OR next_attempt_at <= ?) '
+                'ORDER BY created_at LIMIT ?',
+                ('pending', now, limit)
+            ).fetchall()
+
+        return [{'key': row[0], 'kind': row[1], 'forwarder': row[2],
+                 'payload': json.loads(row[3]), 'attempts': row[4]} for row in rows]
+
+    def pending_count(self) -> int:
+        """Anzahl offener Einträge"""
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM outbox WHERE status = ?', ('pending',)).fetchone()[0]
+
+    def mark_done(self, keys: List[str]):
+        """Markiert Einträge als erledigt (bleiben für Idempotenz erhalten)"""
+        if not keys:
+            return
+        now = datetime.now().isoformat(timespec='seconds')
+        with self._lock:
+            self._conn.executemany(
+                'UPDATE outbox SET status = ?, updated_at = ?, last_error = NULL WHERE idempotency_key = ?',
+                [('done', now, key) for key in keys]
+            )
+
+    def mark_failed(self, key: str, error: str):
+        """Zählt Fehlversuch hoch und verschiebt den nächsten Versuch (retry_delay, verdoppelt pro Versuch) -
+        nach max_attempts wird der Eintrag aufgegeben"""
+        now = datetime.now()
+        with self._lock:
+            row = self._conn.execute('SELECT attempts FROM outbox WHERE idempotency_key = ?', (key,)).fetchone()
+            if not row:
+                return
+            attempts = row[0] + 1
+            next_attempt = now + timedelta(seconds=max(1, self.retry_delay * 2 ** (attempts - 1)))
+            self._conn.execute(
+                'UPDATE outbox SET attempts = ?, last_error = ?, updated_at = ?, next_attempt_at = ?, '
+                'status = CASE WHEN ? >= ? THEN ? ELSE status END '
+                'WHERE idempotency_key = ?',
+                (attempts, str(error)[:500], now.isoformat(timespec='seconds'),
+                 next_attempt.isoformat(timespec='seconds'), attempts, self.max_attempts, 'failed', key)
+            )
+
+    def prune(self):
+        """Entfernt alte erledigte Einträge"""
+        cutoff = (datetime.now() - timedelta(days=self.keep_done_days)).isoformat(timespec='seconds')
+        with self._lock:
+            cursor = self._conn.execute(
+                'DELETE FROM outbox WHERE status = ? AND updated_at < ?', ('done', cutoff))
+        if cursor.rowcount:
+            self.logger.info(f"🧹 Outbox: {cursor.rowcount} alte Einträge entfernt")
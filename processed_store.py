@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Persistenter Verarbeitungsstatus für E-Mails
+SQLite (WAL) statt Textdatei: crash-sicher, geordnet, O(1)-Lookups über einen
+In-Memory-Index und LRU-Verdrängung nach Anzahl oder Alter
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from fingerprint import bands, hamming_distance
+
+
+class ProcessedStore:
+    # Pipeline-Stufen in Reihenfolge
+    STATES = ('fetched', 'extracted', 'upserted', 'notified')
+    # Ab diesen Stufen gilt eine E-Mail als verarbeitet (Duplikat-Schutz)
+    DONE_STATES = ('upserted', 'notified')
+
+    def __init__(self, config: dict, logger: logging.Logger, db_path: Optional[str] = None):
+        """Initialisiert den Store und lädt den Status-Index"""
+        self.config = config
+        self.logger = logger
+
+        db_config = config.get('local_db', {})
+        self.db_path = db_path or db_config.get('path', 'data/processing.db')
+        self.max_entries = db_config.get('max_entries', 10000)
+        self.max_age_days = db_config.get('max_age_days', 180)
+        self.evict_every = db_config.get('evict_every', 100)
+
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS processed_messages (
+                email_id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                primary_email TEXT,
+                contact_data TEXT,
+                first_seen REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_processed_updated ON processed_messages (updated_at)')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value TEXT)')
+        # Inhalts-Fingerprints (SimHash + LSH-Bänder) für Near-Duplicate-Erkennung
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS content_fingerprints (
+                email_id TEXT PRIMARY KEY,
+                primary_email TEXT NOT NULL,
+                simhash TEXT NOT NULL,
+                band0 INTEGER, band1 INTEGER, band2 INTEGER, band3 INTEGER
+            )
+        ''')
+        for band in range(4):
+            self._conn.execute(
+                f'CREATE INDEX IF NOT EXISTS idx_fp_band{band} ON content_fingerprints (band{band}, primary_email)')
+
+        self.migrate_legacy_file('data/processed_emails.txt')
+        self.evict()
+
+        # In-Memory-Index email_id → state für O(1)-Lookups
+        self._states: Dict[str, str] = dict(
+            self._conn.execute('SELECT email_id, state FROM processed_messages').fetchall())
+        self.logger.info(f"🗃️ Verarbeitungsstatus geladen: {len(self._states)} E-Mail-IDs")
+
+    def migrate_legacy_file(self, legacy_file: str):
+        """Übernimmt einmalig die IDs aus der alten processed_emails.txt"""
+        with self._lock:
+            migrated = self._conn.execute(
+                'SELECT value FROM store_meta WHERE key = ?', ('legacy_migrated',)).fetchone()
+            if migrated or not os.path.exists(legacy_file):
+                return
+
+            try:
+                with open(legacy_file, 'r', encoding='utf-8') as f:
+                    legacy_ids = [line.strip() for line in f if line.strip()]
+
+                now = time.time()
+                self._conn.execute('BEGIN')
+                # Reihenfolge der Datei als Alter übernehmen (ältere zuerst)
+                self._conn.executemany(
+                    'INSERT OR IGNORE INTO processed_messages (email_id, state, first_seen, updated_at) '
+                    'VALUES (?, ?, ?, ?)',
+                    [(email_id, 'notified', now - len(legacy_ids) + i, now - len(legacy_ids) + i)
+                     for i, email_id in enumerate(legacy_ids)]
+                )
+                self._conn.execute('INSERT OR REPLACE INTO store_meta (key, value) VALUES (?, ?)',
+                                   ('legacy_migrated', str(now)))
+                self._conn.execute('COMMIT')
+                self.logger.info(f"🗃️ {len(legacy_ids)} E-Mail-IDs aus {legacy_file} übernommen")
+            except Exception as e:
+                # Fehler beim Lesen der Datei liegen vor BEGIN - dann gibt es nichts zurückzurollen
+                if self._conn.in_transaction:
+                    self._conn.execute('ROLLBACK')
+                self.logger.warning(f"⚠️ Migration von {legacy_file} fehlgeschlagen: {e}")
+
+    def __contains__(self, email_id: str) -> bool:
+        """True, wenn die E-Mail bereits vollständig verarbeitet wurde"""
+        return self._states.get(email_id) in self.DONE_STATES
+
+    def get_state(self, email_id: str) -> Optional[str]:
+        """Aktuelle Pipeline-Stufe einer E-Mail (None = unbekannt)"""
+        return self._states.get(email_id)
+
+    def get_contact_data(self, email_id: str) -> Optional[Dict]:
+        """Liefert gespeicherte Extraktionsergebnisse (für Wiederaufnahme ohne neuen KI-Aufruf)"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT primary_email, contact_data FROM processed_messages WHERE email_id = ?',
+                (email_id,)).fetchone()
+        if not row or not row[1]:
+            return None
+        return {'primary_email': row[0], 'contact_data': json.loads(row[1])}
+
+    def mark(self, email_id: str, state: str, primary_email: Optional[str] = None,
+             contact_data: Optional[Dict] = None):
+        """Setzt die Pipeline-Stufe einer E-Mail (Upsert, bestehende Daten bleiben erhalten)"""
+        if state not in self.STATES:
+            raise ValueError(f"Unbekannter Status: {state}")
+
+        now = time.time()
+        contact_json = json.dumps(contact_data, ensure_ascii=False) if contact_data is not None else None
+        with self._lock:
+            self._conn.execute('''
+                INSERT INTO processed_messages (email_id, state, primary_email, contact_data, first_seen, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(email_id) DO UPDATE SET
+                    state = excluded.state,
+                    primary_email = COALESCE(excluded.primary_email, primary_email),
+                    contact_data = COALESCE(excluded.contact_data, contact_data),
+                    updated_at = excluded.updated_at
+            ''', (email_id, state, primary_email, contact_json, now, now))
+            self._states[email_id] = state
+            self._writes_since_evict += 1
+            evict_due = self._writes_since_evict >= self.evict_every
+
+        if evict_due:
+            self.evict()
+
+    def add_fingerprint(self, email_id: str, primary_email: str, fingerprint: int):
+        """Speichert den Inhalts-Fingerprint einer verarbeiteten E-Mail"""
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO content_fingerprints '
+                '(email_id, primary_email, simhash, band0, band1, band2, band3) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (email_id, primary_email.lower(), format(fingerprint, '016x'), *bands(fingerprint))
+            )
+
+    def find_near_duplicate(self, primary_email: str, fingerprint: int, max_distance: int = 3) -> Optional[str]:
+        """Sucht eine verarbeitete E-Mail mit gleichem Absender und ähnlichem Inhalt (LSH-Kandidaten)"""
+        band_values = bands(fingerprint)
+        where = ' OR '.join(f'band{i} = ?' for i in range(len(band_values)))
+        with self._lock:
+            candidates = self._conn.execute(
+                f'SELECT email_id, simhash FROM content_fingerprints WHERE primary_email = ? AND ({where})',
+                (primary_email.lower(), *band_values)
+            ).fetchall()
+
+        best = None
+        for email_id, stored_hash in candidates:
+            distance = hamming_distance(fingerprint, int(stored_hash, 16))
+            if distance <= max_distance and (best is None or distance < best[0]):
+                best = (distance, email_id)
+
+        return best[1] if best else None
+
+    def touch(self, email_id: str):
+        """Markiert einen Eintrag als kürzlich benutzt (LRU)"""
+        with self._lock:
+            self._conn.execute('UPDATE processed_messages SET updated_at = ? WHERE email_id = ?',
+                               (time.time(), email_id))
+
+    def evict(self):
+        """Verdrängt alte Einträge nach Alter und Anzahl (zuletzt benutzte bleiben)"""
+        with self._lock:
+            self._writes_since_evict = 0
+            removed = 0
+
+            if self.max_age_days:
+                cutoff = time.time() - self.max_age_days * 86400
+                removed += self._conn.execute(
+                    'DELETE FROM processed_messages WHERE updated_at < ?', (cutoff,)).rowcount
+
+            if self.max_entries:
+                removed += self._conn.execute('''
+                    DELETE FROM processed_messages WHERE email_id IN (
+                        SELECT email_id FROM processed_messages
+                        ORDER BY updated_at DESC LIMIT -1 OFFSET ?
+                    )
+                ''', (self.max_entries,)).rowcount
+
+            if removed:
+                self._conn.execute('DELETE FROM content_fingerprints WHERE email_id NOT IN '
+                                   '(SELECT email_id FROM processed_messages)')
+
+            if removed and hasattr(self, '_states'):
+                self._states = dict(
+                    self._conn.execute('SELECT email_id, state FROM processed_messages').fetchall())
+
+        if removed:
+            self.logger.info(f"🧹 {removed} alte Verarbeitungs-Einträge entfernt")
+
+    def __len__(self) -> int:
+        return len(self._states)
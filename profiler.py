@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Profiling für KI-Kontaktassistent
+Profiliert Verarbeitungszyklen (cProfile + Stack-Sampler) und schreibt pro Zyklus
+einen pstats-Dump, Flame-Graph-kompatible Collapsed-Stacks und eine Top-N-Übersicht
+"""
+
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional
+
+
+class StackSampler:
+    """Tastet den Stack eines Threads periodisch ab (Format: 'a;b;c anzahl' für flamegraph.pl/speedscope)"""
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _frame_name(frame) -> str:
+        code = frame.f_code
+        return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                names.append(self._frame_name(frame))
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(names))] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def collapsed(self) -> str:
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class CycleProfiler:
+    """Profiliert jeden N-ten Verarbeitungszyklus und schreibt die Reports nach output_dir"""
+
+    def __init__(self, logger: logging.Logger, output_dir: str = 'logs/profiles', every: int = 1,
+                 top_n: int = 30, sample_interval: float = 0.005):
+        self.logger = logger
+        self.output_dir = output_dir
+        self.every = max(1, every)
+        self.top_n = top_n
+        self.sample_interval = sample_interval
+        self.cycles = 0
+        os.makedirs(output_dir, exist_ok=True)
+
+    @contextmanager
+    def cycle(self, label: str = 'cycle'):
+        """Profiliert den Block, falls dieser Zyklus im Sample liegt"""
+        self.cycles += 1
+        if (self.cycles - 1) % self.every:
+            yield None
+            return
+
+        profile = cProfile.Profile()
+        sampler = StackSampler(threading.get_ident(), self.sample_interval)
+        sampler.start()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            yield profile
+        finally:
+            profile.disable()
+            duration = time.perf_counter() - start
+            sampler.stop()
+            self.write_reports(label, profile, sampler, duration)
+
+    def write_reports(self, label: str, profile: cProfile.Profile, sampler: StackSampler,
+                      duration: float) -> Optional[str]:
+        """Schreibt .prof, .collapsed und .txt (Top-N nach kumulierter und eigener Zeit)"""
+        base = os.path.join(self.output_dir, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{label}-{self.cycles:04d}")
+        try:
+            profile.dump_stats(base + '.prof')
+
+            with open(base + '.collapsed', 'w', encoding='utf-8') as f:
+                f.write(sampler.collapsed())
+
+            summary = io.StringIO()
+            summary.write(f"Zyklus {self.cycles} ({label}): {duration:.3f} s, "
+                          f"{sum(sampler.stacks.values())} Stack-Samples\n\n")
+            stats = pstats.Stats(profile, stream=summary).strip_dirs()
+            stats.sort_stats('cumulative').print_stats(self.top_n)
+            stats.sort_stats('tottime').print_stats(self.top_n)
+            with open(base + '.txt', 'w', encoding='utf-8') as f:
+                f.write(summary.getvalue())
+        except OSError as e:
+            self.logger.warning(f"⚠️ Profil konnte nicht geschrieben werden: {e}")
+            return None
+
+        self.logger.info(f"🔬 Profil geschrieben: {base}.[prof|collapsed|txt] ({duration:.2f}s)")
+        return base
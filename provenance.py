@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Import-Herkunft der Kontakte (lokal statt im Odoo-Kommentar)
+Pro Upsert ein kompakter Datensatz: Partner, Quelle, Weiterleiter, Aktion, Confidence und
+geänderte Felder. Das Kommentarfeld in Odoo bleibt dadurch stabil (kein Zeitstempel pro Import).
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+
+class ProvenanceLog:
+    def __init__(self, config: dict, logger: logging.Logger, db_path: Optional[str] = None):
+        """Initialisiert das Herkunfts-Log (SQLite, teilt sich die lokale Datenbank)"""
+        self.config = config
+        self.logger = logger
+        self.db_path = db_path or config.get('local_db', {}).get('path', 'data/processing.db')
+        self.keep_days = config.get('local_db', {}).get('max_age_days', 180)
+
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS contact_provenance (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                partner_id INTEGER,
+                email TEXT NOT NULL,
+                source_id TEXT,
+                forwarder TEXT,
+                action TEXT NOT NULL,
+                confidence TEXT,
+                fields TEXT,
+                created_at TEXT NOT NULL
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_provenance_partner ON contact_provenance (partner_id)')
+        self.prune()
+
+    def record(self, partner_id: Optional[int], email: str, action: str, source_id: Optional[str] = None,
+               forwarder: Optional[str] = None, confidence: Optional[str] = None, fields: Optional[List[str]] = None):
+        """Hält einen Import/Abgleich fest (fields: tatsächlich geschriebene Odoo-Felder)"""
+        try:
+            with self._lock:
+                self._conn.execute(
+                    'INSERT INTO contact_provenance (partner_id, email, source_id, forwarder, action, confidence, '
+                    'fields, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (partner_id, email, source_id, forwarder, action, confidence,
+                     json.dumps(sorted(fields or [])), datetime.now().isoformat(timespec='seconds'))
+                )
+        except sqlite3.Error as e:
+            # Herkunft ist Zusatzinformation - Verarbeitung nicht abbrechen
+            self.logger.warning(f"⚠️ Import-Herkunft nicht gespeichert: {e}")
+
+    def history(self, partner_id: int) -> List[Dict]:
+        """Alle Importe eines Partners, älteste zuerst"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT email, source_id, forwarder, action, confidence, fields, created_at '
+                'FROM contact_provenance WHERE partner_id = ? ORDER BY id', (partner_id,)
+            ).fetchall()
+        return [{'email': row[0], 'source_id': row[1], 'forwarder': row[2], 'action': row[3],
+                 'confidence': row[4], 'fields': json.loads(row[5] or '[]'), 'created_at': row[6]} for row in rows]
+
+    def prune(self):
+        """Entfernt Einträge älter als local_db.max_age_days"""
+        cutoff = (datetime.now() - timedelta(days=self.keep_days)).isoformat(timespec='seconds')
+        with self._lock:
+            cursor = self._conn.execute('DELETE FROM contact_provenance WHERE created_at < ?', (cutoff,))
+        if cursor.rowcount:
+            self.logger.info(f"🧹 Import-Herkunft: {cursor.rowcount} alte Einträge entfernt")
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Langlebiger SMTP-Versand für KI-Kontaktassistent
+Hält eine angemeldete SMTP-Sitzung offen (Lazy-Connect, NOOP-Keep-Alive, Idle-Timeout)
+und versendet mehrere Nachrichten pro Sitzung gebündelt (send_batch)
+"""
+
+import logging
+import smtplib
+import threading
+import time
+from typing import Any, List, Optional, Tuple
+
+from metrics import metrics
+
+
+class SMTPSender:
+    def __init__(self, config: dict, logger: logging.Logger):
+        """Initialisiert den SMTP-Sender (verbindet erst beim ersten Versand)"""
+        self.config = config
+        self.logger = logger
+
+        smtp_config = config['email']
+        self.timeout = smtp_config.get('smtp_timeout', 10)
+        self.idle_timeout = smtp_config.get('smtp_idle_timeout', 60)
+        self.keepalive_interval = smtp_config.get('smtp_keepalive_interval', 30)
+
+        self._server = None
+        self._last_used = 0.0
+        self._lock = threading.RLock()
+
+    def _connect(self):
+        """Baut eine neue, angemeldete SMTP-Verbindung auf"""
+        smtp_config = self.config['email']
+
+        if smtp_config.get('smtp_use_ssl', False):
+            server = smtplib.SMTP_SSL(smtp_config['smtp_server'], smtp_config['smtp_port'], timeout=self.timeout)
+        else:
+            server = smtplib.SMTP(smtp_config['smtp_server'], smtp_config['smtp_port'], timeout=self.timeout)
+
+            if smtp_config.get('smtp_use_tls', False):
+                server.starttls()
+
+        try:
+            server.login(smtp_config['smtp_username'], smtp_config['smtp_password'])
+        except Exception as e:
+            self.logger.error(f"❌ SMTP-Login Fehler: {e}")
+            self._quit(server)
+            raise
+
+        self.logger.debug(f"📡 SMTP-Verbindung aufgebaut: {smtp_config['smtp_server']}")
+        return server
+
+    @staticmethod
+    def _quit(server):
+        """Schliesst eine Verbindung ohne Fehler weiterzureichen"""
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def _ensure_connection(self):
+        """Liefert eine nutzbare Verbindung (Idle-Timeout und NOOP-Keep-Alive beachten)"""
+        if self._server is not None:
+            idle = time.monotonic() - self._last_used
+
+            if idle > self.idle_timeout:
+                self.logger.debug(f"📡 SMTP-Verbindung {idle:.0f}s unbenutzt - baue neu auf")
+                self.close()
+            elif idle > self.keepalive_interval:
+                try:
+                    code, _ = self._server.noop()
+                    if code != 250:
+                        raise smtplib.SMTPServerDisconnected(f"NOOP-Antwort {code}")
+                except (smtplib.SMTPException, OSError) as e:
+                    self.logger.debug(f"📡 SMTP-Keep-Alive fehlgeschlagen ({e}) - baue neu auf")
+                    self.close()
+
+        if self._server is None:
+            self._server = self._connect()
+
+        self._last_used = time.monotonic()
+        return self._server
+
+    def send(self, msg):
+        """Sendet eine Nachricht über die bestehende Sitzung. Neu versucht wird nur, wenn sicher nichts
+        angenommen wurde: Fehler beim Verbindungsaufbau, getrennte Sitzung oder 421 vor dem Versand -
+        nicht bei Socket-Fehlern/Timeouts während des Versands (Nachricht evtl. schon zugestellt)."""
+        with self._lock, metrics.timer(stage='smtp_send'):
+            try:
+                server = self._ensure_connection()
+            except smtplib.SMTPResponseException:
+                raise  # Server hat geantwortet (z.B. Login abgelehnt) - kein Verbindungsproblem
+            except OSError as e:
+                self.logger.debug(f"📡 SMTP-Verbindungsaufbau fehlgeschlagen ({e}) - neuer Versuch")
+                self.close()
+                server = self._ensure_connection()
+
+            try:
+                server.send_message(msg)
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPSenderRefused) as e:
+                if isinstance(e, smtplib.SMTPSenderRefused) and e.smtp_code != 421:
+                    raise
+                # Server hat die Sitzung geschlossen - einmal neu verbinden
+                self.logger.debug(f"📡 SMTP-Sitzung verloren ({e}) - neuer Versuch")
+                self.close()
+                self._ensure_connection().send_message(msg)
+            except OSError:
+                # Zustand der Sitzung unklar - nicht wiederverwenden, aber auch nicht erneut senden
+                self.close()
+                raise
+            self._last_used = time.monotonic()
+
+    def send_batch(self, batch: List[Tuple[Any, Any]]) -> List[Tuple[Any, Optional[Exception]]]:
+        """Versendet (Nachricht, Tag)-Paare in einer Sitzung und liefert (Tag, Fehler) nur für diesen Aufruf
+        (Mandanten mit gemeinsamer Sitzung bekommen so nie fremde Ergebnisse)"""
+        with self._lock:
+            results = []
+            for msg, tag in batch:
+                try:
+                    self.send(msg)
+                    results.append((tag, None))
+                except Exception as e:
+                    self.logger.error(f"❌ SMTP-Send Fehler ({msg.get('To')}): {e}")
+                    results.append((tag, e))
+
+            if batch:
+                self.logger.debug(f"📡 {len(batch)} Nachricht(en) in einer SMTP-Sitzung versendet")
+            return results
+
+    def close_if_idle(self):
+        """Schliesst die Verbindung, wenn sie länger als idle_timeout unbenutzt ist"""
+        with self._lock:
+            if self._server is not None and time.monotonic() - self._last_used > self.idle_timeout:
+                self.close()
+
+    def close(self):
+        """Schliesst die aktuelle Verbindung"""
+        with self._lock:
+            if self._server is not None:
+                self._quit(self._server)
+                self._server = None
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Strukturierte Kontaktdaten aus E-Mails: vCard-Anhänge (.vcf, vCard 2.1/3/4) sowie hCard-
+und schema.org-Microdata in HTML-Signaturen.
+Reine Funktionen (ohne Logger/Konfiguration), damit sie auch in Worker-Prozessen laufen können.
+Ergebnis pro Karte ist ein dict im Format der KI-Extraktion (Eingabe für build_contact_values).
+"""
+
+import quopri
+import re
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+
+VCARD_TYPES = ('text/vcard', 'text/x-vcard', 'text/directory')
+
+_VCARD_BLOCK = re.compile(r'BEGIN:VCARD\r?\n(.*?)\r?\nEND:VCARD', re.IGNORECASE | re.DOTALL)
+# Zeilenfaltung (RFC 6350 3.2): Zeilenumbruch + Leerzeichen/Tab
+_FOLDED = re.compile(r'\r?\n[ \t]')
+# Quoted-Printable-Softbreaks (vCard 2.1)
+_QP_SOFTBREAK = re.compile(r'=\r?\n')
+_VCARD_ESCAPE = re.compile(r'\\([\\,;nN])')
+
+# vCard-LANG / HTML-lang → Sprachbezeichnung der KI-Extraktion (siehe convert_language_to_odoo)
+LANGUAGES = {'de': 'deutsch', 'en': 'english', 'fr': 'french', 'it': 'italian', 'es': 'spanish', 'ru': 'russian'}
+
+# hCard (Microformats 1 und 2) und schema.org-Eigenschaften → Feld der Karte
+HTML_PROPERTIES = {
+    'fn': 'full_name', 'p-name': 'full_name', 'name': 'full_name',
+    'given-name': 'first_name', 'p-given-name': 'first_name', 'givenname': 'first_name',
+    'family-name': 'last_name', 'p-family-name': 'last_name', 'familyname': 'last_name',
+    'org': 'company', 'p-org': 'company', 'worksfor': 'company', 'affiliation': 'company',
+    'title': 'position', 'p-job-title': 'position', 'role': 'position', 'jobtitle': 'position',
+    'email': 'email', 'u-email': 'email',
+    'tel': 'phone', 'p-tel': 'phone', 'telephone': 'phone', 'faxnumber': None,
+    'url': 'website', 'u-url': 'website',
+    'street-address': 'street', 'p-street-address': 'street', 'streetaddress': 'street',
+    'extended-address': 'street2', 'p-extended-address': 'street2',
+    'locality': 'city', 'p-locality': 'city', 'addresslocality': 'city',
+    'region': 'state', 'p-region': 'state', 'addressregion': 'state',
+    'postal-code': 'zip', 'p-postal-code': 'zip', 'postalcode': 'zip',
+    'country-name': 'country', 'p-country-name': 'country', 'addresscountry': 'country',
+}
+_CARD_CLASSES = ('vcard', 'h-card')
+_SCHEMA_TYPES = ('schema.org/person', 'schema.org/organization', 'schema.org/localbusiness',
+                 'schema.org/corporation')
+_VOID_TAGS = ('area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'wbr')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def empty_card(source: str) -> Dict:
+    return {'source': source, 'full_name': '', 'first_name': '', 'last_name': '', 'company': '',
+            'position': '', 'emails': [], 'phones': [], 'website': '', 'language': '', 'note': '',
+            'is_company': False,
+            'address': {'street': '', 'street2': '', 'city': '', 'zip': '', 'state': '', 'country': ''}}
+
+
+def _unescape(value: str) -> str:
+    return _VCARD_ESCAPE.sub(lambda m: '\n' if m.group(1) in 'nN' else m.group(1), value)
+
+
+def _split_components(value: str, separator: str = ';') -> List[str]:
+    """Zerlegt strukturierte Werte (N, ADR, ORG) an unmaskierten Trennzeichen"""
+    parts, current, escaped = [], [], False
+    for char in value:
+        if escaped:
+            current.append('\\' + char)
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char == separator:
+            parts.append(_unescape(''.join(current)).strip())
+            current = []
+        else:
+            current.append(char)
+    parts.append(_unescape(''.join(current)).strip())
+    return parts
+
+
+def _parse_vcard_line(line: str):
+    """'item1.TEL;TYPE=work:+41 ...' → ('TEL', {'TYPE': 'WORK'}, '+41 ...')"""
+    head, separator, value = line.partition(':')
+    if not separator:
+        return None, {}, ''
+    name, *raw_params = head.split(';')
+    name = name.rpartition('.')[2].upper()
+    params = {}
+    for param in raw_params:
+        key, has_value, param_value = param.partition('=')
+        # vCard 2.1: "TEL;WORK;VOICE:" ohne TYPE=
+        key, param_value = (key.upper(), param_value) if has_value else ('TYPE', key)
+        params[key] = f"{params[key]},{param_value}" if key in params else param_value
+    if 'QUOTED-PRINTABLE' in f"{params.get('ENCODING', '')},{params.get('TYPE', '')}".upper():
+        charset = params.get('CHARSET', 'utf-8')
+        value = quopri.decodestring(value.encode('latin-1', errors='ignore')).decode(charset, errors='ignore')
+    return name, params, value
+
+
+def parse_vcard(text: str) -> List[Dict]:
+    """Alle Karten einer .vcf-Datei (vCard 2.1, 3.0 und 4.0)"""
+    cards = []
+    for block in _VCARD_BLOCK.findall(text or ''):
+        card = empty_card('vcard')
+        kind = ''
+        if 'QUOTED-PRINTABLE' in block.upper():
+            block = _QP_SOFTBREAK.sub('', block)
+        for line in _FOLDED.sub('', block).splitlines():
+            name, params, value = _parse_vcard_line(line)
+            if not name or not value.strip():
+                continue
+            if name == 'FN':
+                card['full_name'] = _unescape(value).strip()
+            elif name == 'N':
+                components = _split_components(value) + [''] * 2
+                card['last_name'], card['first_name'] = components[0], components[1]
+            elif name == 'ORG':
+                card['company'] = _split_components(value)[0]
+            elif name in ('TITLE', 'ROLE') and not card['position']:
+                card['position'] = _unescape(value).strip()
+            elif name == 'EMAIL':
+                address = value.strip().replace('mailto:', '')
+                if address not in card['emails']:
+                    card['emails'].append(address)
+            elif name == 'TEL' and 'FAX' not in params.get('TYPE', '').upper():
+                card['phones'].append(value.strip().replace('tel:', ''))
+            elif name == 'ADR' and not card['address']['city']:
+                components = _split_components(value) + [''] * 7
+                street_lines = [part for part in components[2].split('\n') if part.strip()]
+                card['address'] = {
+                    'street': street_lines[0] if street_lines else '',
+                    'street2': ', '.join(street_lines[1:] + [part for part in components[:2] if part]),
+                    'city': components[3], 'state': components[4], 'zip': components[5], 'country': components[6],
+                }
+            elif name == 'URL' and not card['website']:
+                card['website'] = value.strip()
+            elif name == 'LANG' and not card['language']:
+                card['language'] = LANGUAGES.get(value.strip().lower()[:2], '')
+            elif name == 'NOTE':
+                card['note'] = _unescape(value).strip()
+            elif name in ('KIND', 'X-ABSHOWAS'):
+                kind = value.strip().lower()
+        card['is_company'] = kind in ('org', 'company') or (not card['full_name'] and bool(card['company']))
+        cards.append(finish_card(card))
+    return cards
+
+
+class _CardHTMLParser(HTMLParser):
+    """Sammelt hCard- und schema.org-Karten (Eigenschaften = Text bzw. href/content/value der Elemente)"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.cards: List[Dict] = []
+        # Offene Elemente: (Tag, Karte, Firmen-Bereich, Feld, Textpuffer)
+        self.stack = []
+        self.language = ''
+
+    def _card_at(self, index: int) -> Tuple[Optional[Dict], bool]:
+        """Karte und Firmen-Bereich des Elements an Stack-Position index (inkl. umschliessender Elemente)"""
+        in_org = False
+        for _, card, org, _, _ in reversed(self.stack[:index + 1]):
+            in_org = in_org or org
+            if card is not None:
+                return card, in_org
+        return None, in_org
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {key: value or '' for key, value in attrs}
+        if tag == 'html' and attrs.get('lang'):
+            self.language = LANGUAGES.get(attrs['lang'].lower()[:2], '')
+
+        classes = attrs.get('class', '').lower().split()
+        item_type = attrs.get('itemtype', '').lower()
+        parent, in_org = self._card_at(len(self.stack) - 1)
+        card, org = None, False
+        if any(name in classes for name in _CARD_CLASSES) or any(name in item_type for name in _SCHEMA_TYPES):
+            if parent is not None:
+                # Verschachtelte Karte (h-card p-org / worksFor Organization) ergänzt die äussere Karte
+                org = 'p-org' in classes or 'org' in classes or 'organization' in item_type
+            else:
+                card = empty_card('hcard')
+                card['is_company'] = 'organization' in item_type or 'localbusiness' in item_type
+                self.cards.append(card)
+
+        field = None
+        for name in classes + attrs.get('itemprop', '').lower().split():
+            if name in HTML_PROPERTIES:
+                field = HTML_PROPERTIES[name]
+                break
+        target = card or parent
+        if field == 'full_name' and ('org' in classes or in_org or org):
+            # hCard "fn org" bzw. Name der verschachtelten Firma
+            field = 'company'
+            if target is not None and 'org' in classes and not (in_org or org):
+                target['is_company'] = True
+
+        value = attrs.get('content') or attrs.get('value')
+        href = attrs.get('href', '')
+        if not value and field in ('email', 'phone') and href.startswith(('mailto:', 'tel:')):
+            value = href.split(':', 1)[1].split('?')[0]
+        elif not value and field == 'website' and href.startswith('http'):
+            value = href
+        if field and value and target is not None:
+            _set_field(target, field, value)
+            field = None
+
+        if tag not in _VOID_TAGS:
+            self.stack.append((tag, card, org, field, []))
+
+    def handle_startendtag(self, tag, attrs):
+        depth = len(self.stack)
+        self.handle_starttag(tag, attrs)
+        del self.stack[depth:]
+
+    def handle_data(self, data):
+        for _, _, _, field, buffer in self.stack:
+            if field:
+                buffer.append(data)
+
+    def handle_endtag(self, tag):
+        # Bis zum passenden Element schliessen (toleriert fehlende End-Tags)
+        for index in range(len(self.stack) - 1, -1, -1):
+            if self.stack[index][0] != tag:
+                continue
+            for position in range(len(self.stack) - 1, index - 1, -1):
+                field, buffer = self.stack[position][3], self.stack[position][4]
+                target, _ = self._card_at(position)
+                text = _WHITESPACE.sub(' ', ''.join(buffer)).strip()
+                if field and target is not None and text:
+                    _set_field(target, field, text)
+            del self.stack[index:]
+            return
+
+
+def _set_field(card: Dict, field: str, value: str):
+    value = value.strip()
+    if not value:
+        return
+    if field == 'email':
+        value = value.replace('mailto:', '')
+        if value not in card['emails']:
+            card['emails'].append(value)
+    elif field == 'phone':
+        if value not in card['phones']:
+            card['phones'].append(value.replace('tel:', ''))
+    elif field in card['address']:
+        card['address'][field] = card['address'][field] or value
+    else:
+        card[field] = card[field] or value
+
+
+def parse_html_cards(html_content: str) -> List[Dict]:
+    """hCard-/schema.org-Karten aus einer HTML-Signatur"""
+    if not html_content or ('vcard' not in html_content and 'h-card' not in html_content and
+                            'schema.org' not in html_content):
+        return []
+    parser = _CardHTMLParser()
+    try:
+        parser.feed(html_content)
+        parser.close()
+    except Exception:
+        return []
+    cards = []
+    for card in parser.cards:
+        card['language'] = card['language'] or parser.language
+        if card['is_company'] and not card['company']:
+            card['company'] = card['full_name']
+        cards.append(finish_card(card))
+    return cards
+
+
+def finish_card(card: Dict) -> Dict:
+    """Namen ergänzen (FN ↔ N) und Telefonnummern/Adressen vereinheitlichen"""
+    if not card['full_name']:
+        card['full_name'] = ' '.join(part for part in (card['first_name'], card['last_name']) if part)
+    elif not card['first_name'] and not card['last_name'] and not card['is_company']:
+        first, _, last = card['full_name'].rpartition(' ')
+        card['first_name'], card['last_name'] = (first, last) if first else ('', '')
+    card['phones'] = [_WHITESPACE.sub(' ', phone).strip() for phone in card['phones'] if phone.strip()]
+    card['emails'] = [address.strip() for address in card['emails'] if '@' in address]
+    return card
+
+
+def message_cards(email_message) -> List[Dict]:
+    """Alle strukturierten Karten einer E-Mail (vCard-Anhänge zuerst, dann HTML-Signaturen)"""
+    vcards, html_cards = [], []
+    for part in email_message.walk():
+        if part.is_multipart():
+            continue
+        content_type = part.get_content_type()
+        filename = (part.get_filename() or '').lower()
+        if content_type in VCARD_TYPES or filename.endswith('.vcf'):
+            payload = part.get_payload(decode=True)
+            if payload:
+                charset = part.get_content_charset() or 'utf-8'
+                vcards.extend(parse_vcard(payload.decode(charset, errors='ignore')))
+        elif content_type == 'text/html' and 'attachment' not in str(part.get('Content-Disposition', '')):
+            payload = part.get_payload(decode=True)
+            if payload:
+                html_cards.extend(parse_html_cards(payload.decode(part.get_content_charset() or 'utf-8',
+                                                                  errors='ignore')))
+    return vcards + html_cards
+
+
+def card_for_address(cards: List[Dict], address: str) -> Optional[Dict]:
+    """Karte, die zur Absender-Adresse gehört (nie die Karte des Weiterleiters)"""
+    address = (address or '').lower()
+    for card in cards:
+        if address in (email_address.lower() for email_address in card['emails']):
+            return card
+    return None
+
+
+def is_complete(card: Dict) -> bool:
+    """Genug Angaben für einen Kontakt ohne KI: Name und Telefon oder Ort"""
+    return bool(card['full_name'] or card['company']) and bool(card['phones'] or card['address']['city'])
+
+
+def to_contact_data(card: Dict, biography: str = '') -> Dict:
+    """Karte → Kontakt-dict im Format der KI-Extraktion"""
+    return {
+        'first_name': card['first_name'],
+        'last_name': card['last_name'],
+        'full_name': card['full_name'] or card['company'],
+        'emails': list(card['emails']),
+        'phones': list(card['phones']),
+        'address': dict(card['address']),
+        'website': card['website'],
+        'company': card['company'],
+        'position': card['position'],
+        'is_company': card['is_company'],
+        'language': card['language'] or 'deutsch',
+        'categories': [],
+        'biography': biography,
+        'confidence': card['source'],
+    }
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Mehrmandanten-Betrieb für KI-Kontaktassistent
+Mehrere Postfach/Odoo-Paare (Sektion 'tenants' in config-sys.yml) in einem Prozess:
+geteilte Odoo-Verbindungen, SMTP-Sitzungen, Kategorie-Maps und KI-Cache,
+Round-Robin-Verarbeitung über die Warteschlangen aller Postfächer
+"""
+
+import copy
+import logging
+import os
+import time
+from collections import deque
+from contextlib import ExitStack
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import yaml
+
+from data_extractor import LLMCache
+from main import KIKontaktAssistent
+from profiler import CycleProfiler
+
+
+def merge_config(base: dict, overrides: dict) -> dict:
+    """Tiefe Zusammenführung: Mandanten-Werte überschreiben die Basis-Konfiguration"""
+    merged = copy.deepcopy(base)
+    for key, value in (overrides or {}).items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_config(merged[key], value)
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+
+def build_tenant_configs(config: dict) -> List[dict]:
+    """Erzeugt die vollständige Konfiguration pro Mandant (leer = Einzelbetrieb)"""
+    base = {key: value for key, value in config.items() if key != 'tenants'}
+    tenant_configs = []
+    for index, tenant in enumerate(config.get('tenants') or [], 1):
+        tenant = dict(tenant)
+        name = tenant.pop('name', f"tenant{index}")
+        prompts_file = tenant.pop('prompts_file', None)
+        tenant_config = merge_config(base, tenant)
+        tenant_config['tenant'] = {'name': name, 'prompts_file': prompts_file}
+
+        # Eigene Verarbeitungs-DB pro Mandant (Duplikat-Schutz ist postfachbezogen)
+        if 'path' not in (tenant.get('local_db') or {}):
+            default_path = base.get('local_db', {}).get('path', 'data/processing.db')
+            root, ext = os.path.splitext(default_path)
+            tenant_config.setdefault('local_db', {})['path'] = f"{root}-{name}{ext or '.db'}"
+
+        # Probelauf: eigenes Journal und eigene Probelauf-DB pro Mandant
+        dry_run_config = tenant_config.get('dry_run') or {}
+        if dry_run_config.get('enabled', False) and 'journal' not in (tenant.get('dry_run') or {}):
+            root, ext = os.path.splitext(dry_run_config.get('journal', 'data/dry-run-journal.jsonl'))
+            dry_run_config['journal'] = f"{root}-{name}{ext or '.jsonl'}"
+            root, ext = os.path.splitext(dry_run_config.get('db_path', 'data/dry-run.db'))
+            dry_run_config['db_path'] = f"{root}-{name}{ext or '.db'}"
+
+        tenant_configs.append(tenant_config)
+    return tenant_configs
+
+
+class TenantConfigManager:
+    """ConfigManager-Sicht eines Mandanten - Verbindungen und Prompts kommen aus dem gemeinsamen ConfigManager"""
+
+    _prompt_cache: Dict[str, dict] = {}
+
+    def __init__(self, parent, config: dict):
+        self.parent = parent
+        self.config = config
+        self.name = config['tenant']['name']
+        self.logger = logging.getLogger(f"tenant.{self.name}")
+
+    def get_config(self) -> dict:
+        return self.config
+
+    def get_logger(self) -> logging.Logger:
+        return self.logger
+
+    def get_prompts(self) -> dict:
+        """Eigene prompts.yml pro Mandant möglich, sonst die gemeinsame"""
+        prompts_file = self.config['tenant'].get('prompts_file')
+        if not prompts_file:
+            return self.parent.get_prompts()
+        if prompts_file not in self._prompt_cache:
+            with open(prompts_file, 'r', encoding='utf-8') as f:
+                self._prompt_cache[prompts_file] = yaml.safe_load(f)
+        return self._prompt_cache[prompts_file]
+
+    def get_odoo_connections(self) -> tuple:
+        return self.parent.get_odoo_connection(self.config['odoo'])
+
+
+class TenantScheduler:
+    """Verarbeitet alle Mandanten in einem Prozess mit fairer Round-Robin-Reihenfolge"""
+
+    def __init__(self, config_manager, profiler: Optional[CycleProfiler] = None):
+        self.config_manager = config_manager
+        self.config = config_manager.get_config()
+        self.logger = config_manager.get_logger()
+        self.profiler = profiler
+
+        scheduler_config = self.config.get('scheduler', {})
+        self.max_per_tenant = scheduler_config.get('max_per_tenant_per_cycle', 0)
+
+        # Ein KI-Cache für alle Mandanten (openai-Sektion ist prozessweit)
+        cache_size = self.config['openai'].get('cache_size', 256)
+        self.llm_cache = LLMCache(cache_size) if cache_size else None
+
+        self.assistants: List[KIKontaktAssistent] = []
+        for tenant_config in build_tenant_configs(self.config):
+            tenant_manager = TenantConfigManager(config_manager, tenant_config)
+            self.assistants.append(KIKontaktAssistent(config_manager=tenant_manager, llm_cache=self.llm_cache))
+
+        self.share_backends()
+        self.logger.info(f"🏢 {len(self.assistants)} Mandanten aktiv: {', '.join(a.tenant for a in self.assistants)}")
+
+    @staticmethod
+    def odoo_key(assistant: KIKontaktAssistent) -> tuple:
+        odoo_config = assistant.config['odoo']
+        return odoo_config['url'], odoo_config['database']
+
+    def share_backends(self):
+        """Mandanten mit gleichem SMTP-Konto teilen sich eine Sitzung, gleiche Odoo-DB eine Kategorie-Map"""
+        smtp_senders = {}
+        for assistant in self.assistants:
+            email_config = assistant.config['email']
+            key = (email_config['smtp_server'], email_config['smtp_port'], email_config['smtp_username'])
+            if assistant.journal:
+                continue  # Probelauf: jeder Mandant schreibt in sein eigenes Journal
+            if key in smtp_senders:
+                assistant.odoo_manager.smtp_sender = smtp_senders[key]
+            else:
+                smtp_senders[key] = assistant.odoo_manager.smtp_sender
+        self.sync_categories(refresh=False)
+
+    def sync_categories(self, refresh: bool = True):
+        """Kategorien einmal pro Odoo-Datenbank prüfen und die Map an alle Mandanten dieser DB verteilen"""
+        leaders = {}
+        for assistant in self.assistants:
+            manager = assistant.odoo_manager
+            leader = leaders.get(self.odoo_key(assistant))
+            if leader is None:
+                leaders[self.odoo_key(assistant)] = manager
+                if refresh:
+                    manager.refresh_categories_if_changed()
+                continue
+            manager.odoo_categories = leader.odoo_categories
+            manager.categories_signature = leader.categories_signature
+
+    def process_cycle(self):
+        """Ein Zyklus: alle Postfächer öffnen, dann abwechselnd je eine E-Mail pro Mandant verarbeiten"""
+        with ExitStack() as stack:
+            queues = []
+            for assistant in self.assistants:
+                assistant.drain_upsert_buffer()
+                if assistant.mailbox_paused():
+                    continue
+                try:
+                    mail = stack.enter_context(assistant.open_mailbox())
+                    numbers = assistant.fetch_unseen(mail)
+                except Exception as e:
+                    assistant.logger.error(f"❌ Fehler beim E-Mail-Abruf: {e}")
+                    continue
+                if self.max_per_tenant:
+                    numbers = numbers[:self.max_per_tenant]
+                if numbers:
+                    assistant.logger.info(f"📬 {len(numbers)} neue E-Mail(s) gefunden")
+                    queues.append((assistant, mail, deque(numbers), len(numbers)))
+
+            if not queues:
+                self.logger.info("📭 Keine neuen E-Mails")
+                return
+
+            results = {assistant.tenant: [0, 0] for assistant, _, _, _ in queues}
+            while queues:
+                for entry in list(queues):
+                    assistant, mail, pending, total = entry
+                    num = pending.popleft()
+                    ok = assistant.process_message(mail, num, total - len(pending), total)
+                    results[assistant.tenant][0 if ok else 1] += 1
+                    if not pending:
+                        queues.remove(entry)
+
+            for tenant, (success_count, error_count) in results.items():
+                self.logger.info(f"📊 {tenant}: ✅ {success_count} erfolgreich, ❌ {error_count} Fehler")
+
+    def run(self):
+        """Startet die Mehrmandanten-Schleife"""
+        check_interval = self.config['email']['check_interval']
+        self.logger.info(f"🚀 Mehrmandanten-Betrieb läuft (Check-Intervall: {check_interval} Sekunden)")
+
+        try:
+            iteration = 0
+            while True:
+                iteration += 1
+                self.logger.info(f"🔄 Iteration {iteration} - {datetime.now().strftime('%H:%M:%S')}")
+
+                if self.profiler:
+                    with self.profiler.cycle(f"iteration{iteration}"):
+                        self.process_cycle()
+                else:
+                    self.process_cycle()
+
+                for assistant in self.assistants:
+                    assistant.start_outbox_flush()
+                    assistant.odoo_manager.smtp_sender.close_if_idle()
+                    assistant.odoo_manager.save_snapshot_if_due()
+
+                self.assistants[0].log_metrics_summary()
+                self.sync_categories()
+
+                time.sleep(check_interval)
+
+        except KeyboardInterrupt:
+            for assistant in self.assistants:
+                assistant.odoo_manager.save_snapshot()
+            self.logger.info("🛑 KI-Assistent gestoppt (Ctrl+C)")
+        except Exception as e:
+            self.logger.error(f"❌ Kritischer Fehler: {e}")
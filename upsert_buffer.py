@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Puffer für Extraktionen während eines Odoo-Ausfalls (lokal, SQLite)
+Ist Odoo nicht erreichbar, landen fertig extrahierte Kontaktdaten hier und die E-Mail gilt im
+Postfach als gelesen - kein erneuter Abruf, kein zweiter KI-Aufruf. Nach dem Ausfall werden
+die Einträge gebündelt nach Odoo geschrieben.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Collection, Dict, List, Optional
+
+
+class UpsertBuffer:
+    def __init__(self, config: dict, logger: logging.Logger, db_path: Optional[str] = None):
+        """Initialisiert den Upsert-Puffer (SQLite, teilt sich die lokale Datenbank)"""
+        self.config = config
+        self.logger = logger
+        self.db_path = db_path or config.get('local_db', {}).get('path', 'data/processing.db')
+
+        health_config = config.get('odoo_health', {})
+        self.drain_batch_size = health_config.get('drain_batch_size', 50)
+        self.max_attempts = health_config.get('max_attempts', 5)
+
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS pending_upserts (
+                email_id TEXT PRIMARY KEY,
+                primary_email TEXT NOT NULL,
+                forwarder TEXT NOT NULL,
+                contact_data TEXT NOT NULL,
+                fingerprint TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT NOT NULL
+            )
+        ''')
+
+    def add(self, email_id: str, primary_email: str, forwarder: str, contact_data: Dict,
+            fingerprint: Optional[int] = None):
+        """Puffert eine fertige Extraktion (gleiche E-Mail-ID ersetzt den alten Eintrag)"""
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO pending_upserts (email_id, primary_email, forwarder, contact_data, '
+                'fingerprint, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (email_id, primary_email, forwarder, json.dumps(contact_data, ensure_ascii=False),
+                 format(fingerprint, '016x') if fingerprint is not None else None,
+                 datetime.now().isoformat(timespec='seconds'))
+            )
+
+    def pending(self, limit: Optional[int] = None, skip: Collection[str] = ()) -> List[Dict]:
+        """Offene Einträge in Eingangs-Reihenfolge (ohne aufgegebene; skip: in diesem Durchlauf schon versucht)"""
+        limit = limit or self.drain_batch_size
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT email_id, primary_email, forwarder, contact_data, fingerprint FROM pending_upserts '
+                'WHERE attempts < ? ORDER BY created_at LIMIT ?',
+                (self.max_attempts, limit + len(skip))
+            ).fetchall()
+        return [{'email_id': row[0], 'primary_email': row[1], 'forwarder': row[2],
+                 'contact_data': json.loads(row[3]),
+                 'fingerprint': int(row[4], 16) if row[4] else None}
+                for row in rows if row[0] not in skip][:limit]
+
+    def remove(self, email_id: str):
+        """Eintrag nach erfolgreichem Upsert entfernen"""
+        with self._lock:
+            self._conn.execute('DELETE FROM pending_upserts WHERE email_id = ?', (email_id,))
+
+    def mark_failed(self, email_id: str):
+        """Fehlversuch bei erreichbarem Odoo - nach max_attempts bleibt der Eintrag zur Prüfung liegen"""
+        with self._lock:
+            self._conn.execute('UPDATE pending_upserts SET attempts = attempts + 1 WHERE email_id = ?', (email_id,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM pending_upserts WHERE attempts < ?',
+                                      (self.max_attempts,)).fetchone()[0]
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Warmstart-Snapshot der Odoo-Stammdaten (lokal, SQLite)
+Kategorien, Länder, Firmen- und Duplikat-Index werden mit ihrer write_date-Hochwassermarke
+gesichert. Beim Start wird der Snapshot sofort geladen und im Hintergrund inkrementell mit
+Odoo abgeglichen - die Startzeit hängt so nicht mehr von der Grösse der Partner-Datenbank ab.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+# Bei Formatänderungen der gesicherten Strukturen erhöhen - ältere Snapshots werden verworfen
+SNAPSHOT_VERSION = 1
+
+
+class WarmSnapshot:
+    def __init__(self, config: dict, logger: logging.Logger, db_path: Optional[str] = None):
+        """Initialisiert die Snapshot-Tabelle (SQLite, teilt sich die lokale Datenbank)"""
+        self.config = config
+        self.logger = logger
+        self.db_path = db_path or config.get('local_db', {}).get('path', 'data/processing.db')
+
+        snapshot_config = config.get('snapshot', {})
+        self.enabled = snapshot_config.get('enabled', True)
+        self.save_interval = snapshot_config.get('save_interval', 900)
+        # Ein Snapshot pro Odoo-Instanz (Mandanten/geänderte Konfiguration nicht vermischen)
+        self.instance = f"{config['odoo']['url']}|{config['odoo']['database']}"
+        self.saved_at = time.monotonic()
+
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS warm_snapshots (
+                name TEXT NOT NULL,
+                instance TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                high_water TEXT,
+                data TEXT NOT NULL,
+                saved_at TEXT NOT NULL,
+                PRIMARY KEY (name, instance)
+            )
+        ''')
+
+    def load(self, name: str) -> Optional[Dict]:
+        """Gesicherter Stand {'data', 'high_water'} oder None (fehlt/andere Version/beschädigt)"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT version, high_water, data FROM warm_snapshots WHERE name = ? AND instance = ?',
+                (name, self.instance)
+            ).fetchone()
+        if not row or row[0] != SNAPSHOT_VERSION:
+            return None
+        try:
+            return {'data': json.loads(row[2]), 'high_water': row[1]}
+        except ValueError as e:
+            self.logger.warning(f"⚠️ Snapshot {name} unlesbar - wird neu aufgebaut: {e}")
+            return None
+
+    def save(self, snapshots: Dict[str, Dict]):
+        """Sichert mehrere Stände {name: {'data', 'high_water'}} in einer Transaktion"""
+        if not self.enabled:
+            return
+        now = datetime.now().isoformat(timespec='seconds')
+        rows = [(name, self.instance, SNAPSHOT_VERSION, snapshot.get('high_water'),
+                 json.dumps(snapshot['data'], ensure_ascii=False, separators=(',', ':')), now)
+                for name, snapshot in snapshots.items()]
+        with self._lock:
+            try:
+                self._conn.execute('BEGIN')
+                self._conn.executemany(
+                    'INSERT OR REPLACE INTO warm_snapshots (name, instance, version, high_water, data, saved_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?)', rows)
+                self._conn.execute('COMMIT')
+            except sqlite3.Error as e:
+                if self._conn.in_transaction:
+                    self._conn.execute('ROLLBACK')
+                self.logger.warning(f"⚠️ Snapshot nicht gesichert: {e}")
+                return
+        self.saved_at = time.monotonic()
+        self.logger.info(f"💾 Snapshot gesichert: {', '.join(snapshots)}")
+
+    def save_due(self) -> bool:
+        return self.enabled and time.monotonic() - self.saved_at >= self.save_interval